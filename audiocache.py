@@ -0,0 +1,142 @@
+"""Bounded in-memory cache of recently played audio.
+
+Going back and forth across the same tracks shouldn't read and decode them
+again. ``AudioCache`` keeps two kinds of entry under one memory ceiling,
+evicting the least recently used first:
+
+- the raw bytes of a file, which ``pygame.mixer.music`` loads through a file
+  object (``raw``). A miss plays from disk and is read into the cache on a
+  background thread, so the caller never waits on the read.
+- decoded PCM for the crossfading MixingStream, which would otherwise
+  decode the whole track again (stored by the stream under ``key('pcm', path)``)
+
+Entries are keyed by path, size and mtime, so a file edited on disk is read
+afresh. A file bigger than ``max_item_bytes`` is never cached and plays from
+disk as before. Hit, miss and eviction counters and the bytes held are in
+``stats()``. Safe to use from worker threads.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict, deque
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+class AudioCache:
+	"""LRU cache of audio data bounded by ``max_bytes`` (0 disables it)."""
+	def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_item_bytes=None):
+		self.max_bytes = max_bytes
+		# One entry may take a quarter of the budget, so a long mix can't flush everything else
+		self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_bytes // 4
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.bytes = 0
+		self._entries = OrderedDict()  # key -> (value, nbytes)
+		self._lock = threading.Lock()
+		self._filling = deque()  # 'raw' keys missed and waiting to be read in
+		self._filler = None
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, key):
+		"""Whether ``key`` is cached, without counting a hit or miss."""
+		return key in self._entries
+
+	@staticmethod
+	def key(kind, path):
+		"""Key for ``path``: (kind, path, size, mtime), or None if it can't be stat'ed."""
+		try:
+			st = os.stat(path)
+		except OSError:
+			return None
+		return (kind, os.fspath(path), st.st_size, st.st_mtime_ns)
+
+	def get(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key, value, nbytes):
+		"""Store ``value`` (``nbytes`` big); returns False if it's over the per-item limit."""
+		if nbytes > self.max_item_bytes or nbytes > self.max_bytes:
+			return False
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.bytes -= old[1]
+			self._entries[key] = (value, nbytes)
+			self.bytes += nbytes
+			while self.bytes > self.max_bytes:
+				_key, (_value, size) = self._entries.popitem(last=False)
+				self.bytes -= size
+				self.evictions += 1
+		return True
+
+	def raw(self, path):
+		"""``path`` as a file object over its cached bytes, or the path itself on a
+		miss. A missed file that fits is read into the cache in the background."""
+		key = self.key('raw', path)
+		if key is None or key[2] > self.max_item_bytes:
+			return path
+		data = self.get(key)
+		if data is None:
+			self.fill_later(key)
+			return path
+		return io.BytesIO(data)
+
+	def fill_later(self, key):
+		"""Read the file of ``key`` (a 'raw' key) into the cache on the fill thread."""
+		with self._lock:
+			if key in self._filling:
+				return
+			self._filling.append(key)
+			if self._filler is None:
+				self._filler = threading.Thread(target=self._fill_run, name='audiocache-fill', daemon=True)
+				self._filler.start()
+
+	def _fill_run(self):
+		while True:
+			with self._lock:
+				if not self._filling:
+					self._filler = None
+					return
+				key = self._filling[0]
+			if key not in self:
+				try:
+					with open(key[1], 'rb') as f:
+						data = f.read()
+				except OSError as e:
+					print('Audio cache fill failed:', e)
+					data = None
+				# A file rewritten since the miss is left for its next load
+				if data is not None and len(data) == key[2]:
+					self.put(key, data, len(data))
+			with self._lock:
+				self._filling.popleft()
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.bytes = 0
+
+	def stats(self):
+		"""Counters: hits, misses, evictions, entries, bytes held, the ceiling and
+		files waiting to be read in."""
+		with self._lock:
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+				'entries': len(self._entries),
+				'bytes': self.bytes,
+				'max_bytes': self.max_bytes,
+				'filling': len(self._filling),
+			}
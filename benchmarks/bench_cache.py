@@ -0,0 +1,110 @@
+"""Audio cache benchmark: switching back and forth between recently played tracks.
+
+Runs under SDL's dummy audio driver. Writes a few synthetic MP3s (valid frames
+of silence; see bench_probe.py) and steps back and forth across them with
+PlayerEngine.play_index, as the Back/Forward buttons do, then seeks within
+the current one. This is done on pygame.mixer.music (the cache holds file
+bytes) and with crossfading (it holds decoded audio, so a hit skips the
+decode). Each is timed with the cache and without it. Reports:
+
+- median and worst milliseconds per switch, first visits (misses) and
+  revisits (hits) separately, until the track is playing. The target for
+  hits is under 10 ms. A miss on pygame.mixer.music plays from disk and
+  the cache reads the file in the background; that read is waited for
+  after the switch is timed.
+- seek time
+- the cache's counters, and how a ceiling smaller than the working set
+  evicts the least recently used tracks
+
+    python benchmarks/bench_cache.py [--tracks 4] [--minutes 4] [--mb 256]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import engine  # noqa: E402
+from audiocache import AudioCache  # noqa: E402
+from bench_probe import write_mp3  # noqa: E402
+from playlist import Playlist  # noqa: E402
+
+
+def walk(count, rounds):
+	"""Back/forward pattern over ``count`` tracks: 0, 1, .., n-1, n-2, .., 0, 1, ..."""
+	order = list(range(count)) + list(range(count - 2, 0, -1))
+	return (order * rounds)[:max(count, len(order) * rounds)]
+
+
+def run(paths, crossfade, cache, rounds):
+	player = engine.PlayerEngine(Playlist(paths), crossfade=crossfade, cache=cache)
+	player.init_mixer()
+	first, again, seeks = [], [], []
+	seen = set()
+	for index in walk(len(paths), rounds):
+		t0 = time.perf_counter()
+		player.play_index(index)
+		# A crossfade load returns while its decode runs; the switch is done once the track starts
+		while player._mixing is not None and player._mixing._pending is not None:
+			time.sleep(0.0005)
+		elapsed = 1000 * (time.perf_counter() - t0)
+		(again if index in seen else first).append(elapsed)
+		seen.add(index)
+		while cache is not None and cache.stats()['filling']:
+			time.sleep(0.001)
+		t0 = time.perf_counter()
+		player.seek(30.0)
+		seeks.append(1000 * (time.perf_counter() - t0))
+	player.close()
+	return first, again, seeks
+
+
+def describe(times):
+	if not times:
+		return '-'
+	return f'{statistics.median(times):6.1f} ms median, {max(times):6.1f} ms worst'
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--tracks', type=int, default=4)
+	parser.add_argument('--minutes', type=int, default=4, help='length of each synthetic track')
+	parser.add_argument('--mb', type=int, default=256, help='cache ceiling')
+	parser.add_argument('--rounds', type=int, default=3, help='back-and-forth sweeps')
+	args = parser.parse_args(argv)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		paths = []
+		for n in range(args.tracks):
+			paths.append(os.path.join(tmp, f'track{n}.mp3'))
+			write_mp3(paths[-1], 60 * args.minutes)
+		size = os.path.getsize(paths[0]) / 2 ** 20
+		print(f'{args.tracks} x {args.minutes} min MP3 ({size:.1f} MB each), ceiling {args.mb} MB')
+		for crossfade, mode in ((0.0, 'mixer.music'), (2.0, 'crossfade')):
+			for cached in (False, True):
+				cache = AudioCache(args.mb * 2 ** 20) if cached else None
+				first, again, seeks = run(paths, crossfade, cache, args.rounds)
+				label = f'{mode}, {"cache" if cached else "no cache"}'
+				print(f'{label:<22} first visit {describe(first)} | revisit {describe(again)} | seek {describe(seeks)}')
+				if cache is not None:
+					stats = cache.stats()
+					print(f'{"":<22} {stats["hits"]} hits, {stats["misses"]} misses, {stats["evictions"]} evictions, '
+						f'{stats["entries"]} entries, {stats["bytes"] / 2**20:.0f} MB held')
+
+		# A ceiling that fits about half the decoded working set
+		decoded = 4 * 44100 * 60 * args.minutes
+		small = AudioCache(decoded * max(2, args.tracks // 2) + 1, max_item_bytes=decoded + 1)
+		first, again, _seeks = run(paths, 2.0, small, args.rounds)
+		stats = small.stats()
+		print(f'crossfade, {stats["max_bytes"] / 2**20:.0f} MB ceiling: revisit {describe(again)}; '
+			f'{stats["hits"]} hits, {stats["misses"]} misses, {stats["evictions"]} evictions')
+
+
+if __name__ == '__main__':
+	main()
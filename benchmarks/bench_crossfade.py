@@ -0,0 +1,169 @@
+"""Crossfade benchmark: gain ramps, decode-ahead and channel feeding.
+
+Runs under SDL's dummy audio driver, which consumes audio in real time like a
+sound card. Reports:
+
+- the cost of cutting one chunk with a fade ramp applied, vectorized as
+  MixingStream does it, against a per-sample Python loop
+- decode time per track against its length (how far ahead decoding runs),
+  and how long a playing channel stalls while a track is decoded: in this
+  process (SDL_mixer locks the audio device while decoding into a Sound)
+  against in the MixingStream's worker process
+- a live run of a few tracks through PlayerEngine with a crossfade, once
+  idle and once with the main thread busy in pure Python (a stand-in for a
+  stalled Tk loop): when each crossfade started against the plan, the
+  longest feeder pass, and channel underruns (chunks that weren't queued in
+  time). The underrun count should be 0 in both runs.
+
+Tracks are synthetic MP3s (valid frames of silence; see bench_probe.py).
+
+    python benchmarks/bench_crossfade.py [--seconds 8] [--crossfade 3] [--tracks 3]
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import engine  # noqa: E402
+import mixing  # noqa: E402
+from bench_probe import write_mp3  # noqa: E402
+from playlist import Playlist  # noqa: E402
+
+
+def ramp_cost(deck, repeat=50):
+	"""Microseconds to cut one faded chunk: (vectorized, per-sample loop)."""
+	deck.fade_in = (0, deck.chunk)
+	times = []
+	for _ in range(repeat):
+		deck.next_frame = 0
+		t0 = time.perf_counter()
+		deck._cut()
+		times.append(1e6 * (time.perf_counter() - t0))
+	vectorized = statistics.median(times)
+	block = deck.pcm[:deck.chunk]
+	t0 = time.perf_counter()
+	out = block.copy()
+	for i in range(len(block)):
+		g = math.sin(i / deck.chunk * math.pi / 2)
+		for c in range(block.shape[1]):
+			out[i, c] = int(block[i, c] * g)
+	looped = 1e6 * (time.perf_counter() - t0)
+	deck.fade_in = None
+	return vectorized, looped
+
+
+def stall(decode):
+	"""Milliseconds a one-second sound on a channel overruns while ``decode()`` runs."""
+	pygame = mixing.pygame
+	channel = pygame.mixer.Channel(7)
+	sound = pygame.sndarray.make_sound(mixing.numpy.zeros((44100, 2), mixing.numpy.int16))
+
+	def played():
+		channel.play(sound)
+		t0 = time.monotonic()
+		while channel.get_busy():
+			time.sleep(0.001)
+		return time.monotonic() - t0
+	baseline = played()
+	channel.play(sound)
+	t0 = time.monotonic()
+	decode()
+	while channel.get_busy():
+		time.sleep(0.001)
+	return 1000 * max(0.0, (time.monotonic() - t0) - baseline)
+
+
+def timed_feed(stream):
+	"""Wrap the stream's feeder pass to record how long each one takes, and
+	when it starts a new track (on the feeder thread, not when the engine hears of it)."""
+	passes = []
+	starts = []
+	feed = stream._feed
+
+	def wrapper():
+		before = stream._current
+		t0 = time.perf_counter()
+		feed()
+		passes.append(time.perf_counter() - t0)
+		if stream._current is not before and stream._current is not None:
+			starts.append(t0)
+	stream._feed = wrapper
+	return passes, starts
+
+
+def live(paths, seconds, crossfade, busy):
+	player = engine.PlayerEngine(Playlist(paths), crossfade=crossfade)
+	player.init_mixer()
+	stream = player._mixing
+	passes, starts = timed_feed(stream)
+	player.play_index(0)
+	if stream._current is not None:
+		# Started in load(); otherwise the feeder starts it once it's decoded
+		starts.append(time.perf_counter())
+	while player.state != engine.STOPPED:
+		player.poll()
+		if busy:
+			# Hold the GIL in pure Python for 200 ms at a time
+			end = time.perf_counter() + 0.2
+			while time.perf_counter() < end:
+				pass
+		else:
+			time.sleep(0.01)
+	underruns = stream.underruns
+	player.close()
+	# Each track after the first should start (crossfade) seconds before the previous one ends
+	errors = [1000 * ((b - a) - (seconds - crossfade)) for a, b in zip(starts, starts[1:])]
+	return errors, max(passes), underruns
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--seconds', type=int, default=8, help='length of each test track')
+	parser.add_argument('--crossfade', type=float, default=3.0)
+	parser.add_argument('--tracks', type=int, default=3)
+	args = parser.parse_args(argv)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		paths = []
+		for n in range(args.tracks):
+			paths.append(os.path.join(tmp, f'track{n}.mp3'))
+			write_mp3(paths[-1], args.seconds)
+		long = os.path.join(tmp, 'long.mp3')
+		write_mp3(long, 240)
+		engine.PlayerEngine(Playlist()).init_mixer()
+		stream = mixing.MixingStream(args.crossfade)
+		t0 = time.perf_counter()
+		stream._decode(long).result()
+		first = time.perf_counter() - t0
+		t0 = time.perf_counter()
+		pcm = stream._decode(long).result()
+		decode = time.perf_counter() - t0
+		print(f'mixer {mixing.pygame.mixer.get_init()}; decode a 240 s MP3 in the worker: {1000 * decode:.0f} ms '
+			f'({240 / decode:.0f}x real time; {1000 * first:.0f} ms with the worker starting)')
+		in_process = stall(lambda: mixing.pygame.mixer.Sound(long))
+		in_worker = stall(lambda: stream._decode(long).result())
+		print(f'playing channel stalled {in_process:.0f} ms by a decode in this process, '
+			f'{in_worker:.0f} ms by one in the worker')
+		deck = mixing._PcmDeck(long, pcm, stream._channels[0], mixing.CHUNK_SECONDS)
+		vectorized, looped = ramp_cost(deck)
+		print(f'{mixing.CHUNK_SECONDS:.1f} s chunk with a fade ramp: {vectorized:.0f} us vectorized, '
+			f'{looped / 1000:.0f} ms per-sample loop ({looped / vectorized:.0f}x)')
+		stream.close()
+
+		for busy in (False, True):
+			errors, worst, underruns = live(paths, args.seconds, args.crossfade, busy)
+			label = 'busy main thread' if busy else 'idle main thread'
+			print(f'{label}: crossfades started {", ".join(f"{e:+.0f}" for e in errors)} ms from plan, '
+				f'longest feeder pass {1000 * worst:.1f} ms, {underruns} underruns')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,222 @@
+"""Custom-chrome window drag benchmark for WindowDragger.
+
+Replays synthetic pointer-motion streams (a steady drag, a fast fling and a
+jittery drag with pauses) against a fake Tk root on a virtual clock and
+compares the coalesced dragger with the old handler, which walked the widget
+parent chain and called ``geometry()`` on every motion event. Reports window
+updates per second, event-to-move latency and handler CPU time. No display is
+needed.
+
+    python benchmarks/bench_drag.py [--rate 1000] [--seconds 2] [--frame-ms 16]
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from theme import WindowDragger  # noqa: E402
+
+
+class Clock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+class FakeWidget:
+	def __init__(self, master, name):
+		self.master = master
+		self._path = f'{master}.{name}' if master is not None else ''
+
+	def __str__(self):
+		return self._path or '.'
+
+
+class FakeRoot(FakeWidget):
+	"""Just enough of Tk for the drag handlers: bind, after, geometry."""
+	def __init__(self, clock):
+		FakeWidget.__init__(self, None, '')
+		self.clock = clock
+		self.x = self.y = 100
+		self.geometry_calls = 0
+		self.moves = []  # (time, x, y)
+		self._timers = []
+		self._seq = 0
+
+	def bind(self, sequence, func, add=None):
+		return f'{sequence}-{id(func)}'
+
+	def unbind(self, sequence, funcid=None):
+		pass
+
+	def after(self, ms, func):
+		self._seq += 1
+		heapq.heappush(self._timers, (self.clock.now + ms / 1000.0, self._seq, func))
+		return self._seq
+
+	def after_cancel(self, after_id):
+		self._timers = [t for t in self._timers if t[1] != after_id]
+		heapq.heapify(self._timers)
+
+	def run_until(self, t):
+		while self._timers and self._timers[0][0] <= t:
+			when, _, func = heapq.heappop(self._timers)
+			self.clock.now = when
+			func()
+		self.clock.now = t
+
+	def winfo_x(self):
+		return self.x
+
+	def winfo_y(self):
+		return self.y
+
+	def geometry(self, spec):
+		self.geometry_calls += 1
+		_, x, y = spec.split('+')
+		self.x, self.y = int(x), int(y)
+		self.moves.append((self.clock.now, self.x, self.y))
+
+
+class Event:
+	__slots__ = ('widget', 'x_root', 'y_root')
+
+	def __init__(self, widget, x_root, y_root):
+		self.widget = widget
+		self.x_root = x_root
+		self.y_root = y_root
+
+
+class NaiveDragger:
+	"""The previous handler: parent walk plus geometry() on every motion event."""
+	def __init__(self, root, protected):
+		self.root = root
+		self.protected = protected
+		self.start = (0, 0)
+		self.origin = (0, 0)
+
+	def _is_protected(self, w):
+		while w is not None:
+			if w in self.protected:
+				return True
+			w = w.master
+		return False
+
+	def on_press(self, event):
+		if self._is_protected(event.widget):
+			return
+		self.start = (event.x_root, event.y_root)
+		self.origin = (self.root.winfo_x(), self.root.winfo_y())
+
+	def on_motion(self, event):
+		if self._is_protected(event.widget):
+			return
+		x = self.origin[0] + event.x_root - self.start[0]
+		y = self.origin[1] + event.y_root - self.start[1]
+		self.root.geometry(f'+{int(x)}+{int(y)}')
+
+	def on_release(self, event):
+		pass
+
+
+def motion_stream(kind, rate, seconds, rng):
+	"""Yield (time, dx, dy) pointer offsets sampled at ``rate`` Hz."""
+	n = int(rate * seconds)
+	for i in range(n):
+		t = i / rate
+		if kind == 'steady':
+			yield t, int(200 * t), int(50 * t)
+		elif kind == 'fling':
+			yield t, int(1500 * t), int(300 * math.sin(6 * t))
+		else:
+			# Jittery drag that stops for a moment every half second
+			if (t % 0.5) > 0.4:
+				continue
+			yield t, int(150 * t + rng.uniform(-3, 3)), int(rng.uniform(-3, 3))
+
+
+def replay(make, kind, args):
+	clock = Clock()
+	root = FakeRoot(clock)
+	frame = FakeWidget(root, 'main')
+	# Deep widget: the parent walk costs more the further down the click lands
+	leaf = frame
+	for depth in range(6):
+		leaf = FakeWidget(leaf, f'w{depth}')
+	sliders = [FakeWidget(frame, 'song_slider'), FakeWidget(frame, 'volume_slider')]
+	dragger = make(root, sliders, clock)
+	rng = random.Random(args.seed)
+
+	dragger.on_press(Event(leaf, 500, 500))
+	events = []
+	cpu = 0.0
+	last = (0, 0)
+	for t, dx, dy in motion_stream(kind, args.rate, args.seconds, rng):
+		root.run_until(t)
+		last = (dx, dy)
+		events.append((t, dx, dy))
+		t0 = time.perf_counter()
+		dragger.on_motion(Event(leaf, 500 + dx, 500 + dy))
+		cpu += time.perf_counter() - t0
+	end = events[-1][0] if events else 0.0
+	root.run_until(end + 0.001)
+	t0 = time.perf_counter()
+	dragger.on_release(Event(leaf, 500 + last[0], 500 + last[1]))
+	cpu += time.perf_counter() - t0
+	root.run_until(end + 1.0)
+
+	# Latency: the first window move at or after an event applies it (or a newer one)
+	latencies = []
+	times = [when for when, _, _ in root.moves]
+	for t, _, _ in events:
+		k = bisect_left(times, t)
+		if k < len(times):
+			latencies.append(times[k] - t)
+	final_ok = (root.x, root.y) == (100 + last[0], 100 + last[1])
+	latencies.sort()
+	return {
+		'events': len(events),
+		'updates': root.geometry_calls,
+		'updates_per_s': root.geometry_calls / max(end, 1e-9),
+		'lat_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+		'lat_max': latencies[-1] if latencies else 0.0,
+		'cpu_us': 1e6 * cpu / max(1, len(events)),
+		'final_ok': final_ok,
+	}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--rate', type=int, default=1000, help='motion events per second')
+	parser.add_argument('--seconds', type=float, default=2.0, help='length of each drag')
+	parser.add_argument('--frame-ms', type=int, default=16, help='coalescing interval')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args(argv)
+
+	def naive(root, sliders, clock):
+		return NaiveDragger(root, sliders)
+
+	def coalesced(root, sliders, clock):
+		dragger = WindowDragger(root, frame_ms=args.frame_ms, clock=clock)
+		dragger.protect(*sliders)
+		return dragger
+
+	print(f'{args.rate} motion events/s, {args.seconds:g}s per drag, frame {args.frame_ms} ms')
+	print(f"{'stream':<8} {'handler':<10} {'events':>7} {'updates':>8} {'upd/s':>8} {'p50 ms':>7} {'max ms':>7} {'us/event':>9}  final")
+	for kind in ('steady', 'fling', 'jitter'):
+		for name, make in (('naive', naive), ('coalesced', coalesced)):
+			r = replay(make, kind, args)
+			print(f"{kind:<8} {name:<10} {r['events']:>7} {r['updates']:>8} {r['updates_per_s']:>8.0f} "
+				f"{1000 * r['lat_p50']:>7.1f} {1000 * r['lat_max']:>7.1f} {r['cpu_us']:>9.2f}  {'ok' if r['final_ok'] else 'MISSED'}")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,66 @@
+"""Loudness analysis benchmark: measurement speed and accuracy.
+
+Measures synthetic stereo tones of increasing length with
+``loudness.integrated_loudness`` and reports the time taken and the speed
+relative to real time. The decode step is excluded, since pygame does it. The
+997 Hz reference tones must come out at 0 and -20 LUFS (BS.1770).
+Finally it runs a full decode and measure on a generated WAV under SDL's dummy
+audio driver.
+
+    python benchmarks/bench_loudness.py [--durations 60,600,3600]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy  # noqa: E402
+
+import loudness  # noqa: E402
+from bench_peaks import write_long_tone  # noqa: E402
+
+
+def tone(seconds, amplitude, rate=loudness.ANALYSIS_RATE, freq=997.0):
+	t = numpy.arange(int(seconds * rate)) / rate
+	mono = (amplitude * 32767 * numpy.sin(2 * numpy.pi * freq * t)).astype(numpy.int16)
+	return numpy.stack([mono, mono], axis=1)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--durations', default='60,600,3600', help='tone lengths in seconds')
+	parser.add_argument('--decode-seconds', type=float, default=180, help='length of the decoded WAV')
+	args = parser.parse_args(argv)
+	rate = loudness.ANALYSIS_RATE
+
+	for amplitude, expected in ((1.0, 0.0), (0.1, -20.0)):
+		lufs, peak = loudness.integrated_loudness(tone(20, amplitude), rate)
+		print(f'997 Hz at {amplitude:g}: {lufs:6.2f} LUFS (expect {expected:g}), peak {peak:.3f}')
+
+	print(f"{'duration':>9} {'measure ms':>11} {'x realtime':>11}")
+	for seconds in (int(s) for s in args.durations.split(',')):
+		samples = tone(seconds, 0.5)
+		t0 = time.perf_counter()
+		loudness.integrated_loudness(samples, rate)
+		elapsed = time.perf_counter() - t0
+		print(f'{seconds:>8}s {1000 * elapsed:>11.0f} {seconds / elapsed:>11.0f}')
+
+	with tempfile.TemporaryDirectory() as tmp:
+		track = os.path.join(tmp, 'tone.wav')
+		write_long_tone(track, args.decode_seconds)
+		t0 = time.perf_counter()
+		samples, rate = loudness.decode(track)
+		t1 = time.perf_counter()
+		lufs, peak = loudness.integrated_loudness(samples, rate)
+		t2 = time.perf_counter()
+		print(f'{args.decode_seconds:g}s WAV: decode {1000 * (t1 - t0):.0f} ms, measure {1000 * (t2 - t1):.0f} ms '
+			f'-> {lufs:.1f} LUFS, peak {peak:.3f}, gain x{loudness.replay_gain(lufs, peak):.3f}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,157 @@
+"""Play order benchmark: next/previous lookups, shuffle upkeep and the play queue.
+
+No audio is played; PlayOrder runs against a Playlist of made-up paths.
+Reports, for playlists of each size:
+
+- microseconds per next and previous lookup, linear and shuffled. Shuffled
+  lookups follow the permutation's links and shouldn't grow with the
+  playlist; linear ones find the track's index in its playlist chunk.
+- the time to draw a new permutation (once, when shuffle is turned on) and
+  per inserted or deleted track afterwards (no rebuild)
+- a full shuffled pass with tracks inserted and deleted along the way:
+  every track still loaded is played exactly once, and those inserted
+  mid-pass are played in it
+- Back after a run of shuffled tracks, against the order they played in
+- microseconds per play queue operation (enqueue next/last, take the head)
+  with the queue empty and holding thousands of tracks; these shouldn't
+  grow with the queue
+
+    python benchmarks/bench_order.py [--sizes 1000 10000 100000] [--lookups 20000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from playlist import Playlist  # noqa: E402
+from playorder import REPEAT_ALL, PlayOrder, PlayQueue  # noqa: E402
+
+
+def make_playlist(size):
+	return Playlist(f'/music/album{n // 12:05d}/track{n % 12:02d}.mp3' for n in range(size))
+
+
+def per_lookup(step, tracks):
+	"""Median microseconds per ``step(track)`` over batches of ``tracks``."""
+	times = []
+	for start in range(0, len(tracks), 1000):
+		batch = tracks[start:start + 1000]
+		t0 = time.perf_counter()
+		for track in batch:
+			step(track)
+		times.append(1e6 * (time.perf_counter() - t0) / len(batch))
+	return statistics.median(times)
+
+
+def full_pass(size, rng):
+	"""Play a shuffled order through while editing the playlist; returns (ok, played, heard, inserted)."""
+	playlist = make_playlist(size)
+	order = PlayOrder(playlist, shuffle=True, rng=rng)
+	track = playlist.get(order._head)
+	played = []
+	inserted = set()
+	while track is not None:
+		order.started(track)
+		played.append(track.id)
+		if len(played) % 97 == 0:
+			for new in playlist.insert(rng.randrange(len(playlist) + 1), [f'/new/{len(played)}.mp3']):
+				inserted.add(new.id)
+		if len(played) % 89 == 0:
+			victim = playlist[rng.randrange(len(playlist))]
+			if victim is not track:
+				playlist.delete(playlist.index_of(victim))
+		track = order.after(track)
+	loaded = {track.id for track in playlist}
+	ok = len(played) == len(set(played)) and loaded <= set(played)
+	return ok, len(played), len(inserted & set(played)), len(inserted)
+
+
+def back_matches(size, rng, steps=50):
+	"""Jump around a shuffled order, then check Back retraces what played."""
+	playlist = make_playlist(size)
+	order = PlayOrder(playlist, shuffle=True, repeat=REPEAT_ALL, rng=rng)
+	track = playlist[rng.randrange(size)]
+	played = []
+	for n in range(steps):
+		order.started(track)
+		played.append(track)
+		# Mostly follow the order, sometimes pick a track by hand
+		track = order.after(track) if n % 5 else playlist[rng.randrange(size)]
+	retraced = [played[-1]]
+	for _ in range(steps - 1):
+		back = order.before(retraced[-1])
+		order.started(back)
+		retraced.append(back)
+	return retraced == played[::-1]
+
+
+def queue_ops(playlist, backlog, count=10000):
+	"""Microseconds per enqueue_next, enqueue_last and take with ``backlog`` tracks queued."""
+	queue = PlayQueue(playlist)
+	queue.enqueue_last(playlist[n % len(playlist)] for n in range(backlog))
+	tracks = [playlist[n % len(playlist)] for n in range(count)]
+	results = []
+	for op in (lambda t: queue.enqueue_next((t,)), lambda t: queue.enqueue_last((t,)), None):
+		t0 = time.perf_counter()
+		if op is None:
+			for _ in range(count):
+				queue.take(queue.peek())
+		else:
+			for track in tracks:
+				op(track)
+		results.append(1e6 * (time.perf_counter() - t0) / count)
+	return results
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+	parser.add_argument('--lookups', type=int, default=20000)
+	args = parser.parse_args(argv)
+	rng = random.Random(1)
+
+	for size in args.sizes:
+		playlist = make_playlist(size)
+		order = PlayOrder(playlist, rng=rng)
+		sample = [playlist[rng.randrange(size)] for _ in range(args.lookups)]
+		linear_next = per_lookup(order.after, sample)
+		linear_prev = per_lookup(order.before, sample)
+		t0 = time.perf_counter()
+		order.set_shuffle(True)
+		shuffle_ms = 1000 * (time.perf_counter() - t0)
+		shuffled_next = per_lookup(order.after, sample)
+		shuffled_prev = per_lookup(order.before, sample)
+
+		count = 1000
+		t0 = time.perf_counter()
+		for n in range(count):
+			playlist.insert(rng.randrange(len(playlist) + 1), [f'/new/{n}.mp3'])
+		insert_us = 1e6 * (time.perf_counter() - t0) / count
+		t0 = time.perf_counter()
+		for _ in range(count):
+			playlist.delete(rng.randrange(len(playlist)))
+		delete_us = 1e6 * (time.perf_counter() - t0) / count
+
+		print(f'{size:>7} tracks: next {linear_next:5.2f} us linear, {shuffled_next:5.2f} us shuffled; '
+			f'previous {linear_prev:5.2f} / {shuffled_prev:5.2f} us; shuffle on {shuffle_ms:6.1f} ms; '
+			f'insert {insert_us:5.1f} us, delete {delete_us:5.1f} us per track (playlist and order)')
+
+	size = min(args.sizes)
+	ok, played, heard, inserted = full_pass(size, rng)
+	print(f'shuffled pass over {size} tracks with edits: {played} played, each once: {ok}; '
+		f'{heard} of {inserted} tracks inserted mid-pass heard in it')
+	print(f'Back retraces 50 shuffled plays: {back_matches(size, rng)}')
+
+	playlist = make_playlist(max(args.sizes))
+	for backlog in (0, 10000, 100000):
+		enqueue_next, enqueue_last, take = queue_ops(playlist, backlog)
+		print(f'play queue with {backlog:>6} queued: enqueue next {enqueue_next:4.2f} us, '
+			f'enqueue last {enqueue_last:4.2f} us, take head {take:4.2f} us')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,98 @@
+"""Waveform peak benchmark: analysis, cache load and render cost.
+
+Analyses a generated tone in-process (decode + min/max reduction + .pk write)
+under SDL's dummy audio driver, then writes synthetic peak files for tracks
+of increasing length and times opening them (mmap) and computing the pixel
+columns a redraw needs. Render time should stay flat as duration grows.
+
+    python benchmarks/bench_peaks.py [--seconds 120] [--widths 360,1920]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+from array import array
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import peaks  # noqa: E402
+
+
+def write_long_tone(path, seconds, rate=44100):
+	"""Write a stereo 16-bit WAV by repeating one second of a swelling sine."""
+	one = array('h')
+	for i in range(rate):
+		v = int(12000 * math.sin(i * 2 * math.pi * 220 / rate) * (0.3 + 0.7 * i / rate))
+		one.extend((v, v))
+	if sys.byteorder != 'little':
+		one.byteswap()
+	second = one.tobytes()
+	with wave.open(path, 'wb') as w:
+		w.setnchannels(2)
+		w.setsampwidth(2)
+		w.setframerate(rate)
+		for _ in range(int(seconds)):
+			w.writeframes(second)
+
+
+def synthetic_level0(seconds, rng):
+	bins = int(seconds * peaks.PEAK_RATE / peaks.SAMPLES_PER_BIN)
+	out = array('b')
+	for _ in range(bins):
+		amp = rng.randrange(1, 127)
+		out.extend((-amp, amp))
+	return out.tobytes()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--seconds', type=float, default=120, help='length of the analysed tone')
+	parser.add_argument('--widths', default='360,1920', help='render widths in pixels')
+	parser.add_argument('--repeat', type=int, default=20)
+	args = parser.parse_args(argv)
+	widths = [int(w) for w in args.widths.split(',')]
+	rng = random.Random(1)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		track = os.path.join(tmp, 'tone.wav')
+		write_long_tone(track, args.seconds)
+		t0 = time.perf_counter()
+		raw, rate = peaks.decode_mono(track)
+		t1 = time.perf_counter()
+		levels = peaks.pyramid(peaks.level0(raw))
+		t2 = time.perf_counter()
+		pk = os.path.join(tmp, 'tone.pk')
+		peaks.write_peaks(pk, levels, len(raw) / 2 / rate, sample_rate=rate)
+		t3 = time.perf_counter()
+		reducer = 'numpy' if peaks.numpy is not None else 'array'
+		print(f'analysis of {args.seconds:g}s track: decode {1000 * (t1 - t0):.0f} ms, '
+			f'reduce ({reducer}) {1000 * (t2 - t1):.0f} ms, write {1000 * (t3 - t2):.1f} ms, '
+			f'{os.path.getsize(pk):,} byte cache')
+
+		print(f"{'duration':>9} {'cache KB':>9} {'open us':>8}" + ''.join(f' {f"{w}px us":>10}' for w in widths))
+		for seconds in (60, 600, 3600, 7200):
+			path = os.path.join(tmp, f'{seconds}.pk')
+			peaks.write_peaks(path, peaks.pyramid(synthetic_level0(seconds, rng)), seconds)
+			t0 = time.perf_counter()
+			for _ in range(args.repeat):
+				peaks.Peaks(path).close()
+			open_us = 1e6 * (time.perf_counter() - t0) / args.repeat
+			p = peaks.Peaks(path)
+			cols = []
+			for w in widths:
+				t0 = time.perf_counter()
+				for _ in range(args.repeat):
+					p.columns(w)
+				cols.append(1e6 * (time.perf_counter() - t0) / args.repeat)
+			p.close()
+			print(f'{seconds:>8}s {os.path.getsize(path) / 1024:>9.0f} {open_us:>8.0f}' + ''.join(f' {c:>10.0f}' for c in cols))
+
+
+if __name__ == '__main__':
+	main()
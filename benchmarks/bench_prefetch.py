@@ -0,0 +1,118 @@
+"""Prefetch benchmark: track changes from cold storage, with and without read-ahead.
+
+Runs under SDL's dummy audio driver. Writes synthetic MP3s (valid frames of
+silence; see bench_probe.py) and plays them through PlayerEngine with an
+AudioCache, as the player does. Before each run every file is dropped from
+the OS page cache (``posix_fadvise(DONTNEED)``), so reads come from the
+device as they would for a track not played since boot. Each track plays for
+``--listen`` seconds and then Forward is pressed. Reports:
+
+- milliseconds per track change: median and worst. The main thread reads
+  the track that gets queued next then, unless the prefetcher has already
+  done so.
+- the prefetcher's counters: tracks and bytes read ahead, track starts that
+  found their file ready, and the read time it hid
+- the throughput a bandwidth-limited read-ahead actually reaches
+
+Local disks are fast enough that the difference is small. Point ``--dir`` at
+an NFS/SMB mount or a spinning disk to see what prefetching is for.
+
+    python benchmarks/bench_prefetch.py [--tracks 6] [--minutes 8] [--listen 0.5] [--dir PATH]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import engine  # noqa: E402
+from audiocache import AudioCache  # noqa: E402
+from bench_probe import write_mp3  # noqa: E402
+from playlist import Playlist  # noqa: E402
+from prefetch import Prefetcher  # noqa: E402
+
+
+def evict(paths):
+	"""Drop ``paths`` from the page cache (no-op where posix_fadvise is missing)."""
+	if not hasattr(os, 'posix_fadvise'):
+		return
+	for path in paths:
+		fd = os.open(path, os.O_RDONLY)
+		try:
+			os.fsync(fd)
+			os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+		finally:
+			os.close(fd)
+
+
+def run(paths, listen, prefetcher):
+	evict(paths)
+	player = engine.PlayerEngine(Playlist(paths), cache=AudioCache(), prefetcher=prefetcher)
+	player.init_mixer()
+	player.play_index(0)
+	changes = []
+	for _ in range(len(paths) - 1):
+		end = time.monotonic() + listen
+		while time.monotonic() < end:
+			player.poll()
+			time.sleep(0.01)
+		t0 = time.perf_counter()
+		player.next()
+		changes.append(1000 * (time.perf_counter() - t0))
+	player.close()
+	return changes
+
+
+def limited_throughput(path, rate):
+	"""MB/s a read-ahead of ``path`` reaches with a ``rate`` bytes/s limit."""
+	evict([path])
+	prefetcher = Prefetcher(rate=rate)
+	t0 = time.monotonic()
+	prefetcher.prefetch([path])
+	while prefetcher.stats()['files'] < 1:
+		time.sleep(0.005)
+	elapsed = time.monotonic() - t0
+	prefetcher.close()
+	return os.path.getsize(path) / elapsed / 2 ** 20
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--tracks', type=int, default=6)
+	parser.add_argument('--minutes', type=int, default=8, help='length of each synthetic track')
+	parser.add_argument('--listen', type=float, default=0.5, help='seconds each track plays before Forward')
+	parser.add_argument('--ahead', type=int, default=3, help='tracks read ahead')
+	parser.add_argument('--limit-mbps', type=float, default=20.0, help='bandwidth limit to check')
+	parser.add_argument('--dir', help='where to write the test tracks (default: a temporary directory)')
+	args = parser.parse_args(argv)
+
+	with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+		paths = []
+		for n in range(args.tracks):
+			paths.append(os.path.join(tmp, f'track{n}.mp3'))
+			write_mp3(paths[-1], 60 * args.minutes)
+		size = os.path.getsize(paths[0]) / 2 ** 20
+		print(f'{args.tracks} x {args.minutes} min MP3 ({size:.1f} MB each) in {tmp}, '
+			f'{args.listen:.1f} s of each played, page cache dropped before each run')
+		for label, prefetcher in (('no prefetch', None), (f'prefetch {args.ahead}', Prefetcher(args.ahead))):
+			changes = run(paths, args.listen, prefetcher)
+			line = (f'{label:<12} track change {statistics.median(changes):6.1f} ms median, '
+				f'{max(changes):6.1f} ms worst')
+			if prefetcher is not None:
+				stats = prefetcher.stats()
+				line += (f'; {stats["files"]} tracks ({stats["bytes"] / 2**20:.0f} MB) read ahead in '
+					f'{1000 * stats["read_seconds"]:.0f} ms, {stats["hits"]} of {stats["hits"] + stats["misses"]} '
+					f'track starts ready, {1000 * stats["hidden_seconds"]:.0f} ms of reads hidden')
+			print(line)
+		reached = limited_throughput(paths[-1], args.limit_mbps * 2 ** 20)
+		print(f'read-ahead limited to {args.limit_mbps:.0f} MB/s reached {reached:.1f} MB/s')
+
+
+if __name__ == '__main__':
+	main()
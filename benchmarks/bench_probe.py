@@ -0,0 +1,232 @@
+"""Per-format probe benchmark: header-only durations and tags against mutagen.
+
+No encoders are needed: for each format the script writes a file with real
+headers (WAV, FLAC, Ogg Vorbis, Ogg Opus, M4A and a stream of MP3 frames),
+title/artist tags, and a sparse audio payload of the given length. Each file
+gets a misleading extension as well, so that dispatch has to come from
+sniffing. Reports per format:
+
+- the length formats.probe() reads and the time per probe
+- the time per probe of ``mutagen.File`` (generic dispatch) on the same file
+- whether sniffing picked the right reader for the misnamed copy
+
+Probe time should not grow with the track length, which ``--minutes`` varies.
+
+    python benchmarks/bench_probe.py [--minutes 4] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import warnings
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import formats  # noqa: E402
+
+TITLE = 'Bench Title'
+ARTIST = 'Bench Artist'
+RATE = 44100
+
+
+def _sparse(f, nbytes):
+	"""Extend ``f`` by ``nbytes`` of zeros without writing them."""
+	f.truncate(f.tell() + nbytes)
+	f.seek(nbytes, 1)
+
+
+def _comments(vendor=b'bench'):
+	entries = [f'TITLE={TITLE}'.encode(), f'ARTIST={ARTIST}'.encode()]
+	return (struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(entries))
+		+ b''.join(struct.pack('<I', len(e)) + e for e in entries))
+
+
+def write_wav(path, seconds):
+	with wave.open(path, 'wb') as w:
+		w.setnchannels(2)
+		w.setsampwidth(2)
+		w.setframerate(RATE)
+		w.writeframes(b'\0' * 4 * RATE)
+	# Patch the sizes for the full length and add a LIST/INFO chunk after the data
+	data = 4 * RATE * seconds
+	info = b'INFO'
+	for key, text in ((b'INAM', TITLE), (b'IART', ARTIST)):
+		text = text.encode() + b'\0'
+		info += key + struct.pack('<I', len(text)) + text + b'\0' * (len(text) & 1)
+	with open(path, 'r+b') as f:
+		f.seek(40)
+		f.write(struct.pack('<I', data))
+		f.seek(44)
+		_sparse(f, data)
+		f.write(b'LIST' + struct.pack('<I', len(info)) + info)
+		end = f.tell()
+		f.seek(4)
+		f.write(struct.pack('<I', end - 8))
+
+
+def write_flac(path, seconds):
+	samples = RATE * seconds
+	streaminfo = struct.pack('>HH', 4096, 4096) + b'\0' * 6
+	streaminfo += ((RATE << 44) | (1 << 41) | (15 << 36) | samples).to_bytes(8, 'big') + b'\0' * 16
+	comments = _comments()
+	with open(path, 'wb') as f:
+		f.write(b'fLaC')
+		f.write(b'\x00' + len(streaminfo).to_bytes(3, 'big') + streaminfo)
+		f.write(b'\x84' + len(comments).to_bytes(3, 'big') + comments)
+		f.write(b'\xff\xf8')
+		_sparse(f, samples // 2)
+
+
+_OGG_CRC = []
+for _n in range(256):
+	_r = _n << 24
+	for _ in range(8):
+		_r = ((_r << 1) ^ 0x04C11DB7) if _r & 0x80000000 else _r << 1
+	_OGG_CRC.append(_r & 0xFFFFFFFF)
+
+
+def _ogg_crc(data):
+	crc = 0
+	for byte in data:
+		crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC[(crc >> 24) ^ byte]
+	return crc
+
+
+def _ogg_page(packets, granule, sequence, flags=0, serial=0x1234):
+	lacing = b''
+	for packet in packets:
+		lacing += b'\xff' * (len(packet) // 255) + bytes([len(packet) % 255])
+	page = struct.pack('<4sBBqIII', b'OggS', 0, flags, granule, serial, sequence, 0)
+	page += bytes([len(lacing)]) + lacing + b''.join(packets)
+	return page[:22] + struct.pack('<I', _ogg_crc(page)) + page[26:]
+
+
+def _write_ogg(path, head, tags, granule, nbytes, setup=None):
+	with open(path, 'wb') as f:
+		f.write(_ogg_page([head], 0, 0, flags=2))
+		f.write(_ogg_page([tags] + ([setup] if setup else []), 0, 1))
+		_sparse(f, nbytes)
+		f.write(_ogg_page([b'\0' * 64], granule, 2, flags=4))
+
+
+def write_vorbis(path, seconds):
+	head = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, RATE, 0, 128000, 0, 0xB8, 1)
+	tags = b'\x03vorbis' + _comments() + b'\x01'
+	setup = b'\x05vorbis' + b'\0' * 32
+	_write_ogg(path, head, tags, RATE * seconds, 16000 * seconds, setup)
+
+
+def write_opus(path, seconds):
+	head = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, RATE, 0, 0)
+	tags = b'OpusTags' + _comments()
+	_write_ogg(path, head, tags, 48000 * seconds + 312, 12000 * seconds)
+
+
+def _atom(kind, body):
+	return struct.pack('>I', 8 + len(body)) + kind + body
+
+
+def write_m4a(path, seconds):
+	mvhd = _atom(b'mvhd', struct.pack('>BxxxIIII', 0, 0, 0, 1000, 1000 * seconds) + b'\0' * 80)
+	mdhd = _atom(b'mdhd', struct.pack('>BxxxIIIIHH', 0, 0, 0, RATE, RATE * seconds, 0, 0))
+	hdlr = _atom(b'hdlr', b'\0' * 8 + b'soun' + b'\0' * 13)
+	esds = _atom(b'esds', b'\0' * 4 + b'\x03\x19\x00\x00\x00\x04\x11\x40\x15' + b'\0' * 3
+		+ struct.pack('>II', 128000, 128000) + b'\x05\x02\x12\x10\x06\x01\x02')
+	mp4a = _atom(b'mp4a', b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 8 + struct.pack('>HHHHI', 2, 16, 0, 0, RATE << 16) + esds)
+	stsd = _atom(b'stsd', struct.pack('>II', 0, 1) + mp4a)
+	minf = _atom(b'minf', _atom(b'stbl', stsd))
+	trak = _atom(b'trak', _atom(b'mdia', mdhd + hdlr + minf))
+	ilst = b''
+	for kind, text in ((b'\xa9nam', TITLE), (b'\xa9ART', ARTIST)):
+		ilst += _atom(kind, _atom(b'data', struct.pack('>II', 1, 0) + text.encode()))
+	meta = _atom(b'meta', b'\0' * 4 + _atom(b'hdlr', b'\0' * 8 + b'mdirappl' + b'\0' * 9) + _atom(b'ilst', ilst))
+	moov = _atom(b'moov', mvhd + trak + _atom(b'udta', meta))
+	with open(path, 'wb') as f:
+		f.write(_atom(b'ftyp', b'M4A \0\0\0\0M4A mp42isom'))
+		nbytes = 16000 * seconds
+		f.write(struct.pack('>I', 8 + nbytes) + b'mdat')
+		_sparse(f, nbytes)
+		f.write(moov)
+
+
+def write_mp3(path, seconds):
+	frames = b''
+	for key, text in ((b'TIT2', TITLE), (b'TPE1', ARTIST)):
+		body = b'\x03' + text.encode()
+		frames += key + struct.pack('>I', len(body)) + b'\0\0' + body
+	size = len(frames)
+	syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+	# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417-byte frames of 1152 samples
+	header = b'\xff\xfb\x90\x64'
+	count = RATE * seconds // 1152
+	with open(path, 'wb') as f:
+		f.write(b'ID3\x03\x00\x00' + syncsafe + frames)
+		block = (header + b'\0' * 413) * 256
+		for _ in range(count // 256):
+			f.write(block)
+		f.write((header + b'\0' * 413) * (count % 256))
+
+
+WRITERS = [
+	('wav', '.wav', write_wav),
+	('flac', '.flac', write_flac),
+	('ogg', '.ogg', write_vorbis),
+	('opus', '.opus', write_opus),
+	('m4a', '.m4a', write_m4a),
+	('mp3', '.mp3', write_mp3),
+]
+
+
+def per_call(fn, path, repeat):
+	times = []
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		fn(path)
+		times.append(1e6 * (time.perf_counter() - t0))
+	return statistics.median(times)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--minutes', type=int, default=4, help='length of each synthetic track')
+	parser.add_argument('--repeat', type=int, default=200, help='probes per file')
+	args = parser.parse_args(argv)
+	seconds = 60 * args.minutes
+	try:
+		import mutagen
+	except ImportError:
+		mutagen = None
+	warnings.simplefilter('ignore')
+
+	with tempfile.TemporaryDirectory() as tmp:
+		print(f'{seconds} s tracks; median microseconds per probe')
+		for name, ext, write in WRITERS:
+			path = os.path.join(tmp, 'track' + ext)
+			write(path, seconds)
+			# Same bytes under the wrong extension: only sniffing gets it right
+			misnamed = os.path.join(tmp, 'misnamed-' + name + ('.mp3' if name != 'mp3' else '.ogg'))
+			with open(path, 'rb') as src, open(misnamed, 'wb') as dst:
+				dst.write(src.read())
+			fields = formats.probe(path)
+			sniffed = formats.sniff(misnamed)
+			ours = per_call(formats.probe, path, args.repeat)
+			line = (f'{name:<5} {formats.sniff(path).name:<5} length {fields["length"]:7.2f} s, '
+				f'{fields["sample_rate"]:5d} Hz, {fields["title"]!r}/{fields["artist"]!r}: '
+				f'formats.probe {ours:7.1f} us')
+			if mutagen is not None:
+				try:
+					theirs = per_call(mutagen.File, path, args.repeat)
+					length = mutagen.File(path).info.length
+					line += f', mutagen {theirs:7.1f} us ({length:.2f} s)'
+				except Exception as e:
+					line += f', mutagen failed ({type(e).__name__})'
+			ok = 'ok' if sniffed is not None and sniffed.name == name else f'got {sniffed}'
+			print(f'{line}; misnamed copy sniffed {ok}')
+
+
+if __name__ == '__main__':
+	main()
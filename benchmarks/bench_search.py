@@ -0,0 +1,146 @@
+"""Playlist search benchmark: index build, per-keystroke filtering, updates.
+
+Builds a synthetic library of Artist/Album/NN - Title.mp3 paths with tags
+(words drawn Zipf-style from common words plus 30,000 made-up ones),
+indexes it with ``search.SearchIndex``, and then "types" queries one
+character at a time. It reports the worst and median time per keystroke,
+including reading the rows a view would draw (the budget is 16 ms, one
+frame), and the cost of incremental add, delete
+and tag updates.
+
+    python benchmarks/bench_search.py [--tracks 100000] [--memory]
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from playlist import Playlist  # noqa: E402
+from search import SearchIndex  # noqa: E402
+
+COMMON = ('the', 'of', 'love', 'you', 'me', 'my', 'in', 'a', 'remix', 'live', 'feat', 'night',
+	'heart', 'i', 'to', 'and', 'dance', 'time', 'world', 'edit', 'version', 'baby', 'dream', 'fire')
+LETTERS = 'etaoinshrdlcumwfgypbvkjxqz'
+ROWS = 30  # rows visible in the playlist view
+
+
+def vocabulary(rng, size=30000):
+	"""Common words plus pseudo-words with English-like letter frequencies."""
+	weights = [26 - i for i in range(len(LETTERS))]
+	made = set(COMMON)
+	while len(made) < size:
+		made.add(''.join(rng.choices(LETTERS, weights, k=rng.randint(3, 9))))
+	rare = sorted(made - set(COMMON))
+	rng.shuffle(rare)
+	vocab = list(COMMON) + rare
+	# Zipf-like: word k is picked with weight 1/k
+	cum = []
+	total = 0.0
+	for k in range(1, len(vocab) + 1):
+		total += 1.0 / k
+		cum.append(total)
+	return vocab, cum
+
+
+def phrase(rng, vocab, lo, hi):
+	words, cum = vocab
+	return ' '.join(w.title() for w in rng.choices(words, cum_weights=cum, k=rng.randint(lo, hi)))
+
+
+def library(count, rng, root='/home/listener/Music'):
+	"""Return [(path, (title, artist))] grouped by artist and album."""
+	vocab = vocabulary(rng)
+	tracks = []
+	while len(tracks) < count:
+		artist = phrase(rng, vocab, 1, 3)
+		for _ in range(rng.randint(1, 8)):
+			album = phrase(rng, vocab, 1, 4)
+			for n in range(1, rng.randint(6, 16)):
+				title = phrase(rng, vocab, 1, 5)
+				path = f'{root}/{artist}/{album}/{n:02d} - {title}.mp3'
+				tracks.append((path, (title, artist)))
+	return tracks[:count]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--tracks', type=int, default=100000)
+	parser.add_argument('--queries', type=int, default=40, help='random queries typed after the fixed ones')
+	parser.add_argument('--memory', action='store_true', help='also report memory use (slow)')
+	args = parser.parse_args(argv)
+	rng = random.Random(7)
+	entries = library(args.tracks, rng)
+	tags = dict(entries)
+
+	if args.memory:
+		# Traced separately: tracemalloc slows the build and leaves the heap cold
+		tracemalloc.start()
+		SearchIndex(Playlist([path for path, _ in entries]), tags_for=tags.get)
+		size, _peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		print(f'memory: {size / 2**20:.0f} MB for playlist + index')
+
+	playlist = Playlist()
+	t0 = time.perf_counter()
+	index = SearchIndex(playlist, tags_for=tags.get)
+	playlist.extend([path for path, _ in entries])
+	build = time.perf_counter() - t0
+	# The build leaves millions of new objects; the app runs this full
+	# collection while idle after an import, not on a keystroke
+	t0 = time.perf_counter()
+	gc.collect()
+	collect = time.perf_counter() - t0
+	print(f'{len(playlist):,} tracks: playlist + index built in {1000 * build:.0f} ms, '
+		f'{len(index._postings):,} distinct words, full gc {1000 * collect:.0f} ms')
+
+	# Type fixed worst cases (one letter, the shared folder, the extension), then
+	# real titles/artists taken from the library
+	queries = ['m', 'music', 'mp3', 'e', 'the', 'listener mp3', 'zzzz']
+	for _ in range(args.queries):
+		path, (title, artist) = rng.choice(entries)
+		source = rng.choice((title, artist, f'{artist} {title}', title.split()[0][1:]))
+		queries.append(source.lower()[:rng.randint(4, 18)])
+	times = []
+	worst = (0.0, '')
+	for query in queries:
+		for i in range(1, len(query) + 1):
+			typed = query[:i]
+			t0 = time.perf_counter()
+			results = index.search(typed)
+			# A keystroke also draws the first screenful of rows
+			for row in range(min(ROWS, len(results))):
+				results[row]
+			elapsed = 1000 * (time.perf_counter() - t0)
+			times.append(elapsed)
+			if elapsed > worst[0]:
+				worst = (elapsed, typed, 0 if results is None else len(results))
+	print(f'{len(times)} keystrokes over {len(queries)} queries: median {statistics.median(times):.2f} ms, '
+		f'p99 {sorted(times)[int(len(times) * 0.99)]:.2f} ms, worst {worst[0]:.2f} ms '
+		f'({worst[1]!r}, {worst[2]:,} matches) -> {"OK" if worst[0] < 16 else "over"} the 16 ms budget')
+
+	# Incremental maintenance
+	extra = library(1000, random.Random(8), root='/media/usb')
+	tags.update(extra)
+	t0 = time.perf_counter()
+	added = playlist.extend([path for path, _ in extra])
+	t1 = time.perf_counter()
+	playlist.delete(playlist.index_of(added[0]), len(added))
+	t2 = time.perf_counter()
+	for track in list(playlist)[:1000]:
+		index.set_tags(track.path, 'Renamed Title', 'Some Artist')
+	t3 = time.perf_counter()
+	print(f'add 1,000: {1000 * (t1 - t0):.1f} ms, delete 1,000: {1000 * (t2 - t1):.1f} ms, '
+		f'retag 1,000: {1000 * (t3 - t2):.1f} ms')
+	t0 = time.perf_counter()
+	playlist.clear()
+	print(f'clear: {1000 * (time.perf_counter() - t0):.1f} ms')
+
+
+if __name__ == '__main__':
+	main()
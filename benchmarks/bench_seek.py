@@ -0,0 +1,182 @@
+"""Seek latency and position accuracy harness for PlayerEngine.
+
+Runs under SDL's dummy audio driver, which consumes audio in real time like a
+sound card. Ground truth comes from the audio itself: a WAV of known length
+ends exactly (length - target) seconds after a seek that landed on target.
+So the moment get_busy() drops dates the seek, and every position sampled
+before it can be checked against "length minus time left". The gap between
+get_busy() dropping and the real end (the last mixer buffer) is calibrated by
+playing a short file from the start a few times.
+
+Reports:
+
+- seek() latency, against repositioning the stream in place with
+  ``set_pos()`` and against a full reload
+- where seeks land with ``play(start=...)`` (what seek() uses) and with
+  ``set_pos()``. The dummy driver is jittery, so the median is shown.
+  SDL_mixer's WAV decoder also only seeks to whole seconds, so targets here
+  are whole seconds.
+- the error of positions sampled at UI-like poll intervals, with and
+  without a pause/resume after the seek: ``PlaybackClock`` against the old
+  ``offset + get_pos()`` estimate. The constant part (bias) is output
+  latency that neither estimate can see. The jitter around it comes from
+  the steps get_pos() moves in and the driver's own timing.
+
+    python benchmarks/bench_seek.py [--trials 3] [--seconds 8]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import engine  # noqa: E402
+from bench_peaks import write_long_tone  # noqa: E402
+from playlist import Playlist  # noqa: E402
+
+
+def wait_end(music, poll=0.001):
+	while music.get_busy():
+		time.sleep(poll)
+	return time.monotonic()
+
+
+def calibrate(path, seconds, runs=5):
+	"""Seconds between get_busy() dropping and the real end of a track played from 0."""
+	music = engine.pygame.mixer.music
+	early = []
+	for _ in range(runs):
+		music.load(path)
+		music.play()
+		t0 = time.monotonic()
+		early.append(seconds - (wait_end(music) - t0))
+	return statistics.median(early)
+
+
+def latency(player, music, rng, length, count=200):
+	"""Microseconds per seek by method, while playing."""
+	results = {}
+	player.play_index(0)
+	for name in ('seek()', 'set_pos', 'reload'):
+		times = []
+		for _ in range(count):
+			target = rng.uniform(0, length - 2)
+			t0 = time.perf_counter()
+			if name == 'seek()':
+				player.seek(target)
+			elif name == 'set_pos':
+				music.set_pos(target)
+			else:
+				music.load(player.current.path)
+				music.play(loops=0, start=target)
+			times.append(1e6 * (time.perf_counter() - t0))
+		results[name] = (statistics.median(times), max(times))
+	player.stop()
+	return results
+
+
+def landing(player, length, bias, target, method):
+	"""Where a seek to ``target`` landed, in seconds from it, judged by when the track ends."""
+	player.play_index(0)
+	time.sleep(0.1)
+	if method == 'set_pos':
+		player._music.set_pos(target)
+	else:
+		player.seek(target)
+	t_seek = time.monotonic()
+	end = wait_end(player._music) + bias
+	player.stop()
+	return length - (end - t_seek) - target
+
+
+def trial(player, length, bias, target, poll, pause):
+	"""Seek near the end and sample positions until it.
+
+	Returns (errors, backward steps) for the clock and for the old estimate.
+	"""
+	player.play_index(0)
+	time.sleep(0.1)
+	music = player._music
+	player.seek(target)
+	if pause:
+		time.sleep(0.2)
+		player.pause()
+		time.sleep(0.25)
+		player.resume()
+	samples = []
+	due = time.monotonic()
+	# Watch for the end every millisecond, but sample positions only every ``poll``
+	while music.get_busy():
+		now = time.monotonic()
+		if now >= due:
+			mixer_ms = music.get_pos()
+			# The old estimate: seek offset + get_pos()
+			naive = target + mixer_ms / 1000.0
+			samples.append((now, player.position(), naive))
+			due = now + poll
+		time.sleep(0.001)
+	end = time.monotonic() + bias
+	player.stop()
+	results = []
+	for k in (1, 2):
+		errors = [sample[k] - (length - (end - sample[0])) for sample in samples]
+		backwards = sum(1 for a, b in zip(samples, samples[1:]) if b[k] < a[k])
+		results.append((errors, backwards))
+	return results
+
+
+def summary(trials):
+	"""Mean error over all trials, jitter around each trial's own mean, backward steps."""
+	errors = [e for errs, _ in trials for e in errs]
+	residuals = [e - statistics.mean(errs) for errs, _ in trials for e in errs]
+	backwards = sum(b for _, b in trials)
+	return (f'bias {1000 * statistics.mean(errors):+4.0f} ms, jitter {1000 * statistics.pstdev(residuals):4.1f} ms, '
+		f'{backwards} backward steps')
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--trials', type=int, default=3, help='seeks per position configuration')
+	parser.add_argument('--landings', type=int, default=10, help='seeks per method for landing accuracy')
+	parser.add_argument('--seconds', type=int, default=8, help='length of the test track')
+	args = parser.parse_args(argv)
+	rng = random.Random(3)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		track = os.path.join(tmp, 'tone.wav')
+		short = os.path.join(tmp, 'short.wav')
+		write_long_tone(track, args.seconds)
+		write_long_tone(short, 2)
+		player = engine.PlayerEngine(Playlist([track]), gapless=False)
+		player.init_mixer()
+		bias = calibrate(short, 2)
+		print(f'mixer {engine.pygame.mixer.get_init()}, get_busy() drops {1000 * bias:.0f} ms before the end')
+
+		for name, (median, worst) in latency(player, player._music, rng, args.seconds).items():
+			print(f'seek latency, {name:<8}: median {median:7.1f} us, worst {worst:7.1f} us')
+
+		for method in ('play(start)', 'set_pos'):
+			offsets = [landing(player, args.seconds, bias, args.seconds - rng.choice((1, 2)), method)
+				for _ in range(args.landings)]
+			print(f'{method:<11} lands {1000 * statistics.median(offsets):+5.0f} ms from the target '
+				f'(median of {len(offsets)}; spread {1000 * min(offsets):+.0f} to {1000 * max(offsets):+.0f} ms)')
+
+		for poll in (0.01, 0.1, 0.25):
+			for pause in (False, True):
+				clock, naive = [], []
+				for _ in range(args.trials):
+					c, n = trial(player, args.seconds, bias, args.seconds - rng.choice((1, 2)), poll, pause)
+					clock.append(c)
+					naive.append(n)
+				label = f'poll {int(1000 * poll)} ms{", pause" if pause else ""}'
+				print(f'{label:<18} clock {summary(clock)} | offset+get_pos {summary(naive)}')
+
+if __name__ == '__main__':
+	main()
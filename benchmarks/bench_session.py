@@ -0,0 +1,102 @@
+"""Session persistence benchmark: journal appends, snapshots, restore, M3U/PLS.
+
+Builds a synthetic 100,000-track playlist (the same library generator as
+bench_search.py) and reports:
+
+- the cost of journaling one insert, delete or move (the budget is a
+  millisecond, so saving on every mutation never stalls the UI)
+- snapshot (compaction) time and file size, and restore time from a
+  snapshot and from a snapshot plus a long journal
+- export and streaming import of M3U8 and PLS, with the import's peak
+  memory, which should stay flat rather than grow with the file
+
+    python benchmarks/bench_session.py [--tracks 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_search import library  # noqa: E402
+from playlist import Playlist  # noqa: E402
+from playlist_io import read_playlist, write_playlist  # noqa: E402
+from session import SessionStore  # noqa: E402
+
+
+def per_op(store, playlist, rng, count=1000):
+	"""Microseconds spent journaling each kind of change (the store's listener alone)."""
+	results = {}
+	n = len(playlist)
+	for kind in ('insert', 'delete', 'move'):
+		times = []
+		for _ in range(count):
+			index = rng.randrange(n)
+			args = (index, rng.randrange(n)) if kind == 'move' else (index, [playlist[index]])
+			t0 = time.perf_counter()
+			store._on_playlist_changed(kind, *args)
+			times.append(1e6 * (time.perf_counter() - t0))
+		results[kind] = (statistics.median(times), max(times))
+	return results
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--tracks', type=int, default=100000)
+	args = parser.parse_args(argv)
+	rng = random.Random(5)
+	paths = [path for path, _ in library(args.tracks, rng)]
+
+	with tempfile.TemporaryDirectory() as tmp:
+		journal = os.path.join(tmp, 'session.bin')
+		playlist = Playlist(paths)
+		store = SessionStore(journal, compact_records=10 ** 9)
+		store.load()
+		t0 = time.perf_counter()
+		store.attach(playlist, {'index': 0, 'volume': 1.0})
+		snapshot = time.perf_counter() - t0
+		size = os.path.getsize(journal)
+		print(f'{len(playlist):,} tracks: snapshot {1000 * snapshot:.1f} ms, {size / 2**20:.1f} MB '
+			f'({size / len(playlist):.0f} bytes/track)')
+
+		t0 = time.perf_counter()
+		restored, state = SessionStore(journal).load()
+		ok = restored == [track.path for track in playlist] and state == {'index': 0, 'volume': 1.0}
+		print(f'restore from snapshot: {1000 * (time.perf_counter() - t0):.1f} ms, playlist and state match: {ok}')
+
+		for kind, (median, worst) in per_op(store, playlist, rng).items():
+			print(f'journal one {kind}: median {median:.1f} us, worst {worst:.1f} us')
+		t0 = time.perf_counter()
+		for _ in range(1000):
+			store.save_state({'index': 1, 'position': 12.5, 'volume': 0.8, 'skin': 'default'})
+		print(f'journal state: {1000 * (time.perf_counter() - t0):.1f} us each')
+
+		t0 = time.perf_counter()
+		SessionStore(journal).load()
+		print(f'restore from snapshot + {store.records:,} records: {1000 * (time.perf_counter() - t0):.1f} ms')
+		store.close()
+
+		for ext in ('.m3u8', '.pls'):
+			target = os.path.join(tmp, 'export' + ext)
+			t0 = time.perf_counter()
+			written = write_playlist(target, playlist, length=lambda path: 215)
+			t1 = time.perf_counter()
+			read = sum(1 for _ in read_playlist(target))
+			t2 = time.perf_counter()
+			# Traced separately: tracemalloc slows the parse down several times
+			tracemalloc.start()
+			sum(1 for _ in read_playlist(target))
+			_size, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			print(f'{ext[1:]}: export {written:,} in {1000 * (t1 - t0):.0f} ms, import {read:,} in '
+				f'{1000 * (t2 - t1):.0f} ms, {os.path.getsize(target) / 2**20:.1f} MB file, '
+				f'import peak memory {peak / 1024:.0f} KB')
+
+
+if __name__ == '__main__':
+	main()
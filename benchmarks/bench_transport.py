@@ -0,0 +1,91 @@
+"""Headless transport benchmark for PlayerEngine.
+
+Drives play/pause/seek/next/previous/stop in a tight loop under SDL's dummy
+audio driver (no display, no sound card) and reports operations per second.
+
+    python benchmarks/bench_transport.py [--ops 5000] [--tracks 20]
+"""
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from engine import PlayerEngine  # noqa: E402
+from playlist import Playlist  # noqa: E402
+
+
+def write_tone(path, seconds, rate=44100):
+	"""Write a short stereo 16-bit sine WAV (SDL_mixer plays WAV everywhere)."""
+	frames = int(seconds * rate)
+	sample = struct.Struct('<hh')
+	data = bytearray()
+	for i in range(frames):
+		v = int(8000 * math.sin(i * 2 * math.pi * 440 / rate))
+		data += sample.pack(v, v)
+	with wave.open(path, 'wb') as w:
+		w.setnchannels(2)
+		w.setsampwidth(2)
+		w.setframerate(rate)
+		w.writeframes(bytes(data))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--ops', type=int, default=5000, help='transport operations to run')
+	parser.add_argument('--tracks', type=int, default=20, help='playlist length')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args(argv)
+
+	rng = random.Random(args.seed)
+	with tempfile.TemporaryDirectory() as tmp:
+		paths = []
+		for i in range(args.tracks):
+			path = os.path.join(tmp, f'tone{i:03d}.wav')
+			write_tone(path, 2.0)
+			paths.append(path)
+
+		engine = PlayerEngine(Playlist(paths))
+		engine.init_mixer()
+		changes = [0]
+		engine.subscribe(lambda kind, *a: changes.__setitem__(0, changes[0] + 1))
+
+		ops = [
+			('play_index', lambda: engine.play_index(rng.randrange(args.tracks))),
+			('toggle_pause', engine.toggle_pause),
+			('seek', lambda: engine.seek(rng.random() * 1.5)),
+			('next', engine.next),
+			('previous', engine.previous),
+			('stop', engine.stop),
+			('poll', engine.poll),
+		]
+		counts = {name: 0 for name, _ in ops}
+		totals = {name: 0.0 for name, _ in ops}
+		engine.play_index(0)
+		start = time.perf_counter()
+		for _ in range(args.ops):
+			name, op = rng.choice(ops)
+			t0 = time.perf_counter()
+			op()
+			totals[name] += time.perf_counter() - t0
+			counts[name] += 1
+		elapsed = time.perf_counter() - start
+		engine.stop()
+
+	print(f'{args.ops} ops in {elapsed:.3f}s -> {args.ops / elapsed:,.0f} ops/s ({changes[0]} notifications)')
+	print(f"end events: {'pygame' if engine.end_events else 'polling fallback'}")
+	for name, _ in ops:
+		if counts[name]:
+			print(f'  {name:<13} {counts[name]:>6}  {1e6 * totals[name] / counts[name]:8.1f} us/op')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,557 @@
+"""Headless playback engine for the MP3 player.
+
+``PlayerEngine`` owns the transport state (stopped/playing/paused), the
+current and gapless-queued tracks, the seek offset and the pygame mixer. It
+has no Tk dependency: a front end calls the transport methods, calls
+``poll()`` every few milliseconds (from a Tk ``after`` loop or any plain loop)
+and subscribes to change notifications to update its widgets.
+
+pygame is imported and the mixer opened on first playback, not at import time,
+so front ends can show a window before paying for SDL initialization.
+
+With a crossfade set, tracks are played through a ``MixingStream``
+(mixing.py) in place of ``pygame.mixer.music``. It has the same interface,
+so the transport code below doesn't change.
+
+Which track follows which is up to a ``PlayOrder`` (playorder.py): linear or
+shuffled, with repeat-one/all and a history for Back. Tracks in the
+``PlayQueue`` ("up next") play before the order resumes.
+
+``PlaybackClock`` turns seek offsets, ``get_pos()`` and a monotonic clock into
+a position that doesn't run backwards between seeks.
+"""
+import os
+import time
+from itertools import islice
+
+from playorder import PlayOrder, PlayQueue, REPEAT_ONE
+
+STOPPED = 'stopped'
+PLAYING = 'playing'
+PAUSED = 'paused'
+
+# pygame module, imported by PlayerEngine.init_mixer()
+pygame = None
+
+
+class PlaybackClock:
+	"""Position within the current track, in seconds.
+
+	``get_pos()`` only counts audio handed to the sound device, so it moves in
+	steps of one mixer buffer (tens of milliseconds). It stops while paused and
+	restarts at zero when ``play(start=...)`` restarts the stream, but keeps
+	counting through ``set_pos()``. The clock keeps the offset a stream or seek
+	started at, plus the ``get_pos()`` reading at that moment. It advances with
+	the monotonic clock and is held between that mixer reading and ``slack``
+	seconds past it, and never runs backwards between seeks. Under the dummy
+	driver its error measures the same as offset + get_pos()
+	(benchmarks/bench_seek.py).
+	"""
+	def __init__(self, slack=0.2, clock=time.monotonic):
+		self.slack = slack
+		self.clock = clock
+		self.offset = 0.0  # track position at mixer_base
+		self.mixer_base = 0  # get_pos() reading when offset was set, in ms
+		self.running = False
+		self._anchor = 0.0  # position at _anchor_t
+		self._anchor_t = 0.0
+		self._reported = 0.0
+
+	def start(self, offset, mixer_ms=0, running=True):
+		"""The stream is at ``offset`` seconds now, when get_pos() reads ``mixer_ms``."""
+		self.offset = float(offset)
+		self.mixer_base = max(0, mixer_ms)
+		self.running = running
+		self._anchor = self._reported = self.offset
+		self._anchor_t = self.clock()
+
+	def pause(self, mixer_ms):
+		self._reported = self.position(mixer_ms)
+		self.running = False
+
+	def resume(self, mixer_ms):
+		self._anchor = self.position(mixer_ms)
+		self._anchor_t = self.clock()
+		self.running = True
+
+	def position(self, mixer_ms):
+		"""Current position given a fresh get_pos() reading (negative if not playing)."""
+		if not self.running:
+			return self._reported
+		now = self.clock()
+		pos = self._anchor + (now - self._anchor_t)
+		if mixer_ms >= 0:
+			played = self.offset + max(0, mixer_ms - self.mixer_base) / 1000.0
+			if not played <= pos <= played + self.slack:
+				# Behind the audio (late start of polling) or ahead of it
+				# (device stall): pull back within range and go on from there
+				pos = min(max(pos, played), played + self.slack)
+				self._anchor = pos
+				self._anchor_t = now
+		pos = max(pos, self._reported)
+		self._reported = pos
+		return pos
+
+
+class PlayerEngine:
+	"""Transport state machine over ``pygame.mixer.music`` for a Playlist.
+
+	Listeners registered with ``subscribe`` are called as ``callback(kind, *args)``:
+
+	- ``('track', track, index)`` when a track starts, including gapless switches
+	  (``index`` is None if the track is no longer in the playlist)
+	- ``('state', state)`` when the transport state changes
+	- ``('error', track, message)`` when a track can't be loaded (a format
+	  SDL_mixer can't decode, or a missing file)
+
+	``gain_for``, if set, is called with each track as it starts and returns a
+	linear factor (0.0-1.0) applied on top of ``volume`` - loudness
+	normalization plugs in here.
+
+	``crossfade`` (seconds, 0 for none) overlaps each track's end with the next
+	one's start; see ``set_crossfade``.
+
+	``cache`` (an AudioCache, or None) keeps recently played files in memory:
+	their bytes for pygame.mixer.music, decoded audio for the MixingStream.
+	Play, next/previous, queueing and seek reloads all go through it.
+
+	``order`` (a PlayOrder) picks the tracks next/previous and the
+	end-of-track advance go to; see ``set_shuffle`` and ``set_repeat``.
+	``up_next`` (a PlayQueue) comes first: next and the advance take its
+	head, and once it's empty the order carries on after the last track
+	played from the playlist rather than from the queue.
+
+	``prefetcher`` (a Prefetcher, or None) reads the next few tracks ahead
+	in the background whenever a track starts or the order changes.
+	"""
+	def __init__(self, playlist, gapless=True, crossfade=0.0, cache=None, prefetcher=None):
+		self.playlist = playlist
+		self.gapless = gapless
+		self.crossfade = crossfade
+		self.cache = cache
+		self.prefetcher = prefetcher
+		self.order = PlayOrder(playlist)
+		self.up_next = PlayQueue(playlist)
+		self._resume_from = None  # last track started from the playlist rather than the queue
+		self.state = STOPPED
+		self.current = None  # Track being played
+		self.queued = None  # Track handed to SDL_mixer to follow it
+		self.seek_offset = 0.0  # where the current stream or last seek started, in seconds
+		self.clock = PlaybackClock()
+		self.volume = 1.0
+		self.gain_for = None  # callable(track) -> per-track gain factor
+		self.track_gain = 1.0
+		self.end_events = False
+		self._track_end = None  # pygame event type posted when a stream ends
+		self._music = None  # pygame.mixer.music, or the MixingStream while crossfading
+		self._mixing = None
+		self._last_pos = 0
+		self._listeners = []
+		playlist.subscribe(self._on_playlist_changed)
+		self.up_next.subscribe(self._on_playlist_changed)
+
+	def init_mixer(self):
+		"""Import pygame and open the mixer and end-of-track events (idempotent)."""
+		global pygame
+		if self._music is not None:
+			return
+		if pygame is None:
+			import pygame
+		if not pygame.mixer.get_init():
+			pygame.mixer.init()
+		self._music = pygame.mixer.music
+		self._music.set_volume(self.volume * self.track_gain)
+		try:
+			# pygame's event queue needs the video subsystem; no window is opened
+			pygame.display.init()
+			self._track_end = pygame.USEREVENT + 1
+			pygame.event.set_blocked(None)
+			pygame.event.set_allowed(self._track_end)
+			self._music.set_endevent(self._track_end)
+			self.end_events = True
+		except Exception:
+			# poll() falls back to watching get_busy()/get_pos()
+			self.end_events = False
+		if self.crossfade > 0 and not self._use_stream(True):
+			self.crossfade = 0.0
+
+	# ----- notifications -----
+	def subscribe(self, callback):
+		self._listeners.append(callback)
+
+	def _notify(self, kind, *args):
+		for callback in list(self._listeners):
+			callback(kind, *args)
+
+	def _set_state(self, state):
+		if state != self.state:
+			self.state = state
+			self._notify('state', state)
+
+	# ----- queries -----
+	@property
+	def index(self):
+		"""Playlist index of the current track, or None."""
+		if self.current is None:
+			return None
+		try:
+			return self.playlist.index_of(self.current)
+		except ValueError:
+			return None
+
+	def following(self, auto=False):
+		"""Track that plays after the current one: the head of the play queue,
+		else the next in play order (the current one again with repeat-one,
+		if ``auto``). None at the end."""
+		if auto and self.order.repeat == REPEAT_ONE and self.current is not None:
+			return self.order.after(self.current, auto=True)
+		track = self.up_next.peek()
+		if track is not None:
+			return track
+		return self.order.after(self._anchor())
+
+	def upcoming(self, count):
+		"""The next ``count`` tracks to play (fewer at the end): the play queue,
+		then the play order."""
+		tracks = list(islice(self.up_next, count))
+		anchor = track = self._anchor()
+		while len(tracks) < count:
+			track = self.order.after(track)
+			# With repeat-all the order comes round to where it started
+			if track is None or track is anchor:
+				break
+			tracks.append(track)
+		return tracks
+
+	def _anchor(self):
+		"""The track the play order continues from once the play queue is empty."""
+		if self._resume_from is not None and self._resume_from.id in self.playlist:
+			return self._resume_from
+		return self.current
+
+	def position(self):
+		"""Seconds into the current track (see PlaybackClock)."""
+		if self._music is None or self.current is None:
+			return 0.0
+		return self.clock.position(self._music.get_pos())
+
+	# ----- transport -----
+	def play_index(self, index, start=0):
+		"""Load the track at ``index`` and start it.
+
+		Returns False if ``index`` is out of range or the track can't be loaded.
+		"""
+		if not 0 <= index < len(self.playlist):
+			return False
+		self.init_mixer()
+		track = self.playlist[index]
+		from_queue = self.up_next.peek() is track
+		if not from_queue:
+			self._resume_from = track
+		self._apply_gain(track)
+		if self.prefetcher is not None:
+			# Once per track start; queue refreshes and seek reloads don't count
+			self.prefetcher.opened(track.path)
+		try:
+			self._music.load(*self._source(track.path))
+			self._music.play(loops=0, start=start)
+		except Exception as e:
+			# A failed load() leaves the previous stream playing
+			self.stop()
+			if from_queue:
+				self.up_next.take(track)
+			self._notify('error', track, str(e))
+			return False
+		# load() discarded anything queued
+		self.queued = None
+		self.current = track
+		self.order.started(track)
+		if from_queue:
+			self.up_next.take(track)
+		self.seek_offset = float(start)
+		self.clock.start(start)
+		self._last_pos = 0
+		# An end event from the track we just replaced must not skip the new one
+		self._clear_end_events()
+		self._queue_next()
+		self._prefetch()
+		self._set_state(PLAYING)
+		self._notify('track', track, index)
+		return True
+
+	def pause(self):
+		if self.state == PLAYING:
+			self._music.pause()
+			self.clock.pause(self._music.get_pos())
+			self._set_state(PAUSED)
+
+	def resume(self):
+		if self.state == PAUSED:
+			self._music.unpause()
+			self.clock.resume(self._music.get_pos())
+			self._set_state(PLAYING)
+
+	def toggle_pause(self):
+		if self.state == PLAYING:
+			self.pause()
+		else:
+			self.resume()
+
+	def stop(self):
+		if self._music is not None:
+			# Also discards any queued track; drop the end event stop() posts
+			self._music.stop()
+			self._clear_end_events()
+		self.current = None
+		self.queued = None
+		self.seek_offset = 0.0
+		self.clock.start(0.0, running=False)
+		self._set_state(STOPPED)
+
+	def next(self):
+		"""Play the head of the play queue or the next track in play order;
+		returns False at the end."""
+		return self._play_track(self.following())
+
+	def previous(self):
+		"""Play the track before the current one (in shuffle, the one played
+		before it); returns False at the start."""
+		return self._play_track(self.order.before(self.current))
+
+	def _play_track(self, track):
+		if track is None:
+			return False
+		return self.play_index(self.playlist.index_of(track))
+
+	def seek(self, seconds):
+		"""Jump within the current track; resumes playback if paused.
+
+		The already-loaded stream is restarted at the target, and the file is
+		only reloaded if that fails. ``set_pos()`` would reposition it in
+		place, but it plays out the buffer already decoded first, so it lands
+		one mixer buffer late (benchmarks/bench_seek.py).
+		"""
+		if self.current is None:
+			return False
+		seconds = max(0.0, float(seconds))
+		try:
+			self._music.play(loops=0, start=seconds)
+		except Exception:
+			index = self.index
+			if index is None:
+				return False
+			try:
+				self._music.load(*self._source(self.current.path))
+				self._music.play(loops=0, start=seconds)
+			except Exception:
+				return False
+			self.queued = None
+			self._queue_next()
+		# get_pos() restarts from zero after play(start=...)
+		self.seek_offset = seconds
+		self.clock.start(seconds)
+		self._last_pos = 0
+		self._clear_end_events()
+		self._set_state(PLAYING)
+		return True
+
+	def set_volume(self, volume):
+		"""Set the music volume (0.0-1.0); applied when the mixer opens if not yet."""
+		self.volume = volume
+		if self._music is not None:
+			self._music.set_volume(volume * self.track_gain)
+
+	def _apply_gain(self, track):
+		gain = 1.0
+		if self.gain_for is not None and track is not None:
+			try:
+				gain = max(0.0, min(1.0, float(self.gain_for(track))))
+			except Exception:
+				gain = 1.0
+		self.track_gain = gain
+		if self._music is not None:
+			self._music.set_volume(self.volume * gain)
+
+	def refresh_gain(self):
+		"""Re-evaluate ``gain_for`` for the current track (e.g. once its analysis lands)."""
+		self._apply_gain(self.current)
+
+	def set_gapless(self, enabled):
+		"""Toggle gapless mode. Turning it off applies from the next track,
+		since SDL_mixer cannot drop a queued track without stopping."""
+		self.gapless = bool(enabled)
+		if self.gapless and self.state != STOPPED:
+			self._queue_next()
+
+	def set_shuffle(self, enabled):
+		"""Play in a shuffled order (from the current track on) or in playlist order."""
+		self.order.set_shuffle(enabled)
+		self._requeue()
+
+	def set_repeat(self, mode):
+		"""``playorder.REPEAT_OFF``, ``REPEAT_ALL`` or ``REPEAT_ONE``."""
+		self.order.set_repeat(mode)
+		self._requeue()
+
+	def set_crossfade(self, seconds):
+		"""Overlap the end of each track with the start of the next by ``seconds``.
+
+		Any crossfade plays tracks through a MixingStream, and 0 goes back to
+		``pygame.mixer.music``. Switching carries the current track on from
+		where it is. Returns False (and changes nothing) if the MixingStream
+		can't be used, e.g. without numpy.
+		"""
+		seconds = max(0.0, float(seconds))
+		if self._music is not None and not self._use_stream(seconds > 0):
+			return False
+		self.crossfade = seconds
+		if self._mixing is not None:
+			self._mixing.set_crossfade(seconds)
+		if self.crossfade and self.state != STOPPED:
+			self._queue_next()
+		return True
+
+	def _use_stream(self, mixing):
+		"""Play through the MixingStream (True) or pygame.mixer.music; False if unavailable."""
+		if mixing and self._mixing is None:
+			try:
+				from mixing import MixingStream
+				self._mixing = MixingStream(self.crossfade or 1.0, cache=self.cache)
+			except Exception as e:
+				print('Crossfade unavailable:', e)
+				return False
+		stream = self._mixing if mixing else pygame.mixer.music
+		if stream is self._music:
+			return True
+		state, index, position = self.state, self.index, self.position()
+		if self.state != STOPPED:
+			self._music.stop()
+		self._music = stream
+		# The MixingStream plays very long tracks on pygame.mixer.music, whose
+		# own end events must not reach the engine then
+		if self.end_events:
+			if mixing:
+				pygame.mixer.music.set_endevent()
+			stream.set_endevent(self._track_end)
+		self._music.set_volume(self.volume * self.track_gain)
+		if state != STOPPED and index is not None:
+			self.play_index(index, start=position)
+			if state == PAUSED:
+				self.pause()
+		elif state != STOPPED:
+			self.stop()
+		return True
+
+	def close(self):
+		"""Stop playback, the MixingStream's threads and the prefetcher."""
+		self.stop()
+		if self._mixing is not None:
+			self._mixing.close()
+		if self.prefetcher is not None:
+			self.prefetcher.close()
+
+	def _source(self, path):
+		"""Arguments for load()/queue(): the cached file for pygame.mixer.music
+		(with its extension as the type hint; the path on a miss, read in the
+		background), or the path for the MixingStream, which caches decoded
+		audio itself."""
+		if self.cache is None or self._music is self._mixing:
+			return path, ''
+		return self.cache.raw(path), os.path.splitext(path)[1][1:].lower()
+
+	# ----- gapless queue -----
+	def _queue_next(self):
+		"""Pre-load the track that follows the current one so SDL_mixer starts it
+		without a gap (or, while crossfading, so the MixingStream decodes it ahead)."""
+		track = self.following(auto=True) if self.gapless or self.crossfade else None
+		if track is None:
+			self.queued = None
+			return
+		if track is self.queued:
+			return
+		try:
+			self._music.queue(*self._source(track.path))
+		except Exception:
+			self.queued = None
+			return
+		self.queued = track
+
+	def _on_playlist_changed(self, kind, *args):
+		# Re-queue if edits to the playlist or the play queue changed which
+		# track follows the current one
+		self._requeue()
+
+	def _requeue(self):
+		if self.state == STOPPED:
+			return
+		if (self.gapless or self.crossfade) and self.index is not None:
+			self._queue_next()
+		self._prefetch()
+
+	def _prefetch(self):
+		"""Have the prefetcher read the next tracks ahead: into the cache on
+		pygame.mixer.music, into the page cache for the MixingStream's decoder."""
+		if self.prefetcher is None or not self.prefetcher.tracks:
+			return
+		cache = self.cache if self._music is not self._mixing else None
+		self.prefetcher.prefetch([track.path for track in self.upcoming(self.prefetcher.tracks)], cache)
+
+	# ----- end of track -----
+	def _clear_end_events(self):
+		if self.end_events:
+			pygame.event.clear(self._track_end)
+
+	def poll(self):
+		"""Handle end-of-track; call every few milliseconds from the host loop."""
+		if self.state == STOPPED:
+			return
+		if self.end_events:
+			ended = bool(pygame.event.get(self._track_end))
+		else:
+			ended = self._poll_track_end()
+		if ended:
+			self._on_track_end()
+
+	def _poll_track_end(self):
+		# get_pos() drops back towards zero when a queued track takes over;
+		# get_busy() goes false at the real end
+		if self.state == PAUSED:
+			return False
+		pos = self._music.get_pos()
+		switched = self.queued is not None and 0 <= pos < self._last_pos
+		self._last_pos = pos
+		return switched or not self._music.get_busy()
+
+	def _on_track_end(self):
+		if self.queued is not None and self._music.get_busy():
+			# Gapless: the queued track is already playing
+			track, self.queued = self.queued, None
+			self.current = track
+			self.order.started(track)
+			# Taking it off the play queue re-queues what follows it
+			if not self.up_next.take(track):
+				self._resume_from = track
+			self._apply_gain(track)
+			# get_pos() restarted from zero when the queued track took over
+			self.seek_offset = 0.0
+			self.clock.start(0.0)
+			self._last_pos = 0
+			index = self.index
+			if index is not None:
+				self._queue_next()
+			self._prefetch()
+			self._notify('track', track, index)
+			return
+		# Nothing queued, or the queued track failed to start
+		self.queued = None
+		track = self.following(auto=True)
+		# Skip past tracks that fail to load rather than stopping at them (each
+		# one at most once, so repeat-all can't go round a dead playlist forever).
+		# A failed track has left the play queue or become the order's anchor.
+		for _ in range(len(self.playlist) + len(self.up_next)):
+			if track is None:
+				break
+			if self.play_index(self.playlist.index_of(track)):
+				return
+			track = self.following()
+		self.stop()
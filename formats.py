@@ -0,0 +1,480 @@
+"""Audio format registry: magic-byte sniffing and header-only probes.
+
+Each ``AudioFormat`` lists its file extensions and recognises its own first
+bytes (``match``). Its ``probe`` reads duration, bitrate, sample rate and
+title/artist tags from headers only. No audio is decoded, so a probe costs
+a few small reads however long the track is.
+
+``sniff(path)`` picks the format from the file's first bytes, after any
+ID3v2 tag. So a misnamed file is still probed by the right reader, and an
+extension is only used when the content isn't recognised. ``probe(path)``
+dispatches on the sniffed format. WAV, FLAC, Ogg Vorbis/Opus/FLAC and MP4/M4A
+headers are parsed here. MP3 goes through mutagen, since its length needs
+the Xing/VBRI headers or a frame scan. ``register`` adds a format.
+
+``playable`` marks the formats pygame's SDL_mixer can play. M4A/AAC is
+probed and listed, but can't be played.
+"""
+import os
+import struct
+
+# Bytes read for sniffing; every signature below fits in them
+SNIFF_BYTES = 64
+# Tag blocks larger than this (embedded cover art) are not read for title/artist
+MAX_TAG_BYTES = 1 << 20
+
+
+class AudioFormat:
+	"""A registered format: ``match(head)`` recognises its first bytes, ``probe(f)``
+	reads header fields from a binary file positioned at the start of the stream.
+	"""
+	def __init__(self, name, extensions, match, probe, playable=True):
+		self.name = name
+		self.extensions = tuple(extensions)
+		self.match = match
+		self.probe = probe
+		self.playable = playable
+
+	def __repr__(self):
+		return f'AudioFormat({self.name!r})'
+
+
+# Sniffed in this order; MP3's frame sync is the loosest test, so it goes last
+FORMATS = []
+
+
+def register(fmt):
+	FORMATS.append(fmt)
+	return fmt
+
+
+def extensions(playable=False):
+	"""Lower-case extensions (with the dot) of the registered formats."""
+	return frozenset(ext for fmt in FORMATS if fmt.playable or not playable for ext in fmt.extensions)
+
+
+def dialog_patterns():
+	"""Glob patterns of all registered extensions, for file dialogs."""
+	return ' '.join(f'*{ext}' for ext in sorted(extensions()))
+
+
+def _id3_size(head):
+	"""Length of an ID3v2 tag at the start of ``head``, or 0."""
+	if len(head) < 10 or head[:3] != b'ID3':
+		return 0
+	size = 0
+	for byte in head[6:10]:
+		size = (size << 7) | (byte & 0x7F)
+	# Flag 0x10: a 10-byte footer follows the tag
+	return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _sniff_open(f):
+	"""Return (format, stream offset) for an open file, or (None, 0)."""
+	head = f.read(SNIFF_BYTES)
+	offset = _id3_size(head)
+	if offset:
+		f.seek(offset)
+		head = f.read(SNIFF_BYTES)
+	for fmt in FORMATS:
+		if fmt.match(head):
+			return fmt, offset
+	if offset:
+		# An ID3 tag in front of something unrecognised: MP3 in practice
+		return by_name('mp3'), 0
+	return None, 0
+
+
+def by_name(name):
+	for fmt in FORMATS:
+		if fmt.name == name:
+			return fmt
+	return None
+
+
+def by_extension(path):
+	ext = os.path.splitext(path)[1].lower()
+	for fmt in FORMATS:
+		if ext in fmt.extensions:
+			return fmt
+	return None
+
+
+def sniff(path):
+	"""AudioFormat of ``path`` judged by its content, or None."""
+	try:
+		with open(path, 'rb') as f:
+			return _sniff_open(f)[0]
+	except OSError:
+		return None
+
+
+def probe(path):
+	"""Header fields of ``path`` as a dict (``length``, ``bitrate``, ``sample_rate``,
+	``title``, ``artist``), or None if the file can't be read or isn't audio.
+	Blocking; call from a worker thread.
+	"""
+	try:
+		with open(path, 'rb') as f:
+			fmt, offset = _sniff_open(f)
+			if fmt is None:
+				fmt, offset = by_extension(path), 0
+			if fmt is None:
+				return None
+			f.seek(offset)
+			fields = fmt.probe(f)
+	except (OSError, ValueError, struct.error, IndexError):
+		return None
+	if fields is None:
+		return None
+	fields.setdefault('length', 0.0)
+	fields.setdefault('bitrate', 0)
+	fields.setdefault('sample_rate', 0)
+	fields.setdefault('title', None)
+	fields.setdefault('artist', None)
+	fields['format'] = fmt.name
+	return fields
+
+
+def _file_size(f):
+	return os.fstat(f.fileno()).st_size
+
+
+def _bitrate(nbytes, length):
+	return int(nbytes * 8 / length) if length > 0 else 0
+
+
+def _vorbis_comments(data, pos=0):
+	"""title/artist from a Vorbis comment block (FLAC, Ogg); stops quietly if truncated."""
+	fields = {}
+	try:
+		vendor, = struct.unpack_from('<I', data, pos)
+		pos += 4 + vendor
+		count, = struct.unpack_from('<I', data, pos)
+		pos += 4
+		for _ in range(count):
+			size, = struct.unpack_from('<I', data, pos)
+			pos += 4
+			key, _sep, value = data[pos:pos + size].partition(b'=')
+			pos += size
+			key = key.decode('ascii', 'replace').lower()
+			if key in ('title', 'artist') and key not in fields:
+				fields[key] = value.decode('utf-8', 'replace')
+	except struct.error:
+		pass
+	return fields
+
+
+# ----- WAV -----
+_RIFF_FMT = struct.Struct('<HHII')  # format tag, channels, sample rate, bytes per second
+
+
+def _match_wav(head):
+	return head[:4] in (b'RIFF', b'RF64') and head[8:12] == b'WAVE'
+
+
+def _probe_wav(f):
+	head = f.read(12)
+	rate = byte_rate = 0
+	data_size = big_data_size = None
+	fields = {}
+	for _ in range(64):
+		chunk = f.read(8)
+		if len(chunk) < 8:
+			break
+		cid, size = struct.unpack('<4sI', chunk)
+		if cid == b'fmt ':
+			body = f.read(size + (size & 1))
+			_tag, _channels, rate, byte_rate = _RIFF_FMT.unpack_from(body)
+		elif cid == b'ds64':
+			# RF64: the real sizes live here when the 32-bit fields read 0xFFFFFFFF
+			body = f.read(size + (size & 1))
+			big_data_size, = struct.unpack_from('<Q', body, 8)
+		elif cid == b'LIST' and size <= MAX_TAG_BYTES:
+			body = f.read(size + (size & 1))
+			if body[:4] == b'INFO':
+				pos = 4
+				while pos + 8 <= len(body):
+					sub, sub_size = struct.unpack_from('<4sI', body, pos)
+					text = body[pos + 8:pos + 8 + sub_size].split(b'\0', 1)[0].decode('utf-8', 'replace')
+					if sub == b'INAM':
+						fields['title'] = text
+					elif sub == b'IART':
+						fields['artist'] = text
+					pos += 8 + sub_size + (sub_size & 1)
+		else:
+			if cid == b'data':
+				data_size = big_data_size if size == 0xFFFFFFFF and head[:4] == b'RF64' else size
+			f.seek(size + (size & 1), 1)
+	if not byte_rate or data_size is None:
+		return None
+	fields.update(length=data_size / byte_rate, bitrate=byte_rate * 8, sample_rate=rate)
+	return fields
+
+
+# ----- FLAC -----
+def _streaminfo(block):
+	"""(sample rate, total samples) from a FLAC STREAMINFO block."""
+	bits = int.from_bytes(block[10:18], 'big')
+	return bits >> 44, bits & ((1 << 36) - 1)
+
+
+def _match_flac(head):
+	return head[:4] == b'fLaC'
+
+
+def _probe_flac(f):
+	if f.read(4) != b'fLaC':
+		return None
+	rate = samples = 0
+	fields = {}
+	while True:
+		header = f.read(4)
+		if len(header) < 4:
+			break
+		kind = header[0] & 0x7F
+		size = int.from_bytes(header[1:4], 'big')
+		if kind == 0:
+			rate, samples = _streaminfo(f.read(size))
+		elif kind == 4 and size <= MAX_TAG_BYTES:
+			fields.update(_vorbis_comments(f.read(size)))
+		else:
+			f.seek(size, 1)
+		if header[0] & 0x80:
+			break  # last metadata block
+	if not rate:
+		return None
+	length = samples / rate
+	audio_bytes = _file_size(f) - f.tell()
+	fields.update(length=length, bitrate=_bitrate(audio_bytes, length), sample_rate=rate)
+	return fields
+
+
+# ----- Ogg (Vorbis, Opus, FLAC) -----
+_PAGE = struct.Struct('<4sBBqIIIB')  # capture, version, flags, granule, serial, sequence, crc, segments
+
+
+def _ogg_kind(packet):
+	if packet.startswith(b'\x01vorbis'):
+		return 'vorbis'
+	if packet.startswith(b'OpusHead'):
+		return 'opus'
+	if packet.startswith(b'\x7fFLAC'):
+		return 'flac'
+	return None
+
+
+def _match_ogg(head):
+	if head[:4] != b'OggS' or len(head) < 27:
+		return False
+	return _ogg_kind(head[27 + head[26]:]) is not None
+
+
+def _match_opus(head):
+	return _match_ogg(head) and _ogg_kind(head[27 + head[26]:]) == 'opus'
+
+
+def _ogg_packets(f, limit):
+	"""Yield (serial, complete packet) from the pages at ``f``, reading at most ``limit`` bytes."""
+	pending = b''
+	read = 0
+	while read < limit:
+		header = f.read(_PAGE.size)
+		if len(header) < _PAGE.size:
+			return
+		capture, _version, _flags, _granule, serial, _seq, _crc, count = _PAGE.unpack(header)
+		if capture != b'OggS':
+			return
+		lacing = f.read(count)
+		body = f.read(sum(lacing))
+		read += _PAGE.size + count + len(body)
+		pos = 0
+		for value in lacing:
+			pending += body[pos:pos + value]
+			pos += value
+			if value < 255:
+				yield serial, pending
+				pending = b''
+
+
+def _last_granule(f, serial):
+	"""Granule position of the last page of stream ``serial``: its length in samples."""
+	size = _file_size(f)
+	window = 1 << 16
+	while True:
+		start = max(0, size - window)
+		f.seek(start)
+		tail = f.read(size - start)
+		at = tail.rfind(b'OggS')
+		while at >= 0:
+			if at + _PAGE.size <= len(tail):
+				page = _PAGE.unpack_from(tail, at)
+				if page[4] == serial and page[3] >= 0:
+					return page[3]
+			at = tail.rfind(b'OggS', 0, at)
+		if start == 0 or window >= 1 << 22:
+			return None
+		window <<= 2
+
+
+def _probe_ogg(f):
+	packets = _ogg_packets(f, MAX_TAG_BYTES)
+	serial, first = next(packets, (None, b''))
+	kind = _ogg_kind(first)
+	if kind is None:
+		return None
+	fields = {}
+	if kind == 'vorbis':
+		rate, = struct.unpack_from('<I', first, 12)
+		nominal, = struct.unpack_from('<i', first, 20)
+		skip = 0
+	elif kind == 'opus':
+		skip, = struct.unpack_from('<H', first, 10)
+		rate, nominal = 48000, 0  # Opus granules always count 48 kHz samples
+	else:
+		# Ogg FLAC: a STREAMINFO block follows the 13-byte mapping header and 'fLaC'
+		rate = _streaminfo(first[17:51])[0]
+		nominal, skip = 0, 0
+	# The comment packet comes next in the same logical stream
+	for packet_serial, packet in packets:
+		if packet_serial != serial:
+			continue
+		if packet.startswith(b'\x03vorbis'):
+			fields.update(_vorbis_comments(packet, 7))
+		elif packet.startswith(b'OpusTags'):
+			fields.update(_vorbis_comments(packet, 8))
+		elif kind == 'flac' and packet[:1] and packet[0] & 0x7F == 4:
+			fields.update(_vorbis_comments(packet, 4))
+		break
+	granule = _last_granule(f, serial)
+	if not rate or granule is None:
+		return None
+	length = max(0, granule - skip) / rate
+	bitrate = nominal if nominal > 0 else _bitrate(_file_size(f), length)
+	fields.update(length=length, bitrate=bitrate, sample_rate=48000 if kind == 'opus' else rate)
+	return fields
+
+
+# ----- MP4 / M4A -----
+_CONTAINERS = {b'moov', b'trak', b'mdia', b'udta', b'ilst'}
+
+
+def _match_mp4(head):
+	return head[4:8] == b'ftyp'
+
+
+def _atoms(data, pos, end):
+	"""Yield (type, body start, body end) for the atoms in ``data[pos:end]``."""
+	while pos + 8 <= end:
+		size, kind = struct.unpack_from('>I4s', data, pos)
+		header = 8
+		if size == 1:
+			size, = struct.unpack_from('>Q', data, pos + 8)
+			header = 16
+		elif size == 0:
+			size = end - pos
+		if size < header:
+			return
+		yield kind, pos + header, min(pos + size, end)
+		pos += size
+
+
+def _mp4_moov(data, pos, end, fields):
+	for kind, start, stop in _atoms(data, pos, end):
+		if kind == b'mvhd':
+			if data[start] == 1:
+				timescale, duration = struct.unpack_from('>IQ', data, start + 20)
+			else:
+				timescale, duration = struct.unpack_from('>II', data, start + 12)
+			if timescale:
+				fields['length'] = duration / timescale
+		elif kind == b'mdhd' and 'sample_rate' not in fields:
+			# Audio tracks use their sample rate as the media timescale
+			fields['sample_rate'] = struct.unpack_from('>I', data, start + (20 if data[start] == 1 else 12))[0]
+		elif kind == b'meta':
+			_mp4_moov(data, start + 4, stop, fields)  # version/flags precede the children
+		elif kind in (b'\xa9nam', b'\xa9ART'):
+			for child, body, body_end in _atoms(data, start, stop):
+				if child == b'data':
+					key = 'title' if kind == b'\xa9nam' else 'artist'
+					fields.setdefault(key, data[body + 8:body_end].decode('utf-8', 'replace'))
+					break
+		elif kind in _CONTAINERS:
+			_mp4_moov(data, start, stop, fields)
+
+
+def _probe_mp4(f):
+	# Walk the top-level atoms (seeking past mdat) to find and read moov
+	size = _file_size(f)
+	pos = f.tell()
+	while pos + 8 <= size:
+		f.seek(pos)
+		header = f.read(16)
+		atom_size, kind = struct.unpack_from('>I4s', header)
+		header_size = 8
+		if atom_size == 1:
+			atom_size, = struct.unpack_from('>Q', header, 8)
+			header_size = 16
+		elif atom_size == 0:
+			atom_size = size - pos
+		if atom_size < header_size:
+			return None
+		if kind == b'moov':
+			if atom_size > 64 * MAX_TAG_BYTES:
+				return None
+			f.seek(pos + header_size)
+			data = f.read(atom_size - header_size)
+			fields = {}
+			_mp4_moov(data, 0, len(data), fields)
+			if 'length' not in fields:
+				return None
+			fields['bitrate'] = _bitrate(size, fields['length'])
+			return fields
+		pos += atom_size
+	return None
+
+
+# ----- MP3 -----
+def _match_mp3(head):
+	# Bare MPEG audio frame sync (11 set bits) and a layer other than the
+	# reserved 00, which is what raw AAC (ADTS) has there; ID3-tagged files
+	# are caught by _sniff_open
+	return len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0 and head[1] & 0x06 != 0
+
+
+def _id3_text(tags, key):
+	frame = tags.get(key) if tags is not None else None
+	if frame is None:
+		return None
+	try:
+		return str(frame.text[0])
+	except Exception:
+		return None
+
+
+def _probe_mp3(f):
+	# Imported on first use so startup doesn't pay for mutagen; it reads the
+	# ID3 tag itself, so start from the top of the file
+	from mutagen.mp3 import MP3
+	f.seek(0)
+	try:
+		audio = MP3(f)
+	except Exception:
+		return None
+	info = audio.info
+	return {
+		'length': float(getattr(info, 'length', 0) or 0),
+		'bitrate': int(getattr(info, 'bitrate', 0) or 0),
+		'sample_rate': int(getattr(info, 'sample_rate', 0) or 0),
+		'title': _id3_text(audio.tags, 'TIT2'),
+		'artist': _id3_text(audio.tags, 'TPE1'),
+	}
+
+
+register(AudioFormat('flac', ('.flac',), _match_flac, _probe_flac))
+register(AudioFormat('opus', ('.opus',), _match_opus, _probe_ogg))
+register(AudioFormat('ogg', ('.ogg', '.oga'), _match_ogg, _probe_ogg))
+register(AudioFormat('wav', ('.wav', '.wave'), _match_wav, _probe_wav))
+# Not .mp4: folder import would pick up every video in the library
+register(AudioFormat('m4a', ('.m4a', '.m4b'), _match_mp4, _probe_mp4, playable=False))
+register(AudioFormat('mp3', ('.mp3',), _match_mp3, _probe_mp3))
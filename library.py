@@ -0,0 +1,131 @@
+"""Recursive folder import for the MP3 player.
+
+Directory trees are walked with ``os.scandir`` on a background thread and the
+matching audio files are streamed back in small batches through a queue, so
+the UI can populate the playlist incrementally from ``after()`` callbacks.
+"""
+import os
+import queue
+import threading
+import time
+
+import formats
+
+# Extensions accepted without opening the file (the same formats sniffing accepts)
+AUDIO_EXTENSIONS = formats.extensions(playable=True)
+# Extensions rejected without opening the file: what sits next to the music in
+# a library (cover art, rip logs and cue sheets, playlists, videos, documents)
+# and M4A, which can't be played
+NON_AUDIO_EXTENSIONS = frozenset((
+	'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff', '.ico',
+	'.txt', '.log', '.cue', '.nfo', '.md', '.rtf', '.pdf', '.doc', '.docx', '.htm', '.html',
+	'.m3u', '.m3u8', '.pls', '.xspf', '.sfv', '.md5', '.ffp', '.accurip', '.json', '.xml', '.db', '.ini',
+	'.mp4', '.m4v', '.mkv', '.avi', '.mov', '.wmv', '.webm',
+	'.zip', '.rar', '.7z', '.gz', '.tar', '.iso',
+	'.lrc', '.url', '.lnk', '.m4a', '.m4b',
+))
+
+
+def sniff_audio(path):
+	"""Return True if the first bytes of ``path`` look like an audio format the player can play."""
+	fmt = formats.sniff(path)
+	# Not M4A by content: that would take in every MP4 video too
+	return fmt is not None and fmt.playable
+
+
+class FolderImporter:
+	"""Walk a directory tree on a worker thread and stream audio paths back.
+
+	``poll()`` is called from the Tk thread and returns the paths found since
+	the previous call. The first batch is flushed as soon as a file is found so
+	the playlist fills in immediately; later batches are grouped by size or age
+	to keep per-tick insert costs bounded.
+	"""
+	def __init__(self, root_dir, extensions=AUDIO_EXTENSIONS, sniff=True, batch_size=500, batch_age=0.05):
+		self.root_dir = root_dir
+		self.extensions = extensions
+		self.sniff = sniff
+		self.batch_size = batch_size
+		self.batch_age = batch_age
+		self.found = 0
+		self.dirs_scanned = 0
+		self.done = False
+		self._queue = queue.SimpleQueue()
+		self._cancel = threading.Event()
+		self._thread = threading.Thread(target=self._run, name='folder-import', daemon=True)
+
+	def start(self):
+		self._thread.start()
+		return self
+
+	def cancel(self):
+		self._cancel.set()
+
+	@property
+	def cancelled(self):
+		return self._cancel.is_set()
+
+	def _accept(self, entry):
+		ext = os.path.splitext(entry.name)[1].lower()
+		if ext in self.extensions:
+			return True
+		return self.sniff and ext not in NON_AUDIO_EXTENSIONS and sniff_audio(entry.path)
+
+	def _run(self):
+		batch = []
+		last_flush = time.monotonic()
+		first = True
+		stack = [self.root_dir]
+		try:
+			while stack and not self._cancel.is_set():
+				current = stack.pop()
+				try:
+					with os.scandir(current) as it:
+						entries = sorted(it, key=lambda e: e.name.lower())
+				except OSError:
+					continue
+				self.dirs_scanned += 1
+				subdirs = []
+				for entry in entries:
+					if self._cancel.is_set():
+						break
+					try:
+						if entry.is_dir(follow_symlinks=False):
+							subdirs.append(entry.path)
+							continue
+						if not entry.is_file():
+							continue
+					except OSError:
+						continue
+					if self._accept(entry):
+						batch.append(entry.path)
+				# Depth-first, visiting subfolders in name order
+				stack.extend(reversed(subdirs))
+				now = time.monotonic()
+				if batch and (first or len(batch) >= self.batch_size or now - last_flush >= self.batch_age):
+					self._queue.put(batch)
+					batch = []
+					last_flush = now
+					first = False
+		finally:
+			if batch and not self._cancel.is_set():
+				self._queue.put(batch)
+			self._queue.put(None)
+
+	def poll(self, limit=2000):
+		"""Return up to ``limit`` newly found paths; sets ``done`` once the walk ends."""
+		out = []
+		while len(out) < limit:
+			try:
+				batch = self._queue.get_nowait()
+			except queue.Empty:
+				break
+			if batch is None:
+				self.done = True
+				break
+			out.extend(batch)
+		if self._cancel.is_set():
+			# Drop whatever the worker produced after cancellation
+			return []
+		self.found += len(out)
+		return out
@@ -0,0 +1,346 @@
+"""Loudness analysis and ReplayGain-style normalization for the MP3 player.
+
+Tracks are decoded to 16-bit stereo PCM at ``ANALYSIS_RATE`` in worker
+processes and measured with NumPy following ITU-R BS.1770 / EBU R128:
+
+- K-weighting (high shelf + high pass) is applied in the frequency domain,
+  one FFT per few-second segment, so memory stays bounded on long mixes
+- squared weighted samples are summed per 100 ms hop, and 400 ms blocks
+  (75% overlap) are built from four hops at a time
+- blocks are gated at -70 LUFS and then 10 LU below their mean
+
+The result is the integrated loudness in LUFS and the sample peak. Playback
+gain is ``TARGET_LUFS - loudness``. It is limited so the peak doesn't clip,
+and never boosts, since pygame's volume can't go above 1.0.
+
+``LoudnessService`` runs analyses through ``workers.ProcessPool`` and stores
+results in the metadata cache. To analyse a library headlessly::
+
+    python loudness.py [-j 4] [--target -18] FOLDER_OR_FILE ...
+"""
+import argparse
+import math
+import os
+import queue
+import sys
+import time
+
+# numpy module, imported on first analysis (required for loudness, optional for the app)
+numpy = None
+
+ANALYSIS_RATE = 22050
+TARGET_LUFS = -18.0
+HOP_SECONDS = 0.1
+BLOCK_HOPS = 4  # 400 ms gating blocks
+SEGMENT_HOPS = 20  # FFT size: a few seconds keeps each transform in cache
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+
+def _numpy():
+	global numpy
+	if numpy is None:
+		import numpy
+	return numpy
+
+
+def replay_gain(loudness, peak, target=TARGET_LUFS):
+	"""Linear volume factor (<= 1.0) bringing ``loudness`` to ``target`` without clipping."""
+	if loudness is None or not math.isfinite(loudness):
+		return 1.0
+	gain = 10 ** ((target - loudness) / 20.0)
+	if peak:
+		gain = min(gain, 1.0 / peak)
+	return max(0.0, min(1.0, gain))
+
+
+# ----- analysis (worker side) -----
+def k_weighting_response(n_fft, rate):
+	"""Complex frequency response of the BS.1770 K-weighting filter at ``rate``."""
+	np = _numpy()
+	# Stage 1: high shelf (head effects); coefficients as in libebur128
+	f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+	k = math.tan(math.pi * f0 / rate)
+	vh = 10 ** (gain_db / 20.0)
+	vb = vh ** 0.4996667741545416
+	a0 = 1.0 + k / q + k * k
+	b1 = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+	a1 = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+	# Stage 2: RLB high pass
+	f0, q = 38.13547087602444, 0.5003270373238773
+	k = math.tan(math.pi * f0 / rate)
+	a0 = 1.0 + k / q + k * k
+	b2 = [1.0, -2.0, 1.0]
+	a2 = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+	z = np.exp(-1j * np.pi * np.arange(n_fft // 2 + 1) / (n_fft // 2))
+	response = np.ones_like(z)
+	for b, a in ((b1, a1), (b2, a2)):
+		response *= (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+	return response
+
+
+def hop_energies(samples, rate):
+	"""Sum of squared K-weighted samples (over channels) per 100 ms hop.
+
+	``samples`` is an (n, channels) int16 array; full-scale is 1.0.
+	"""
+	np = _numpy()
+	hop = int(round(rate * HOP_SECONDS))
+	n_hops = len(samples) // hop
+	# Each FFT holds a lead-in from the previous segment (filter warm-up, then
+	# dropped), the segment, and zero padding the filter tail decays into
+	# rather than wrapping round onto the start
+	lead = hop
+	n_fft = 1 << (hop * SEGMENT_HOPS).bit_length()
+	seg = (n_fft - 2 * lead) // hop * hop
+	# Single precision halves the FFT work (NumPy >= 2 keeps float32 through rfft)
+	response = k_weighting_response(n_fft, rate).astype(np.complex64)
+	out = np.empty(n_hops)
+	for start in range(0, n_hops * hop, seg):
+		stop = min(start + seg, n_hops * hop)
+		begin = max(0, start - lead)
+		# One contiguous row per channel: the FFTs run along memory
+		chunk = samples[begin:stop].T.astype(np.float32) * np.float32(1 / 32768.0)
+		spectrum = np.fft.rfft(chunk, n=n_fft)
+		spectrum *= response
+		weighted = np.fft.irfft(spectrum, n=n_fft)[:, start - begin:stop - begin]
+		energy = np.einsum('ij,ij->j', weighted, weighted)
+		out[start // hop:stop // hop] = energy.reshape(-1, hop).sum(axis=1, dtype=np.float64)
+	return out, hop
+
+
+def integrated_loudness(samples, rate):
+	"""Return (integrated loudness in LUFS, sample peak) for an (n, channels) int16 array."""
+	np = _numpy()
+	if not len(samples):
+		return float('-inf'), 0.0
+	peak = float(np.abs(samples.astype(np.int32)).max()) / 32768.0
+	hops, hop = hop_energies(samples, rate)
+	if len(hops) < BLOCK_HOPS:
+		blocks = np.array([hops.sum() / max(1, len(hops) * hop)])
+	else:
+		window = np.convolve(hops, np.ones(BLOCK_HOPS), mode='valid')
+		blocks = window / (BLOCK_HOPS * hop)
+	with np.errstate(divide='ignore'):
+		levels = -0.691 + 10.0 * np.log10(blocks)
+	gated = blocks[levels > ABSOLUTE_GATE]
+	if not len(gated):
+		return float('-inf'), peak
+	relative = -0.691 + 10.0 * math.log10(gated.mean()) + RELATIVE_GATE
+	gated = blocks[(levels > ABSOLUTE_GATE) & (levels > relative)]
+	return -0.691 + 10.0 * math.log10(gated.mean()), peak
+
+
+_mixer_ready = False
+
+
+def decode(track_path):
+	"""Decode a track to an (n, 2) int16 array at ANALYSIS_RATE (worker process)."""
+	global _mixer_ready
+	np = _numpy()
+	if not _mixer_ready:
+		os.environ['SDL_AUDIODRIVER'] = 'dummy'
+		os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+		import pygame
+		pygame.mixer.init(frequency=ANALYSIS_RATE, size=-16, channels=2)
+		_mixer_ready = True
+	import pygame
+	rate, _size, channels = pygame.mixer.get_init()
+	sound = pygame.mixer.Sound(track_path)
+	samples = np.frombuffer(sound.get_raw(), dtype='<i2')
+	del sound
+	return samples[:len(samples) - len(samples) % channels].reshape(-1, channels), rate
+
+
+def analyze(track_path):
+	"""Worker job: ``[loudness, peak]`` for ``track_path`` (loudness None if silent)."""
+	samples, rate = decode(track_path)
+	loudness, peak = integrated_loudness(samples, rate)
+	return [loudness if math.isfinite(loudness) else None, peak]
+
+
+# ----- scheduling (UI side) -----
+class LoudnessService:
+	"""Analyse tracks in worker processes and keep results with the track metadata.
+
+	``get(path)`` returns ``(loudness, peak)`` when known, from the metadata
+	service (and so its SQLite cache), and otherwise schedules an analysis.
+	An analysis is only started once the metadata probe has been answered,
+	so cached results are never recomputed. Listeners registered with
+	``subscribe`` are called as ``callback(path, loudness, peak)`` on the Tk
+	thread.
+	"""
+	def __init__(self, metadata, max_workers=None, drain_interval=200):
+		self.metadata = metadata
+		self.max_workers = max_workers or max(1, min(2, (os.cpu_count() or 2) - 1))
+		self.drain_interval = drain_interval
+		self.available = True
+		self._pool = None
+		self._results = queue.SimpleQueue()
+		self._pending = set()
+		self._waiting = set()  # paths whose metadata probe hasn't come back yet
+		self._failed = set()
+		self._listeners = []
+		self._widget = None
+		self._after_id = None
+		metadata.subscribe(self._on_metadata)
+
+	def subscribe(self, callback):
+		self._listeners.append(callback)
+
+	def get(self, path):
+		info = self.metadata.info.get(path)
+		if info is not None and info.peak is not None:
+			return info.loudness, info.peak
+		if not self.available or path in self._pending or path in self._failed:
+			return None
+		if info is None:
+			# The probe may bring a cached result; decide when it lands
+			self._waiting.add(path)
+			self.metadata.request(path)
+			return None
+		self._submit(path)
+		return None
+
+	def _on_metadata(self, info):
+		if info.path in self._waiting:
+			self._waiting.discard(info.path)
+			if info.peak is None and info.path not in self._pending:
+				self._submit(info.path)
+
+	def _submit(self, path):
+		if self._pool is None:
+			try:
+				_numpy()
+			except ImportError:
+				# Loudness analysis needs numpy; normalization simply stays off
+				self.available = False
+				return
+			from workers import ProcessPool
+			self._pool = ProcessPool(__file__, self.max_workers)
+		self._pending.add(path)
+		self._pool.submit('analyze', (path,),
+			lambda result, error, path=path: self._results.put((path, None if error else result)))
+
+	def drain(self):
+		while True:
+			try:
+				path, result = self._results.get_nowait()
+			except queue.Empty:
+				break
+			self._pending.discard(path)
+			if result is None:
+				self._failed.add(path)
+				continue
+			loudness, peak = result
+			self.metadata.set_loudness(path, loudness, peak)
+			for callback in self._listeners:
+				try:
+					callback(path, loudness, peak)
+				except Exception:
+					pass
+
+	def start(self, widget):
+		"""Begin draining results periodically using ``widget.after``."""
+		self._widget = widget
+		self._tick()
+
+	def _tick(self):
+		self.drain()
+		try:
+			self._after_id = self._widget.after(self.drain_interval, self._tick)
+		except Exception:
+			self._after_id = None
+
+	def shutdown(self):
+		if self._after_id is not None and self._widget is not None:
+			try:
+				self._widget.after_cancel(self._after_id)
+			except Exception:
+				pass
+			self._after_id = None
+		if self._pool is not None:
+			self._pool.terminate()
+			self._pool = None
+
+
+# ----- batch mode -----
+def _collect(paths, extensions):
+	for path in paths:
+		if os.path.isdir(path):
+			for folder, dirs, files in os.walk(path):
+				dirs.sort()
+				for name in sorted(files):
+					if os.path.splitext(name)[1].lower() in extensions:
+						yield os.path.join(folder, name)
+		else:
+			yield path
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Measure loudness (EBU R128) for a music library and store it in the player cache.')
+	parser.add_argument('paths', nargs='+', help='audio files or folders (searched recursively)')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+	parser.add_argument('--target', type=float, default=TARGET_LUFS, help='reference loudness for the printed gain')
+	parser.add_argument('--force', action='store_true', help='re-analyse tracks that already have results')
+	parser.add_argument('--no-cache', action='store_true', help="print results only, don't store them")
+	args = parser.parse_args(argv)
+
+	from library import AUDIO_EXTENSIONS
+	from metadata import MetadataCache, default_cache_dir, probe
+	from workers import ProcessPool
+	cache = None if args.no_cache else MetadataCache(default_cache_dir() / 'metadata.sqlite3')
+	results = queue.SimpleQueue()
+	pool = ProcessPool(__file__, args.jobs)
+	submitted = skipped = failed = 0
+	start = time.perf_counter()
+	try:
+		for path in _collect(args.paths, AUDIO_EXTENSIONS):
+			try:
+				st = os.stat(path)
+			except OSError as e:
+				print(f'{path}: {e}', file=sys.stderr)
+				failed += 1
+				continue
+			info = cache.lookup(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+			if info is not None and info.peak is not None and not args.force:
+				skipped += 1
+				continue
+			pool.submit('analyze', (path,), lambda result, error, path=path, st=st, info=info:
+				results.put((path, st, info, result, error)))
+			submitted += 1
+		for done in range(submitted):
+			path, st, info, result, error = results.get()
+			if error is not None:
+				failed += 1
+				print(f'{path}: {error}', file=sys.stderr)
+				continue
+			loudness, peak = result
+			if loudness is None:
+				print(f'  silent            peak {peak:5.3f}  {path}')
+			else:
+				gain = args.target - loudness
+				print(f'{loudness:6.1f} LUFS {gain:+6.1f} dB  peak {peak:5.3f}  {path}')
+			if cache is not None:
+				if info is None:
+					info = probe(path)
+				info.loudness, info.peak = loudness, peak
+				cache.store(info, st.st_size, st.st_mtime_ns)
+				if done % 100 == 99:
+					cache.flush()
+	finally:
+		pool.terminate()
+		if cache is not None:
+			cache.close()
+	elapsed = time.perf_counter() - start
+	print(f'{submitted - failed} analysed, {skipped} already known, {failed} failed '
+		f'in {elapsed:.1f}s ({submitted / max(elapsed, 1e-9):.1f} tracks/s)', file=sys.stderr)
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	if '--serve' in sys.argv[1:]:
+		from workers import serve
+		serve({'analyze': analyze})
+	else:
+		sys.exit(main())
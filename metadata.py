@@ -0,0 +1,349 @@
+"""Background metadata probing for the MP3 player.
+
+Durations and tags are read from file headers (formats.py) on a small,
+bounded worker pool so the Tk main loop never blocks on disk or network
+I/O. Finished probes are posted to a queue which the UI drains from
+``after()`` callbacks.
+
+Probe results are persisted in a small SQLite database keyed by path, size and
+mtime, so reopening a large library does not re-parse every file header.
+mutagen itself is only imported when the first MP3 is probed.
+"""
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import formats
+
+
+class TrackInfo:
+	"""Metadata for a single audio file."""
+	__slots__ = ('path', 'length', 'bitrate', 'sample_rate', 'title', 'artist', 'loudness', 'peak')
+
+	def __init__(self, path, length=0.0, bitrate=0, sample_rate=0, title=None, artist=None,
+			loudness=None, peak=None):
+		self.path = path
+		self.length = length
+		self.bitrate = bitrate
+		self.sample_rate = sample_rate
+		self.title = title
+		self.artist = artist
+		# Integrated loudness (LUFS) and sample peak (0-1), filled in by loudness analysis
+		self.loudness = loudness
+		self.peak = peak
+
+
+def probe(path):
+	"""Read duration and tags for ``path``. Blocking; call from a worker thread.
+
+	The format is sniffed from the file's first bytes and only its headers are
+	read (see formats.py); unreadable or unknown files give an empty TrackInfo.
+	"""
+	fields = formats.probe(path)
+	if fields is None:
+		return TrackInfo(path)
+	return TrackInfo(
+		path,
+		length=fields['length'],
+		bitrate=fields['bitrate'],
+		sample_rate=fields['sample_rate'],
+		title=fields['title'],
+		artist=fields['artist'],
+	)
+
+
+def default_cache_dir():
+	"""Return the per-user cache directory for the player, creating it if needed."""
+	if sys.platform == 'win32':
+		base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+	elif sys.platform == 'darwin':
+		base = Path.home() / 'Library' / 'Caches'
+	else:
+		base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+	path = Path(base) / 'mp3-player'
+	path.mkdir(parents=True, exist_ok=True)
+	return path
+
+
+class MetadataCache:
+	"""Persistent, LRU-bounded store of TrackInfo keyed by (path, size, mtime).
+
+	Rows whose size or mtime no longer match the file on disk are treated as
+	stale and dropped on lookup. Hits only bump an in-memory recency stamp;
+	stamps, new rows and evictions are written out together by ``flush()``.
+	Safe to use from worker threads.
+	"""
+	SCHEMA_VERSION = 2
+
+	def __init__(self, path, max_entries=50000):
+		self.path = str(path)
+		self.max_entries = max_entries
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(self.path, check_same_thread=False)
+		self._conn.execute('PRAGMA journal_mode=WAL')
+		self._conn.execute('PRAGMA synchronous=NORMAL')
+		self._create_schema()
+		row = self._conn.execute('SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM tracks').fetchone()
+		self._count, self._clock = row
+		self._touched = {}
+		self._dirty = False
+
+	def _create_schema(self):
+		version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+		if version != self.SCHEMA_VERSION:
+			self._conn.execute('DROP TABLE IF EXISTS tracks')
+		self._conn.execute(
+			'CREATE TABLE IF NOT EXISTS tracks ('
+			'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+			'length REAL, bitrate INTEGER, sample_rate INTEGER, '
+			'title TEXT, artist TEXT, last_used INTEGER, loudness REAL, peak REAL)'
+		)
+		self._conn.execute('CREATE INDEX IF NOT EXISTS tracks_last_used ON tracks(last_used)')
+		self._conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+		self._conn.commit()
+
+	def lookup(self, path, size, mtime_ns):
+		"""Return the cached TrackInfo for an unchanged file, else None."""
+		with self._lock:
+			row = self._conn.execute(
+				'SELECT size, mtime_ns, length, bitrate, sample_rate, title, artist, loudness, peak '
+				'FROM tracks WHERE path = ?', (path,)
+			).fetchone()
+			if row is None:
+				return None
+			if row[0] != size or row[1] != mtime_ns:
+				# File changed on disk since it was probed
+				self._conn.execute('DELETE FROM tracks WHERE path = ?', (path,))
+				self._count -= 1
+				self._dirty = True
+				return None
+			self._clock += 1
+			self._touched[path] = self._clock
+			self._dirty = True
+		return TrackInfo(path, *row[2:])
+
+	def store(self, info, size, mtime_ns):
+		with self._lock:
+			self._clock += 1
+			cur = self._conn.execute(
+				'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(info.path, size, mtime_ns, info.length, info.bitrate, info.sample_rate,
+					info.title, info.artist, self._clock, info.loudness, info.peak)
+			)
+			if cur.rowcount:
+				self._count += 1
+			self._touched.pop(info.path, None)
+			self._dirty = True
+
+	def store_loudness(self, path, size, mtime_ns, loudness, peak):
+		"""Attach loudness results to an unchanged file's row; False if there is none."""
+		with self._lock:
+			cur = self._conn.execute(
+				'UPDATE tracks SET loudness = ?, peak = ? WHERE path = ? AND size = ? AND mtime_ns = ?',
+				(loudness, peak, path, size, mtime_ns)
+			)
+			self._dirty = True
+			return cur.rowcount > 0
+
+	def flush(self):
+		"""Write recency stamps, evict least-recently-used rows and commit."""
+		with self._lock:
+			if not self._dirty:
+				return
+			if self._touched:
+				self._conn.executemany(
+					'UPDATE tracks SET last_used = ? WHERE path = ?',
+					[(stamp, path) for path, stamp in self._touched.items()]
+				)
+				self._touched.clear()
+			if self._count > self.max_entries:
+				# INSERT OR REPLACE may have over-counted; recount before evicting
+				self._count = self._conn.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+				excess = self._count - self.max_entries
+				if excess > 0:
+					self._conn.execute(
+						'DELETE FROM tracks WHERE path IN '
+						'(SELECT path FROM tracks ORDER BY last_used LIMIT ?)', (excess,)
+					)
+					self._count -= excess
+			self._conn.commit()
+			self._dirty = False
+
+	def close(self):
+		self.flush()
+		with self._lock:
+			self._conn.close()
+
+
+class MetadataService:
+	"""Probe tracks on a worker pool and hand results back to the Tk loop.
+
+	All public methods except the worker itself are meant to be called from the
+	Tk main thread; ``request()`` and ``length()`` never block.
+	"""
+	def __init__(self, max_workers=None, drain_interval=50, cache=None):
+		if max_workers is None:
+			max_workers = min(4, (os.cpu_count() or 1) + 1)
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='metadata')
+		self._results = queue.SimpleQueue()
+		self._pending = set()
+		self._failed = set()  # paths whose probe failed; posted but not recorded, so they can be retried
+		self._listeners = []
+		self._widget = None
+		self._after_id = None
+		self.drain_interval = drain_interval
+		self.cache = cache
+		self.flush_interval = 2.0
+		self._last_flush = time.monotonic()
+		self.info = {}  # path -> TrackInfo
+
+	def subscribe(self, callback):
+		"""Call ``callback(TrackInfo)`` on the Tk thread whenever a probe finishes."""
+		self._listeners.append(callback)
+
+	def request(self, path):
+		"""Queue ``path`` for probing unless it is already known or in flight."""
+		if not path or path in self.info or path in self._pending:
+			return
+		self._pending.add(path)
+		try:
+			self._executor.submit(self._work, path)
+		except RuntimeError:
+			# Executor already shut down (application closing)
+			self._pending.discard(path)
+
+	def request_many(self, paths):
+		for path in paths:
+			self.request(path)
+
+	def get(self, path):
+		"""Return cached TrackInfo or None, scheduling a probe when missing."""
+		info = self.info.get(path)
+		if info is None:
+			self.request(path)
+		return info
+
+	def length(self, path):
+		"""Return the cached duration in seconds, or 0 while it is still unknown."""
+		info = self.get(path)
+		return info.length if info is not None else 0
+
+	def set_loudness(self, path, loudness, peak):
+		"""Record loudness results for ``path`` and persist them in the background."""
+		info = self.info.get(path)
+		if info is not None:
+			info.loudness = loudness
+			info.peak = peak
+		if self.cache is None:
+			return
+		def save():
+			try:
+				st = os.stat(path)
+			except OSError:
+				return
+			cache = self.cache
+			if not cache.store_loudness(path, st.st_size, st.st_mtime_ns, loudness, peak):
+				row = probe(path)
+				row.loudness, row.peak = loudness, peak
+				cache.store(row, st.st_size, st.st_mtime_ns)
+		try:
+			self._executor.submit(save)
+		except RuntimeError:
+			pass
+
+	def _work(self, path):
+		# Always post a result: it takes the path out of _pending in drain()
+		info = None
+		try:
+			info = self._probe_cached(path)
+		except OSError:
+			# Unreadable for now (say, a network mount dropping out): not cached
+			self._failed.add(path)
+		except Exception as e:
+			print('Metadata probe failed:', path, e)
+			self._failed.add(path)
+		self._results.put(info if info is not None else TrackInfo(path))
+
+	def _probe_cached(self, path):
+		cache = self.cache
+		st = os.stat(path)
+		info = cache.lookup(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+		if info is None:
+			info = probe(path)
+			if not info.length:
+				# formats.probe() gives None for a file it couldn't read as well as
+				# for one that isn't audio; only the second is worth keeping
+				with open(path, 'rb'):
+					pass
+			if cache is None:
+				return info
+			try:
+				cache.store(info, st.st_size, st.st_mtime_ns)
+			except Exception as e:
+				# The probe itself is good; only the cache missed out
+				print('Metadata not cached:', path, e)
+		return info
+
+	def drain(self, limit=500):
+		"""Move finished probes into ``info`` and notify listeners. Tk thread only."""
+		got_any = False
+		for _ in range(limit):
+			try:
+				info = self._results.get_nowait()
+			except queue.Empty:
+				break
+			got_any = True
+			self._pending.discard(info.path)
+			if info.path in self._failed:
+				# Not recorded, so the next request() probes it again
+				self._failed.discard(info.path)
+				continue
+			self.info[info.path] = info
+			for callback in self._listeners:
+				try:
+					callback(info)
+				except Exception:
+					pass
+		if got_any and self.cache is not None:
+			# Batch commits: once a wave of probes settles, or periodically during big imports
+			now = time.monotonic()
+			if not self._pending or now - self._last_flush >= self.flush_interval:
+				self._last_flush = now
+				try:
+					self.cache.flush()
+				except Exception:
+					pass
+
+	def start(self, widget):
+		"""Begin draining results periodically using ``widget.after``."""
+		self._widget = widget
+		self._tick()
+
+	def _tick(self):
+		self.drain()
+		try:
+			self._after_id = self._widget.after(self.drain_interval, self._tick)
+		except Exception:
+			self._after_id = None
+
+	def shutdown(self):
+		"""Stop draining, drop any probes that have not started yet and close the
+		cache once the running ones (and loudness saves) have finished."""
+		if self._after_id is not None and self._widget is not None:
+			try:
+				self._widget.after_cancel(self._after_id)
+			except Exception:
+				pass
+			self._after_id = None
+		# Running jobs still use the cache; with the backlog cancelled this is quick
+		self._executor.shutdown(wait=True, cancel_futures=True)
+		if self.cache is not None:
+			try:
+				self.cache.close()
+			except Exception:
+				pass
@@ -0,0 +1,577 @@
+"""Software mixing for crossfades: decoded tracks played on pygame.mixer Channels.
+
+``pygame.mixer.music`` plays one stream at a time, so two tracks can never
+overlap. ``MixingStream`` stands in for it in PlayerEngine while crossfading
+is on. It has the calls the engine makes (load, play, queue, pause, unpause,
+stop, get_pos, get_busy, set_volume, set_endevent), but each track is decoded
+to PCM and played on one of two reserved Channels as a chain of short Sound
+chunks. ``crossfade`` seconds before the current track ends, the queued one
+starts on the other channel. The overlap is shaped by equal-power gain ramps,
+which are multiplied into the chunks with numpy when each chunk is cut.
+
+Decoding happens in a worker process (``python mixing.py --serve``, via
+workers.ProcessPool), which writes the PCM to a temporary file that is then
+memory-mapped here. It can't happen in this process: SDL_mixer holds the
+audio device lock while it decodes a compressed file into a Sound, so the
+playing track would stall for the whole decode (about 150 ms for a
+four-minute MP3). The queued track is decoded while the current one plays.
+A feeder thread cuts the next chunk whenever a channel has room in its
+queue, so SDL_mixer always has a chunk waiting whatever the Tk loop is doing.
+
+Given an AudioCache (audiocache.py), decoded tracks are kept there, so going
+back to a recently played track or replaying it doesn't decode it again.
+
+Tracks longer than ``max_decode_seconds`` (from a header-only probe) are not
+decoded, since a two-hour mix would take over a gigabyte of PCM. They play on
+``pygame.mixer.music`` alongside the channels instead, faded with its own
+``fade_ms``/``fadeout``. Two of them in a row can't overlap and simply follow
+each other.
+"""
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+import formats
+
+# pygame and numpy modules, imported when the first MixingStream is created
+pygame = None
+numpy = None
+
+# Seconds of audio per Sound chunk; one is playing and one queued per channel
+CHUNK_SECONDS = 1.0
+# How often the feeder tops up the channels and checks for the fade point
+FEED_INTERVAL = 0.02
+# Longer tracks are played by pygame.mixer.music rather than decoded
+MAX_DECODE_SECONDS = 20 * 60
+DEFAULT_CROSSFADE = 5.0
+
+# numpy dtype of each pygame mixer sample size
+_DTYPES = {8: '<u1', -8: '<i1', 16: '<u2', -16: '<i2', 32: '<f4'}
+
+
+def available():
+	"""True if crossfading can be used (it needs numpy)."""
+	global numpy
+	if numpy is None:
+		try:
+			import numpy
+		except ImportError:
+			return False
+	return True
+
+
+def _rise(t):
+	return numpy.sin(numpy.clip(t, 0.0, 1.0) * (math.pi / 2))
+
+
+def _fall(t):
+	return numpy.cos(numpy.clip(t, 0.0, 1.0) * (math.pi / 2))
+
+
+class _Deck:
+	"""One track on the mixer, with a play clock that stops while paused."""
+	def __init__(self, path, length):
+		self.path = path
+		self.length = length
+		self.offset = 0.0  # track seconds at the last start()
+		self.fade_at = None  # track seconds the fade-out starts, if one is planned
+		self._started = None
+		self._paused_at = None
+
+	@property
+	def paused(self):
+		return self._paused_at is not None
+
+	def elapsed(self):
+		"""Seconds played since the last start(), not counting pauses."""
+		if self._started is None:
+			return 0.0
+		now = self._paused_at if self._paused_at is not None else time.monotonic()
+		return now - self._started
+
+	def position(self):
+		return self.offset + self.elapsed()
+
+	def _start_clock(self, seconds):
+		self.offset = seconds
+		self._started = time.monotonic()
+		self._paused_at = None
+
+	def pause(self):
+		if self._paused_at is None:
+			self._paused_at = time.monotonic()
+			self._pause()
+
+	def resume(self):
+		if self._paused_at is not None:
+			self._started += time.monotonic() - self._paused_at
+			self._paused_at = None
+			self._resume()
+
+
+class _PcmDeck(_Deck):
+	"""A decoded track (frames x channels array) handed to a Channel one chunk at a time."""
+	def __init__(self, path, pcm, channel, chunk_seconds):
+		self.pcm = pcm
+		self.rate = pygame.mixer.get_init()[0]
+		super().__init__(path, len(self.pcm) / self.rate)
+		self.channel = channel
+		self.chunk = max(1, int(chunk_seconds * self.rate))
+		self.next_frame = 0  # first frame not yet handed to the channel
+		self.end_frame = len(self.pcm)
+		self.fade_in = None  # (first frame, frames)
+		self.fade_out = None
+		self.underruns = 0
+
+	def start(self, seconds, fade=0.0):
+		self.channel.stop()
+		self.next_frame = min(int(seconds * self.rate), len(self.pcm))
+		self.end_frame = len(self.pcm)
+		self.fade_in = (self.next_frame, int(fade * self.rate)) if fade > 0 else None
+		self.fade_out = self.fade_at = None
+		self._start_clock(self.next_frame / self.rate)
+		if self.next_frame < self.end_frame:
+			self.channel.play(self._cut())
+		self.fill()
+
+	def set_fade_out(self, at, seconds):
+		"""Fade out over ``seconds`` from ``at`` (track seconds) and end there.
+		Chunks already handed to the channel play unfaded, so a late plan starts later."""
+		first = max(int(at * self.rate), self.next_frame)
+		frames = max(1, int(seconds * self.rate))
+		self.fade_out = (first, frames)
+		self.end_frame = min(len(self.pcm), first + frames)
+		self.fade_at = first / self.rate
+
+	def fill(self):
+		"""Queue the next chunk if the channel has room for it."""
+		if self.next_frame >= self.end_frame or self.channel.get_queue() is not None:
+			return
+		if not self.channel.get_busy() and self._started is not None:
+			# The channel ran dry before the feeder got to it: an audible gap
+			self.underruns += 1
+		self.channel.queue(self._cut())
+
+	def _cut(self):
+		a = self.next_frame
+		b = min(a + self.chunk, self.end_frame)
+		self.next_frame = b
+		block = self.pcm[a:b]
+		gain = None
+		for fade, ramp in ((self.fade_in, _rise), (self.fade_out, _fall)):
+			if fade is not None and a < fade[0] + fade[1] and b > fade[0]:
+				g = ramp((numpy.arange(a, b) - fade[0]) / fade[1])
+				gain = g if gain is None else gain * g
+		if gain is not None:
+			block = (block * gain.reshape((-1,) + (1,) * (block.ndim - 1))).astype(block.dtype)
+		return pygame.sndarray.make_sound(block)
+
+	def done(self):
+		return self.next_frame >= self.end_frame and not self.channel.get_busy()
+
+	def _pause(self):
+		self.channel.pause()
+
+	def _resume(self):
+		self.channel.unpause()
+
+	def stop(self):
+		self.channel.stop()
+
+	def set_volume(self, volume):
+		self.channel.set_volume(volume)
+
+
+class _MusicDeck(_Deck):
+	"""A track too long to decode, played by pygame.mixer.music."""
+	def __init__(self, path, length):
+		super().__init__(path, length)
+		self._fade_ms = 0
+		self._fading = False
+
+	def start(self, seconds, fade=0.0):
+		pygame.mixer.music.load(self.path)
+		pygame.mixer.music.play(loops=0, start=seconds, fade_ms=int(1000 * fade))
+		self.fade_at = None
+		self._fading = False
+		self._start_clock(seconds)
+
+	def set_fade_out(self, at, seconds):
+		self.fade_at = max(at, self.position())
+		self._fade_ms = int(1000 * seconds)
+
+	def fill(self):
+		if self.fade_at is not None and not self._fading and self.position() >= self.fade_at:
+			pygame.mixer.music.fadeout(self._fade_ms)
+			self._fading = True
+
+	def done(self):
+		return not self.paused and not pygame.mixer.music.get_busy()
+
+	def _pause(self):
+		pygame.mixer.music.pause()
+
+	def _resume(self):
+		pygame.mixer.music.unpause()
+
+	def stop(self):
+		pygame.mixer.music.stop()
+
+	def set_volume(self, volume):
+		pygame.mixer.music.set_volume(volume)
+
+
+class MixingStream:
+	"""Drop-in for ``pygame.mixer.music`` that crossfades queued tracks.
+
+	``get_pos()`` counts from the last play() or crossfade, excluding pauses.
+	The end event is posted when a track ends with nothing queued, and when a
+	queued track starts its fade-in, which is when SDL_mixer would post it
+	for a gapless switch. ``load()`` doesn't wait for a track that wasn't
+	queued: it is decoded in the background and the feeder starts it, as
+	play() asked, once it's ready (get_busy() is true meanwhile). If that
+	decode fails the end event is posted, so the engine moves on. Call
+	``close()`` to stop the threads.
+	"""
+	def __init__(self, crossfade=DEFAULT_CROSSFADE, chunk_seconds=CHUNK_SECONDS,
+			max_decode_seconds=MAX_DECODE_SECONDS, cache=None):
+		global pygame
+		if pygame is None:
+			import pygame
+			import pygame.sndarray
+		if not available():
+			raise ImportError('crossfading needs numpy')
+		self.crossfade = crossfade
+		self.chunk_seconds = chunk_seconds
+		self.max_decode_seconds = max_decode_seconds
+		self.cache = cache  # AudioCache for decoded tracks, if any
+		self._lock = threading.RLock()
+		self._current = None  # deck of the current track
+		self._fading = None  # outgoing deck playing out its fade
+		self._next = None  # (path, length, Future of the decoded PCM, or None)
+		self._pending = None  # (path, length, Future) loaded but still decoding
+		self._pending_play = None  # (start, fade) once play() was called for it
+		self._pending_paused = False
+		self._volume = 1.0
+		self._endevent = None
+		self._underruns = 0
+		pygame.mixer.set_reserved(2)
+		self._channels = (pygame.mixer.Channel(0), pygame.mixer.Channel(1))
+		self._pool = None  # decoding worker, started on the first decode
+		self._decoding = {}  # path -> Future of a decode in flight
+		self._tmp = tempfile.mkdtemp(prefix='mp3-player-pcm-')
+		self._serial = 0
+		self._closed = threading.Event()
+		self._thread = threading.Thread(target=self._run, name='mixing-feed', daemon=True)
+		self._thread.start()
+
+	@property
+	def underruns(self):
+		"""Times a channel ran out of chunks before the feeder refilled it."""
+		with self._lock:
+			decks = [deck for deck in (self._current, self._fading) if isinstance(deck, _PcmDeck)]
+			return self._underruns + sum(deck.underruns for deck in decks)
+
+	# ----- decoding -----
+	def _length(self, path):
+		"""Seconds from a header-only probe, or None if it isn't an audio file."""
+		fields = formats.probe(path)
+		return fields['length'] if fields is not None else None
+
+	def _decode(self, path):
+		"""Future of ``path`` decoded to a frames x channels array at the mixer's
+		format. A path already being decoded shares that decode's Future."""
+		future = self._decoding.get(path)
+		if future is not None:
+			return future
+		future = Future()
+		key = self.cache.key('pcm', path) if self.cache is not None else None
+		if key is not None:
+			pcm = self.cache.get(key)
+			if pcm is not None:
+				future.set_result(pcm)
+				return future
+		if self._pool is None:
+			from workers import ProcessPool
+			self._pool = ProcessPool(__file__, 1)
+		rate, size, channels = pygame.mixer.get_init()
+		self._serial += 1
+		out = os.path.join(self._tmp, f'{self._serial}.pcm')
+
+		def done(result, error):
+			if error is None:
+				try:
+					pcm = _map_pcm(out, _DTYPES[size], channels)
+				except Exception as e:
+					error = e
+			if error is None and key is not None:
+				# Cached before it stops being in flight, so a new load finds one or the other
+				self.cache.put(key, pcm, pcm.nbytes)
+			if self._decoding.get(path) is future:
+				del self._decoding[path]
+			if error is not None:
+				future.set_exception(error)
+			else:
+				future.set_result(pcm)
+		self._decoding[path] = future
+		self._pool.submit('decode', (path, out, rate, size, channels), done)
+		return future
+
+	def _deck(self, path, length, pcm):
+		if pcm is None:
+			return _MusicDeck(path, length)
+		# The channel the current deck isn't on (it's about to fade out)
+		busy = self._current.channel if isinstance(self._current, _PcmDeck) else None
+		channel = self._channels[1] if busy is self._channels[0] else self._channels[0]
+		return _PcmDeck(path, pcm, channel, self.chunk_seconds)
+
+	# ----- pygame.mixer.music interface -----
+	def load(self, path, namehint=''):
+		with self._lock:
+			self._stop_decks()
+			queued, self._next = self._next, None
+			if queued is not None and queued[0] == path:
+				length, future = queued[1], queued[2]
+			else:
+				length = self._length(path)
+				if length is None:
+					# Fail now, like music.load(), rather than once the decode does
+					raise pygame.error(f'not an audio file: {path}')
+				future = self._decode(path) if length <= self.max_decode_seconds else None
+			if future is not None and not future.done():
+				# Don't wait for the decode; the feeder starts it once it's ready
+				self._pending = (path, length, future)
+				return
+			# Already done: a failed decode raises here, as music.load() would
+			pcm = future.result() if future is not None else None
+			self._current = self._deck(path, length, pcm)
+
+	def play(self, loops=0, start=0.0, fade_ms=0):
+		with self._lock:
+			if self._pending is not None:
+				self._pending_play = (float(start), fade_ms / 1000.0)
+				self._pending_paused = False
+				return
+			if self._current is None:
+				raise pygame.error('music not loaded')
+			if self._fading is not None:
+				self._fading.stop()
+				self._fading = None
+			self._current.start(float(start), fade_ms / 1000.0)
+			self._current.set_volume(self._volume)
+			self._plan_fade()
+
+	def queue(self, path, namehint=''):
+		"""Decode ``path`` ahead and crossfade into it at the end of the current track."""
+		with self._lock:
+			if self._next is not None and self._next[0] == path:
+				return
+			# An unreadable file fails in the decoder and is dropped then
+			length = self._length(path) or 0.0
+			future = None
+			if length <= self.max_decode_seconds:
+				future = self._decode(path)
+			self._next = (path, length, future)
+			self._plan_fade()
+
+	def pause(self):
+		with self._lock:
+			self._pending_paused = True
+			for deck in (self._current, self._fading):
+				if deck is not None:
+					deck.pause()
+
+	def unpause(self):
+		with self._lock:
+			self._pending_paused = False
+			for deck in (self._current, self._fading):
+				if deck is not None:
+					deck.resume()
+
+	def stop(self):
+		with self._lock:
+			self._stop_decks()
+			self._next = None
+
+	def get_pos(self):
+		with self._lock:
+			if self._pending_play is not None:
+				return 0
+			if self._current is None:
+				return -1
+			return int(1000 * self._current.elapsed())
+
+	def get_busy(self):
+		with self._lock:
+			if self._pending_play is not None:
+				return not self._pending_paused
+			deck = self._current
+			return deck is not None and not deck.paused and not deck.done()
+
+	def set_volume(self, volume):
+		"""Volume of the current track; an outgoing track keeps its own while it fades."""
+		with self._lock:
+			self._volume = volume
+			if self._current is not None:
+				self._current.set_volume(volume)
+
+	def get_volume(self):
+		return self._volume
+
+	def set_endevent(self, event_type=None):
+		self._endevent = event_type
+
+	def set_crossfade(self, seconds):
+		"""Change the overlap; applies to the current track if its fade hasn't started."""
+		with self._lock:
+			self.crossfade = seconds
+			self._plan_fade()
+
+	def close(self):
+		self.stop()
+		self._closed.set()
+		self._thread.join(timeout=1.0)
+		if self._pool is not None:
+			self._pool.terminate()
+		shutil.rmtree(self._tmp, ignore_errors=True)
+
+	# ----- mixing -----
+	def _stop_decks(self):
+		for deck in (self._current, self._fading):
+			if deck is not None:
+				if isinstance(deck, _PcmDeck):
+					self._underruns += deck.underruns
+				deck.stop()
+		self._current = self._fading = None
+		self._pending = self._pending_play = None
+		self._pending_paused = False
+
+	def _plan_fade(self):
+		cur = self._current
+		if cur is None or self._next is None or self.crossfade <= 0 or cur.length <= 0:
+			return
+		# pygame.mixer.music can't play two tracks at once
+		if isinstance(cur, _MusicDeck) and self._next[1] > self.max_decode_seconds:
+			return
+		fade = min(self.crossfade, cur.length / 2)
+		if cur.position() < cur.length - fade:
+			cur.set_fade_out(cur.length - fade, fade)
+
+	def _run(self):
+		while not self._closed.wait(FEED_INTERVAL):
+			with self._lock:
+				try:
+					self._feed()
+				except Exception as e:
+					# Keep feeding; a bad queued track is dropped and the current one plays out
+					print('Mixing error:', e)
+					self._next = None
+
+	def _feed(self):
+		for deck in (self._current, self._fading):
+			if deck is not None:
+				deck.fill()
+		if self._fading is not None and self._fading.done():
+			self._underruns += getattr(self._fading, 'underruns', 0)
+			self._fading = None
+		if self._pending is not None:
+			if self._pending[2].done():
+				self._start_pending()
+			return
+		cur = self._current
+		if cur is None or cur.paused:
+			return
+		ended = cur.done()
+		if self._next is not None and self._fading is None:
+			start_at = cur.fade_at if cur.fade_at is not None else cur.length
+			if ended or cur.position() >= start_at:
+				path, length, future = self._next
+				if future is not None and not future.done():
+					return  # still decoding; start it as soon as it's ready
+				if future is None and isinstance(cur, _MusicDeck) and not ended:
+					return  # both on pygame.mixer.music: one after the other
+				self._next = None
+				pcm = future.result() if future is not None else None
+				deck = self._deck(path, length, pcm)
+				fade = 0.0 if ended else max(0.0, cur.length - cur.position())
+				deck.start(0.0, min(fade, self.crossfade))
+				deck.set_volume(self._volume)
+				self._fading = None if ended else cur
+				if ended:
+					cur.stop()
+				self._current = deck
+				self._post_end()
+				return
+		if ended:
+			self._current = None
+			self._post_end()
+
+	def _start_pending(self):
+		"""The loaded track has been decoded: make it current and start it if
+		play() was called meanwhile."""
+		path, length, future = self._pending
+		start, paused = self._pending_play, self._pending_paused
+		self._pending = self._pending_play = None
+		self._pending_paused = False
+		try:
+			pcm = future.result()
+		except Exception as e:
+			print('Mixing error:', e)
+			if start is not None:
+				self._post_end()
+			return
+		self._current = self._deck(path, length, pcm)
+		if start is not None:
+			self._current.start(*start)
+			self._current.set_volume(self._volume)
+			if paused:
+				self._current.pause()
+			self._plan_fade()
+
+	def _post_end(self):
+		if self._endevent is not None:
+			try:
+				pygame.event.post(pygame.event.Event(self._endevent))
+			except pygame.error:
+				pass
+
+
+def _map_pcm(path, dtype, channels):
+	"""Memory-map a decoded PCM file as a frames x channels array. The file is
+	unlinked once mapped where the OS allows it (close() removes the rest)."""
+	pcm = numpy.memmap(path, dtype=dtype, mode='r')
+	try:
+		os.unlink(path)
+	except OSError:
+		pass
+	return pcm.reshape(-1, channels)
+
+
+# ----- worker side -----
+def decode(track_path, out_path, rate, size, channels):
+	"""Decode ``track_path`` at the given mixer format and write the raw PCM to
+	``out_path`` (worker process); returns the number of bytes written."""
+	global pygame
+	if pygame is None:
+		# Worker processes only decode: no sound card
+		os.environ['SDL_AUDIODRIVER'] = 'dummy'
+		os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+		import pygame
+		pygame.mixer.init(frequency=rate, size=size, channels=channels)
+	if pygame.mixer.get_init() != (rate, size, channels):
+		raise ValueError(f'mixer format {pygame.mixer.get_init()} instead of {(rate, size, channels)}')
+	raw = pygame.mixer.Sound(track_path).get_raw()
+	with open(out_path, 'wb') as f:
+		f.write(raw)
+	return len(raw)
+
+
+if __name__ == '__main__':
+	if '--serve' in sys.argv[1:]:
+		from workers import serve
+		serve({'decode': decode})
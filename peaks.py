@@ -0,0 +1,358 @@
+"""Waveform overview peaks for the MP3 player.
+
+Each track is decoded once, in a worker process, to mono 16-bit PCM at
+``PEAK_RATE`` and reduced to min/max peaks: level 0 holds one (min, max) pair
+of signed bytes per ``SAMPLES_PER_BIN`` samples, and every further level
+halves the previous one, down to about ``MIN_LEVEL_BINS`` bins. The levels are
+stored in one small ``.pk`` file per track::
+
+    header   magic b'MP3PEAK1', sample rate, samples per bin, duration (s),
+             level count
+    index    (offset, bins) per level
+    data     int8 min/max pairs, level 0 first
+
+Cache files are named after the track's path, size and mtime, so an edited
+track simply gets a new file. ``Peaks`` memory-maps one and ``columns()``
+picks the level closest to the requested width, so drawing costs O(pixels)
+however long the track is.
+
+This module has no Tk dependency; ``python peaks.py --serve`` is the worker
+process run by ``PeakService`` through ``workers.ProcessPool``.
+"""
+import hashlib
+import mmap
+import os
+import queue
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+# numpy module, imported by level0() in worker processes (optional)
+numpy = None
+
+PEAK_RATE = 11025
+SAMPLES_PER_BIN = 128  # level 0: about 86 bins per second
+MIN_LEVEL_BINS = 512
+MAGIC = b'MP3PEAK1'
+_HEADER = struct.Struct('<8sIIdI')
+_LEVEL = struct.Struct('<QQ')
+
+
+# ----- analysis (worker side) -----
+def _level0_numpy(raw):
+	samples = numpy.frombuffer(raw, dtype='<i2')
+	n = -(-len(samples) // SAMPLES_PER_BIN)
+	if not n:
+		return b''
+	padded = numpy.zeros(n * SAMPLES_PER_BIN, dtype=numpy.int16)
+	padded[:len(samples)] = samples
+	# Short final bin: repeat its first sample instead of padding with silence
+	padded[len(samples):] = samples[-1]
+	bins = padded.reshape(n, SAMPLES_PER_BIN)
+	out = numpy.empty((n, 2), dtype=numpy.int8)
+	out[:, 0] = bins.min(axis=1) >> 8
+	out[:, 1] = bins.max(axis=1) >> 8
+	return out.tobytes()
+
+
+def _level0_array(raw):
+	samples = array('h')
+	samples.frombytes(raw[:len(raw) & ~1])
+	if struct.pack('=h', 1) != struct.pack('<h', 1):
+		samples.byteswap()
+	out = array('b')
+	for i in range(0, len(samples), SAMPLES_PER_BIN):
+		chunk = samples[i:i + SAMPLES_PER_BIN]
+		out.append(min(chunk) >> 8)
+		out.append(max(chunk) >> 8)
+	return out.tobytes()
+
+
+def level0(raw):
+	"""Reduce mono little-endian int16 PCM to interleaved int8 (min, max) pairs."""
+	global numpy
+	if numpy is None:
+		try:
+			import numpy
+		except ImportError:
+			# Optional: fall back to the array module
+			return _level0_array(raw)
+	return _level0_numpy(raw)
+
+
+def pyramid(level):
+	"""Return ``[level, level/2, level/4, ...]`` down to about MIN_LEVEL_BINS bins."""
+	levels = [bytes(level)]
+	current = array('b')
+	current.frombytes(level)
+	while len(current) // 2 > MIN_LEVEL_BINS:
+		if len(current) % 4:
+			# Odd bin count: repeat the last pair
+			current.extend(current[-2:])
+		mins = current[0::2]
+		maxs = current[1::2]
+		merged = array('b', bytes(len(mins)))
+		merged[0::2] = array('b', map(min, mins[0::2], mins[1::2]))
+		merged[1::2] = array('b', map(max, maxs[0::2], maxs[1::2]))
+		current = merged
+		levels.append(current.tobytes())
+	return levels
+
+
+def write_peaks(path, levels, duration, sample_rate=PEAK_RATE, samples_per_bin=SAMPLES_PER_BIN):
+	"""Write a ``.pk`` file atomically."""
+	path = Path(path)
+	offset = _HEADER.size + _LEVEL.size * len(levels)
+	index = []
+	for data in levels:
+		index.append(_LEVEL.pack(offset, len(data) // 2))
+		offset += len(data)
+	tmp = path.with_name(path.name + f'.{os.getpid()}.tmp')
+	with open(tmp, 'wb') as f:
+		f.write(_HEADER.pack(MAGIC, sample_rate, samples_per_bin, float(duration), len(levels)))
+		f.write(b''.join(index))
+		for data in levels:
+			f.write(data)
+	os.replace(tmp, path)
+
+
+_mixer_ready = False
+
+
+def _init_mixer():
+	# Worker processes only decode: no sound card, no window
+	global _mixer_ready
+	if _mixer_ready:
+		return
+	os.environ['SDL_AUDIODRIVER'] = 'dummy'
+	os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+	import pygame
+	pygame.mixer.init(frequency=PEAK_RATE, size=-16, channels=1)
+	_mixer_ready = True
+
+
+def decode_mono(track_path):
+	"""Decode a track to mono little-endian int16 PCM; returns (raw bytes, rate)."""
+	_init_mixer()
+	import pygame
+	rate, _size, channels = pygame.mixer.get_init()
+	sound = pygame.mixer.Sound(track_path)
+	raw = sound.get_raw()
+	del sound
+	if channels != 1:
+		# The mixer refused mono; keep the first channel
+		frame = 2 * channels
+		raw = b''.join(raw[i:i + 2] for i in range(0, len(raw), frame))
+	return raw, rate
+
+
+def analyze(track_path, cache_file):
+	"""Decode ``track_path`` and write its peaks to ``cache_file`` (worker process)."""
+	raw, rate = decode_mono(track_path)
+	duration = len(raw) / 2 / rate
+	write_peaks(cache_file, pyramid(level0(raw)), duration, sample_rate=rate)
+	return cache_file
+
+
+# ----- reading (UI side) -----
+class Peaks:
+	"""A memory-mapped ``.pk`` file."""
+	def __init__(self, path):
+		self.path = Path(path)
+		with open(self.path, 'rb') as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, self.sample_rate, self.samples_per_bin, self.duration, count = _HEADER.unpack_from(self._map, 0)
+			if magic != MAGIC:
+				raise ValueError(f'{self.path}: not a peak file')
+			view = memoryview(self._map).cast('b')
+			self.levels = []  # (int8 view of interleaved min/max, bins)
+			for i in range(count):
+				offset, bins = _LEVEL.unpack_from(self._map, _HEADER.size + i * _LEVEL.size)
+				self.levels.append((view[offset:offset + 2 * bins], bins))
+		except (struct.error, ValueError, TypeError):
+			self.close()
+			raise
+
+	def columns(self, width, start=0.0, end=None):
+		"""Return ``width`` (min, max) pairs in -128..127 for ``start``-``end`` seconds.
+
+		Uses the coarsest level with at least one bin per column, so each column
+		reads one or two bins.
+		"""
+		if width <= 0 or not self.levels:
+			return []
+		end = self.duration if end is None else end
+		span = max(end - start, 1e-9) / max(self.duration, 1e-9)
+		chosen = 0
+		for k in range(len(self.levels)):
+			if self.levels[k][1] * span >= width:
+				chosen = k
+		data, bins = self.levels[chosen]
+		first = start / max(self.duration, 1e-9) * bins
+		step = span * bins / width
+		out = []
+		for x in range(width):
+			a = int(first + x * step)
+			b = max(a + 1, int(first + (x + 1) * step))
+			if a >= bins or a < 0:
+				out.append((0, 0))
+				continue
+			b = min(b, bins)
+			out.append((min(data[2 * a:2 * b:2]), max(data[2 * a + 1:2 * b:2])))
+		return out
+
+	def close(self):
+		self.levels = []
+		try:
+			self._map.close()
+		except BufferError:
+			# A view is still referenced; the map is released with it
+			pass
+
+
+class PeakCache:
+	"""Directory of ``.pk`` files keyed by track path, size and mtime."""
+	def __init__(self, directory):
+		self.directory = Path(directory)
+
+	def file_for(self, track_path):
+		"""Cache file path for the track as it is now, or None if it is unreadable."""
+		try:
+			st = os.stat(track_path)
+		except OSError:
+			return None
+		key = f'{os.path.abspath(track_path)}\0{st.st_size}\0{st.st_mtime_ns}'
+		return self.directory / (hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest() + '.pk')
+
+	def load(self, cache_file):
+		try:
+			return Peaks(cache_file)
+		except (OSError, ValueError):
+			return None
+
+
+class PeakService:
+	"""Analyse tracks in a process pool and hand ``Peaks`` back to the Tk loop.
+
+	``get()`` returns cached peaks immediately or schedules an analysis; the
+	result is delivered to ``subscribe``d callbacks as ``callback(path, peaks)``
+	from ``drain()``. The pool (spawned, so it never inherits Tk or SDL state)
+	is created on the first analysis.
+	"""
+	def __init__(self, cache_dir=None, max_workers=None, drain_interval=100, keep_open=16):
+		self.cache_dir = cache_dir
+		self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+		self.drain_interval = drain_interval
+		self.keep_open = keep_open
+		self._cache = None
+		self._pool = None
+		self._results = queue.SimpleQueue()
+		self._pending = set()
+		self._failed = set()
+		self._open = OrderedDict()  # track path -> Peaks
+		self._listeners = []
+		self._widget = None
+		self._after_id = None
+
+	def subscribe(self, callback):
+		self._listeners.append(callback)
+
+	def _peak_cache(self):
+		if self._cache is None:
+			directory = self.cache_dir
+			if directory is None:
+				from metadata import default_cache_dir
+				directory = default_cache_dir() / 'peaks'
+			Path(directory).mkdir(parents=True, exist_ok=True)
+			self._cache = PeakCache(directory)
+		return self._cache
+
+	def get(self, path):
+		"""Return Peaks for ``path`` if already analysed, else None (and analyse it)."""
+		peaks = self._open.get(path)
+		if peaks is not None:
+			self._open.move_to_end(path)
+			return peaks
+		if path in self._pending or path in self._failed:
+			return None
+		cache = self._peak_cache()
+		cache_file = cache.file_for(path)
+		if cache_file is None:
+			return None
+		if cache_file.exists():
+			peaks = cache.load(cache_file)
+			if peaks is not None:
+				self._remember(path, peaks)
+				return peaks
+		self._submit(path, cache_file)
+		return None
+
+	def _remember(self, path, peaks):
+		self._open[path] = peaks
+		while len(self._open) > self.keep_open:
+			_, old = self._open.popitem(last=False)
+			old.close()
+
+	def _submit(self, path, cache_file):
+		if self._pool is None:
+			from workers import ProcessPool
+			self._pool = ProcessPool(__file__, self.max_workers)
+		self._pending.add(path)
+		self._pool.submit('analyze', (path, str(cache_file)),
+			lambda result, error, path=path: self._results.put((path, None if error else result)))
+
+	def drain(self):
+		"""Open finished peak files and notify listeners. Tk thread only."""
+		while True:
+			try:
+				path, cache_file = self._results.get_nowait()
+			except queue.Empty:
+				break
+			self._pending.discard(path)
+			peaks = self._peak_cache().load(cache_file) if cache_file else None
+			if peaks is None:
+				# Undecodable; don't retry every time the track is played
+				self._failed.add(path)
+				continue
+			self._remember(path, peaks)
+			for callback in self._listeners:
+				try:
+					callback(path, peaks)
+				except Exception:
+					pass
+
+	def start(self, widget):
+		"""Begin draining results periodically using ``widget.after``."""
+		self._widget = widget
+		self._tick()
+
+	def _tick(self):
+		self.drain()
+		try:
+			self._after_id = self._widget.after(self.drain_interval, self._tick)
+		except Exception:
+			self._after_id = None
+
+	def shutdown(self):
+		"""Stop draining and kill the worker processes (analyses in flight are lost)."""
+		if self._after_id is not None and self._widget is not None:
+			try:
+				self._widget.after_cancel(self._after_id)
+			except Exception:
+				pass
+			self._after_id = None
+		if self._pool is not None:
+			self._pool.terminate()
+			self._pool = None
+		for peaks in self._open.values():
+			peaks.close()
+		self._open.clear()
+
+
+if __name__ == '__main__':
+	if '--serve' in sys.argv[1:]:
+		from workers import serve
+		serve({'analyze': analyze})
@@ -1,330 +1,134 @@
+import time
+# Startup profiling (--profile-startup): wall-clock marks taken while booting
+STARTUP_T0 = time.perf_counter()
+startup_marks = []
+
+
+def mark_startup(label):
+	startup_marks.append((label, time.perf_counter()))
+
 from tkinter import *
 from tkinter import filedialog
-import pygame
-import time
-from mutagen.mp3 import MP3
+# ttk stays eager: the song and volume sliders are part of the first frame
 import tkinter.ttk as ttk
+mark_startup('import tkinter + ttk')
+import argparse
 import os
-import json
+import sys
+from itertools import islice
 from pathlib import Path
+mark_startup('import stdlib')
+# pygame (engine) and mutagen (metadata) are imported on first use
+from metadata import MetadataCache, MetadataService, default_cache_dir
+from library import FolderImporter
+from formats import dialog_patterns
+from playlist import Playlist
+from playlist_view import VirtualListbox
+from search import SearchIndex
+from session import SessionStore
+from playlist_io import read_playlist, write_playlist
+from waveform_view import WaveformView
+from peaks import PeakService
+from loudness import LoudnessService, replay_gain
+from engine import PlayerEngine, PLAYING, STOPPED
+from playorder import REPEAT_ALL, REPEAT_MODES, REPEAT_OFF, REPEAT_ONE
+from audiocache import AudioCache, DEFAULT_MAX_BYTES
+from prefetch import Prefetcher, DEFAULT_TRACKS
+from theme import ThemeManager
+mark_startup('import app modules')
+
+# Command line options
+parser = argparse.ArgumentParser(description="MP3 Player")
+parser.add_argument('--profile-startup', action='store_true',
+	help="print time-to-first-frame and an import breakdown, then exit")
+parser.add_argument('--watch-skins', action='store_true',
+	help="reload the active skin when its manifest or images change (skin development)")
+parser.add_argument('--cache-mb', type=int, default=DEFAULT_MAX_BYTES // 2 ** 20,
+	help="memory for recently played tracks, so going back to one doesn't reread it (0 turns it off)")
+parser.add_argument('--prefetch', type=int, default=DEFAULT_TRACKS,
+	help="upcoming tracks to read ahead in the background, for slow or network storage (0 turns it off)")
+parser.add_argument('--prefetch-mbps', type=float, default=0,
+	help="bandwidth limit for reading ahead, in MB per second (0 for none)")
+ARGS, _unknown_args = parser.parse_known_args()
 
 root = Tk()
+mark_startup('create Tk root')
 
 root.title("MP3 Player")
 root.geometry("500x400")
 
 
-class ThemeManager:
-	"""Level-2 image-based skin loader and applier."""
-	def __init__(self, root, widgets):
-		self.root = root
-		self.widgets = widgets  # dict of widget references
-		self.current_skin = None
-		self.images = {}
-		self.skin_dir = None
-		self.controls = {}
-		self.use_text_buttons = False
-		# For custom chrome dragging
-		self._drag_enabled = False
-		self._drag_start_root = (0, 0)
-		self._drag_win_origin = (0, 0)
-
-	def _enable_drag(self):
-		if self._drag_enabled:
-			return
-		def _is_protected_widget(w):
-			# Do not start/move drag if the event originated from song or volume sliders
-			protected = [
-				self.widgets.get('song_slider'),
-				self.widgets.get('volume_slider'),
-			]
-			try:
-				while w is not None:
-					if w in protected:
-						return True
-					w = w.master
-				return False
-			except Exception:
-				return False
-		def _on_press(event):
-			# Skip initiating drag if clicking on protected widgets
-			if _is_protected_widget(event.widget):
-				return
-			self._drag_start_root = (event.x_root, event.y_root)
-			self._drag_win_origin = (self.root.winfo_x(), self.root.winfo_y())
-		def _on_motion(event):
-			# Skip moving while interacting with protected widgets
-			if _is_protected_widget(event.widget):
-				return
-			dx = event.x_root - self._drag_start_root[0]
-			dy = event.y_root - self._drag_start_root[1]
-			x = self._drag_win_origin[0] + dx
-			y = self._drag_win_origin[1] + dy
-			try:
-				self.root.geometry(f"+{int(x)}+{int(y)}")
-			except Exception:
-				pass
-		self.root.bind('<Button-1>', _on_press, add='+')
-		self.root.bind('<B1-Motion>', _on_motion, add='+')
-		self._drag_enabled = True
+# Playlist model: single source of truth for tracks; playlist_box renders it
+PLAYLIST = Playlist()
 
-	def _disable_drag(self):
-		if not self._drag_enabled:
-			return
-		try:
-			self.root.unbind('<Button-1>')
-			self.root.unbind('<B1-Motion>')
-		except Exception:
-			pass
-		self._drag_enabled = False
-
-	def load_skin(self, skin_name):
-		base = Path(__file__).parent
-		self.skin_dir = base / 'skins' / skin_name
-		manifest_file = self.skin_dir / 'manifest.json'
-		if not manifest_file.exists():
-			raise FileNotFoundError(f"Skin manifest not found: {manifest_file}")
-		with open(manifest_file, 'r', encoding='utf-8') as f:
-			data = json.load(f)
-		self.current_skin = data
-		self._load_images(self.skin_dir, data.get('images', {}))
-		self.apply()
-
-	def _load_images(self, skin_dir, images_cfg):
-		# Keep references so Tk doesn’t GC them
-		self.images = {}
-		for key, rel in images_cfg.items():
-			path = skin_dir / rel
-			if path.exists():
-				try:
-					self.images[key] = PhotoImage(file=str(path))
-				except Exception:
-					pass
-
-	def apply(self):
-		if not self.current_skin:
-			return
-		colors = self.current_skin.get('colors', {})
-		fonts = self.current_skin.get('fonts', {})
-		metrics = self.current_skin.get('metrics', {})
-		window = self.current_skin.get('window', {})
-		self.controls = self.current_skin.get('controls', {})
-		self.use_text_buttons = bool(self.controls.get('use_text_buttons', False))
-
-		# Window size and bg color
-		if isinstance(window, dict) and 'width' in window and 'height' in window:
-			try:
-				self.root.geometry(f"{int(window['width'])}x{int(window['height'])}")
-			except Exception:
-				pass
-		if 'root_bg' in colors:
-			try:
-				self.root.configure(bg=colors['root_bg'])
-			except Exception:
-				pass
+# Playback engine: owns transport state and the pygame mixer; the UI mirrors it.
+# The mixer is opened on first playback rather than here. Recently played
+# tracks are kept in memory (--cache-mb) so back/forward doesn't reread them,
+# and the next ones are read ahead (--prefetch) so switching doesn't wait on disk.
+AUDIO_CACHE = AudioCache(ARGS.cache_mb * 2 ** 20) if ARGS.cache_mb > 0 else None
+PREFETCHER = Prefetcher(ARGS.prefetch, ARGS.prefetch_mbps * 2 ** 20 or None) if ARGS.prefetch > 0 else None
+ENGINE = PlayerEngine(PLAYLIST, gapless=True, cache=AUDIO_CACHE, prefetcher=PREFETCHER)
 
-		# Custom chrome handling (remove OS title bar/borders if requested)
-		use_cc = False
-		if isinstance(window, dict):
-			use_cc = bool(window.get('use_custom_chrome', False))
-		try:
-			self.root.overrideredirect(True if use_cc else False)
-			# Optional transparent color (mostly used on Windows)
-			transparent_color = window.get('transparent_color') if isinstance(window, dict) else None
-			if transparent_color:
-				try:
-					self.root.wm_attributes('-transparentcolor', transparent_color)
-				except Exception:
-					pass
-			# Enable dragging when custom chrome is on; disable otherwise
-			if use_cc:
-				self._enable_drag()
-			else:
-				self._disable_drag()
-		except Exception:
-			pass
+# Background metadata prober; durations arrive asynchronously via the Tk loop.
+# Its persistent cache is attached after the first frame (open_metadata_cache).
+METADATA = MetadataService()
 
-		# Playlist Listbox
-		pl = self.widgets.get('playlist_box')
-		if pl:
-			cfg = {}
-			if 'playlist_bg' in colors: cfg['bg'] = colors['playlist_bg']
-			if 'playlist_fg' in colors: cfg['fg'] = colors['playlist_fg']
-			if 'playlist_select_bg' in colors: cfg['selectbackground'] = colors['playlist_select_bg']
-			if 'playlist_select_fg' in colors: cfg['selectforeground'] = colors['playlist_select_fg']
-			if 'playlist_width' in metrics: cfg['width'] = metrics['playlist_width']
-			if cfg:
-				try:
-					pl.config(**cfg)
-				except Exception:
-					pass
-
-		# Frames / Status bar
-		frame_bg = colors.get('frame_bg')
-		if frame_bg:
-			for key in ['main_frame', 'control_frame', 'volume_frame']:
-				w = self.widgets.get(key)
-				if w:
-					try:
-						w.config(bg=frame_bg)
-					except Exception:
-						pass
-		status = self.widgets.get('status_bar')
-		if status:
-			s_cfg = {}
-			if 'status_bg' in colors: s_cfg['bg'] = colors['status_bg']
-			if 'status_fg' in colors: s_cfg['fg'] = colors['status_fg']
-			if s_cfg:
-				try:
-					status.config(**s_cfg)
-				except Exception:
-					pass
-
-		# Fonts (optional)
-		try:
-			from tkinter import font as tkfont
-			if 'base' in fonts:
-				base_font = tkfont.Font(family=fonts['base'][0], size=fonts['base'][1])
-				self.root.option_add('*Font', base_font)
-			if status and 'status' in fonts:
-				status.config(font=tuple(fonts['status']))
-		except Exception:
-			pass
+# Waveform overview peaks: decoded once per track in worker processes, cached on disk
+PEAKS = PeakService()
 
-		# Slider styling (ttk) if provided by skin
-		try:
-			from tkinter import ttk as _ttk
-			style = _ttk.Style()
-			slider_cfg = self.current_skin.get('slider', {}) if isinstance(self.current_skin, dict) else {}
-			trough = slider_cfg.get('trough_color')
-			thumb = slider_cfg.get('slider_color') or slider_cfg.get('thumb_color')
-			thickness = slider_cfg.get('thickness')
-			force_theme = slider_cfg.get('force_theme')
-			# Optionally force a theme that honors color options (clam is reliable across platforms)
-			if force_theme:
-				try:
-					style.theme_use(force_theme)
-				except Exception:
-					pass
-			# Create styles only if colors or thickness are provided
-			if trough or thumb or thickness:
-				# Horizontal (song scrubber)
-				style_name_h = 'Themed.Horizontal.TScale'
-				cfg_h = {}
-				if trough: cfg_h['troughcolor'] = trough
-				if thumb: cfg_h['background'] = thumb
-				if thickness: cfg_h['thickness'] = int(thickness)
-				if cfg_h:
-					style.configure(style_name_h, **cfg_h)
-					song = self.widgets.get('song_slider')
-					if song:
-						try:
-							song.configure(style=style_name_h)
-						except Exception:
-							pass
-				# Vertical (volume)
-				style_name_v = 'Themed.Vertical.TScale'
-				cfg_v = {}
-				if trough: cfg_v['troughcolor'] = trough
-				if thumb: cfg_v['background'] = thumb
-				if thickness: cfg_v['thickness'] = int(thickness)
-				if cfg_v:
-					style.configure(style_name_v, **cfg_v)
-					vol = self.widgets.get('volume_slider')
-					if vol:
-						try:
-							vol.configure(style=style_name_v)
-						except Exception:
-							pass
-		except Exception:
-			pass
+# Loudness normalization: tracks measured in worker processes, results kept with the metadata
+LOUDNESS = LoudnessService(METADATA)
 
-		# Controls: text-mode or image-mode
-		if self.use_text_buttons:
-			labels = self.controls.get('button_text', {})
-			btn_cfg = {
-				'fg': self.controls.get('button_fg', colors.get('playlist_fg', None)),
-				'bg': self.controls.get('button_bg', colors.get('frame_bg', None)),
-			}
-			w = self.controls.get('button_width', 2)
-			h = self.controls.get('button_height', 1)
-			def set_text(btn_key, key, default_txt):
-				btn = self.widgets.get(btn_key)
-				if btn:
-					try:
-						btn.config(image='', text=labels.get(key, default_txt), width=w, height=h)
-						# Apply optional fg/bg if present
-						cfg = {k: v for k, v in btn_cfg.items() if v is not None}
-						if cfg:
-							btn.config(**cfg)
-						btn.image = None
-					except Exception:
-						pass
-			set_text('back_button', 'back', 'B')
-			set_text('forward_button', 'forward', 'F')
-			set_text('play_button', 'play', 'P')
-			set_text('stop_button', 'stop', 'S')
-		else:
-			# Image-mode: optionally subsample icons
-			subsample = int(metrics.get('icon_subsample', 1) or 1)
-			def set_img(btn_key, img_key):
-				btn = self.widgets.get(btn_key)
-				img = self.images.get(img_key)
-				if btn and img:
-					try:
-						scaled = img.subsample(subsample, subsample) if subsample > 1 else img
-						# Reset size so the image defines the button size (important when switching from text mode)
-						btn.config(image=scaled, text='', width=0, height=0)
-						btn.image = scaled  # keep reference
-					except Exception:
-						pass
-			set_img('back_button', 'back')
-			set_img('forward_button', 'forward')
-			# Play/Pause handled dynamically; set initial play image
-			set_img('play_button', 'play')
-			set_img('stop_button', 'stop')
-
-		# Optional background image for the window (Level 2)
-		bg_rel = window.get('background') if isinstance(window, dict) else None
-		if bg_rel and self.skin_dir is not None:
-			try:
-				bg_path = self.skin_dir / bg_rel
-				canvas = self.widgets.get('bg_canvas')
-				if not canvas:
-					canvas = Canvas(self.root, highlightthickness=0, bd=0)
-					canvas.place(x=0, y=0, relwidth=1, relheight=1)
-					self.widgets['bg_canvas'] = canvas
-				img = PhotoImage(file=str(bg_path))
-				canvas.bg_img = img
-				canvas.delete('all')
-				canvas.create_image(0, 0, anchor='nw', image=img)
-				canvas.lower()  # behind everything
-			except Exception:
-				pass
 
-# Initialize Pygame
-pygame.mixer.init()
+def track_tags(path):
+	"""Title and artist tags already probed for ``path``, for the search index."""
+	info = METADATA.info.get(path)
+	return None if info is None else (info.title, info.artist)
+
+# Search: word index over the playlist, updated as tracks are added and removed
+SEARCH = SearchIndex(PLAYLIST, tags_for=track_tags)
+# Tracks matching the search box while it filters the playlist box, else None
+search_results = None
+search_rerun = None  # after_idle id of a pending re-run for newly probed tags
+
+# Session journal (playlist and player state), opened after the first frame
+SESSION = None
+# (track, seconds) to resume from when the restored track is played
+resume_position = None
 
-# Internal storage for full paths aligned with playlist_box indices
-playlist_paths = []
 
-# Cache for song lengths to avoid per-second disk I/O
-song_lengths = {}
+def open_metadata_cache():
+	"""Attach the persistent metadata cache so restarts don't re-parse every file header."""
+	try:
+		METADATA.cache = MetadataCache(default_cache_dir() / 'metadata.sqlite3')
+	except Exception as e:
+		print('Metadata cache unavailable:', e)
 
 # Flag to indicate the user is scrubbing the time slider
 is_scrubbing = False
 
 
+# Playlist file entries added per Tk loop turn while importing
+IMPORT_BATCH = 2000
+
+
 def get_song_length(path):
-	"""Return song length in seconds (float), cached to avoid repeated disk reads."""
-	if path in song_lengths:
-		return song_lengths[path]
-	try:
-		length = MP3(path).info.length
-	except Exception:
-		length = 0
-	song_lengths[path] = length
-	return length
+	"""Return song length in seconds (float), or 0 while the background probe is pending."""
+	return METADATA.length(path)
+
+# Folder import in progress (FolderImporter) and its status bar prefix
+folder_import = None
+import_progress = ''
+status_text = ''
+
+
+def set_status(text):
+	"""Show text in the status bar, prefixed by folder import progress while one runs."""
+	global status_text
+	status_text = text
+	if import_progress:
+		text = f'{import_progress}    {text}'
+	status_bar.config(text=text)
 
 # Helper to enable/disable back/forward buttons based on current selection
 
@@ -336,7 +140,11 @@ def update_nav_buttons():
 		n = playlist_box.size()
 		state_back = NORMAL
 		state_forward = NORMAL
-		if n <= 1:
+		if ENGINE.current is not None:
+			# While playing, follow the play queue and play order (shuffle, repeat)
+			state_back = NORMAL if ENGINE.order.before(ENGINE.current) is not None else DISABLED
+			state_forward = NORMAL if ENGINE.following() is not None else DISABLED
+		elif n <= 1:
 			# With 0 or 1 items, nothing to navigate
 			state_back = DISABLED
 			state_forward = DISABLED
@@ -377,80 +185,190 @@ def themed_image(key, fallback_img):
 	except Exception:
 		return fallback_img
 
+# Gapless playback: the engine queues the following track in SDL_mixer ahead of time
+gapless = BooleanVar(value=True)
+
+# How often (ms) the engine's end-of-track pump runs; one filtered event.get() per tick
+EVENT_PUMP_MS = 20
+# How often (ms) the slider and elapsed time are redrawn (Options -> Refresh Interval)
+ui_refresh_ms = IntVar(value=250)
+play_time_after = None
+# How often (ms) the playback position is saved while playing, so a crash loses little
+SESSION_SAVE_MS = 10000
+
+
+def pump_events():
+	"""Let the engine handle end-of-track; runs independently of UI refresh."""
+	ENGINE.poll()
+	root.after(EVENT_PUMP_MS, pump_events)
+
+
+def autosave_session():
+	"""Save the session state (and so the position) periodically while playing."""
+	if ENGINE.state == PLAYING:
+		save_session_state()
+	root.after(SESSION_SAVE_MS, autosave_session)
+
+
+def toggle_gapless():
+	"""Apply the Options menu checkbox to the engine."""
+	ENGINE.set_gapless(gapless.get())
+
+
+# Crossfade between tracks, in seconds (Options -> Crossfade; 0 is off)
+crossfade_seconds = IntVar(value=0)
+
+# Play order (Options -> Shuffle, Options -> Repeat)
+shuffle = BooleanVar(value=False)
+repeat_mode = StringVar(value=REPEAT_OFF)
+
+
+def toggle_shuffle():
+	"""Apply the Options menu checkbox; a new shuffle starts from the current track."""
+	ENGINE.set_shuffle(shuffle.get())
+	update_nav_buttons()
+	save_session_state()
+
+
+def set_repeat():
+	"""Apply the Options menu choice (off, all, one)."""
+	ENGINE.set_repeat(repeat_mode.get())
+	update_nav_buttons()
+	save_session_state()
+
+
+def show_cache_stats():
+	"""Show the audio cache's counters in the status bar."""
+	if AUDIO_CACHE is None:
+		set_status('Audio cache off (--cache-mb 0)')
+		return
+	stats = AUDIO_CACHE.stats()
+	set_status(f"Audio cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} tracks, "
+		f"{stats['bytes'] / 2**20:.0f} of {stats['max_bytes'] / 2**20:.0f} MB  ")
+
+
+def show_prefetch_stats():
+	"""Show how much disk wait reading ahead has kept off track changes."""
+	if PREFETCHER is None:
+		set_status('Prefetch off (--prefetch 0)')
+		return
+	stats = PREFETCHER.stats()
+	set_status(f"Prefetch: {stats['files']} tracks read ahead ({stats['bytes'] / 2**20:.0f} MB), "
+		f"{stats['hits']} of {stats['hits'] + stats['misses']} loads ready, {stats['hidden_seconds']:.2f} s of reads hidden  ")
+
+
+def set_crossfade():
+	"""Apply the Options menu choice; falls back to Off if crossfading is unavailable."""
+	if not ENGINE.set_crossfade(crossfade_seconds.get()):
+		crossfade_seconds.set(0)
+		set_status('Crossfade unavailable (needs numpy)')
+
+
+def show_play_button(key):
+	"""Switch the play button between its 'play' and 'pause' look."""
+	try:
+		img = themed_image(key, button_images.get(key))
+		play_button.config(image=img)
+		play_button.image = img
+		_theme = globals().get('THEME')
+		if _theme is not None:
+			# Not set through the theme: have its next apply set them again
+			_theme.forget('play_button', 'image', 'text')
+	except Exception:
+		pass
+
+
+def on_engine_event(kind, *args):
+	"""Mirror engine notifications into the widgets."""
+	if kind == 'track':
+		track = args[0]
+		# Reset Slider position and status bar
+		set_status('')
+		song_slider.config(value=0)
+		waveform.set_peaks(PEAKS.get(track.path) if show_waveform.get() else None)
+		# Measure the following track too, so its gain is known when it starts
+		following = ENGINE.following(auto=True) if normalize_loudness.get() else None
+		if following is not None:
+			LOUDNESS.get(following.path)
+		# Move the active bar to the track now playing
+		show_current_track()
+		save_session_state()
+		# Restart the time display for the new track
+		play_time()
+	elif kind == 'state':
+		state = args[0]
+		show_play_button('pause' if state == PLAYING else 'play')
+		if state == STOPPED:
+			# Clear Playlist Bar, status and slider
+			playlist_box.selection_clear(ACTIVE)
+			set_status('')
+			song_slider.config(value=0)
+			waveform.set_peaks(None)
+	elif kind == 'error':
+		track = args[0]
+		# The engine has stopped; say why instead of silently doing nothing
+		set_status(f"Can't play {track.title}: unsupported format or unreadable file  ")
+	try:
+		update_nav_buttons()
+	except Exception:
+		pass
+
 # Create Function To Deal With Time
 def play_time():
+	"""Redraw the slider and elapsed time every ``ui_refresh_ms``.
+
+	Display only: end-of-track handling lives in the engine's poll().
+	"""
+	global play_time_after, song_length
+	# Keep a single refresh loop even if play() is pressed repeatedly
+	if play_time_after is not None:
+		status_bar.after_cancel(play_time_after)
+		play_time_after = None
+
 	# Check to see if song is stopped
-	if stopped:
+	if ENGINE.state == STOPPED or ENGINE.current is None:
 		return
 
-	# Get the currently selected index and resolve full path
-	selection = playlist_box.curselection()
-	if not selection:
-		return
-	index = selection[0]
-	if index < 0 or index >= len(playlist_paths):
-		return
-	song_path = playlist_paths[index]
-	
-	# Get Current Song Length from cache
-	global song_length
-	song_length = get_song_length(song_path)
+	# Get Current Song Length from cache (0 until the background probe finishes)
+	song_length = get_song_length(ENGINE.current.path)
 	# Convert to time format
-	converted_song_length = time.strftime('%M:%S', time.gmtime(song_length))
-	
-	# Use the slider as the single source of truth to avoid jitter/backward jumps
-	current_sec = int(song_slider.get())
-
-	# Check to see if song is over -> auto-advance if possible
-	if current_sec >= int(song_length) and int(song_length) > 0:
-		size = playlist_box.size()
-		if index < size - 1:
-			# Advance to the next track
-			next_song()
-			# Schedule next tick and return
-			status_bar.after(1000, play_time)
-			return
-		else:
-			# Last track: stop
-			stop()
-			return
+	if song_length > 0:
+		converted_song_length = time.strftime('%M:%S', time.gmtime(song_length))
+	else:
+		converted_song_length = '--:--'
 
-	# If the user is scrubbing, only update the status (preview) and don't move the slider
 	if is_scrubbing:
-		converted_current_time = time.strftime('%M:%S', time.gmtime(current_sec))
-		status_bar.config(text=f'Time Elapsed: {converted_current_time} of {converted_song_length}  ')
-		status_bar.after(1000, play_time)
-		return
-
-	if paused:
-		# If paused, freeze the display at the current slider position
-		converted_current_time = time.strftime('%M:%S', time.gmtime(current_sec))
-		status_bar.config(text=f'Time Elapsed: {converted_current_time} of {converted_song_length}  ')
+		# While scrubbing, preview the slider position and don't move the slider
+		current_sec = int(song_slider.get())
 	else:
-		# Move slider along 1 second at a time
-		next_time = current_sec + 1
-		# Clamp to song length bounds
-		if next_time > int(song_length):
-			next_time = int(song_length)
-		# Output new time value to slider, and to length of song
-		song_slider.config(to=song_length, value=next_time)
-		# Convert Slider position to time format
-		converted_current_time = time.strftime('%M:%S', time.gmtime(next_time))
-		# Output slider time
-		status_bar.config(text=f'Time Elapsed: {converted_current_time} of {converted_song_length}  ')
-	
-	# Create Loop To Check the time every second
-	status_bar.after(1000, play_time)
+		current_sec = ENGINE.position()
+		if song_length > 0:
+			# Clamp to song length bounds
+			current_sec = min(current_sec, song_length)
+			song_slider.config(to=song_length, value=current_sec)
+		else:
+			# Length not probed yet; keep counting without a bound
+			song_slider.config(value=current_sec)
+	waveform.set_position(current_sec)
+	# Convert position to time format and output it
+	converted_current_time = time.strftime('%M:%S', time.gmtime(current_sec))
+	set_status(f'Time Elapsed: {converted_current_time} of {converted_song_length}  ')
+
+	# Schedule the next redraw
+	play_time_after = status_bar.after(ui_refresh_ms.get(), play_time)
+
+# File dialog filter: every registered audio format, then anything
+AUDIO_FILETYPES = (("Audio Files", dialog_patterns()), ("All Files", "*"))
 
 # Create Function To Add One Song To Playlist
 def add_song():
-	song = filedialog.askopenfilename(title="Choose A Song", filetypes=(("mp3 Files", "*.mp3" ), ))
+	song = filedialog.askopenfilename(title="Choose A Song", filetypes=AUDIO_FILETYPES)
 	if not song:
 		return
-	# Display only filename without extension, store full path separately
-	display_name = os.path.splitext(os.path.basename(song))[0]
-	playlist_box.insert(END, display_name)
-	playlist_paths.append(song)
+	# The playlist view shows the filename without extension
+	PLAYLIST.append(song)
+	# Probe duration/tags in the background
+	METADATA.request(song)
 	# Update nav buttons after adding
 	try:
 		update_nav_buttons()
@@ -459,30 +377,123 @@ def add_song():
 
 # Create Function To Add Many Songs to Playlist
 def add_many_songs():
-	songs = filedialog.askopenfilenames(title="Choose Songs", filetypes=(("mp3 Files", "*.mp3" ), ))
+	songs = filedialog.askopenfilenames(title="Choose Songs", filetypes=AUDIO_FILETYPES)
 	
-	# Loop through selected songs and add display names while storing full paths
-	for song in songs:
-		if song:
-			display_name = os.path.splitext(os.path.basename(song))[0]
-			playlist_box.insert(END, display_name)
-			playlist_paths.append(song)
+	# Add all selected songs in one model update
+	songs = [song for song in songs if song]
+	PLAYLIST.extend(songs)
+	# Probe durations/tags in the background
+	METADATA.request_many(songs)
 	# Update nav buttons after adding many
 	try:
 		update_nav_buttons()
 	except Exception:
 		pass
 
+# Create Function To Add A Whole Folder (recursively) To Playlist
+def add_folder():
+	global folder_import
+	folder = filedialog.askdirectory(title="Choose A Folder")
+	if not folder:
+		return
+	# Only one import at a time; a new one replaces the old
+	if folder_import is not None:
+		folder_import.cancel()
+	# Files without an audio extension are let in if their first bytes are audio
+	folder_import = FolderImporter(folder, sniff=True).start()
+	import_cancel_button.place(relx=0, rely=0.5, anchor=W)
+	poll_folder_import(folder_import)
+
+
+def poll_folder_import(importer):
+	"""Move newly found files from the import thread into the playlist."""
+	global folder_import, import_progress
+	if importer is not folder_import:
+		return
+	if importer.cancelled:
+		finish_folder_import(f'Import cancelled after {importer.found} tracks')
+		return
+	songs = importer.poll()
+	if songs:
+		PLAYLIST.extend(songs)
+		METADATA.request_many(songs)
+		try:
+			update_nav_buttons()
+		except Exception:
+			pass
+	if importer.done:
+		finish_folder_import(f'Imported {importer.found} tracks')
+		return
+	import_progress = f'Importing: {importer.found} tracks, {importer.dirs_scanned} folders'
+	set_status(status_text)
+	root.after(30, poll_folder_import, importer)
+
+
+def finish_folder_import(message):
+	global folder_import, import_progress
+	folder_import = None
+	import_progress = ''
+	import_cancel_button.place_forget()
+	set_status(message)
+
+
+def cancel_folder_import():
+	if folder_import is not None:
+		folder_import.cancel()
+
+# Create Function To Import An M3U/PLS Playlist
+def import_playlist():
+	path = filedialog.askopenfilename(title="Import Playlist",
+		filetypes=(("Playlists", "*.m3u *.m3u8 *.pls"), ("All Files", "*.*")))
+	if not path:
+		return
+	import_playlist_batch(read_playlist(path), os.path.basename(path), 0)
+
+
+def import_playlist_batch(entries, name, added):
+	"""Add the next batch of a playlist file's entries, then let the Tk loop run."""
+	try:
+		batch = list(islice(entries, IMPORT_BATCH))
+	except (OSError, UnicodeError) as e:
+		set_status(f'Playlist {name} not imported: {e}')
+		return
+	if batch:
+		PLAYLIST.extend(batch)
+		METADATA.request_many(batch)
+		root.after(1, import_playlist_batch, entries, name, added + len(batch))
+		return
+	set_status(f'Imported {added} songs from {name}')
+	try:
+		update_nav_buttons()
+	except Exception:
+		pass
+
+# Create Function To Export The Playlist As M3U/PLS
+def export_playlist():
+	path = filedialog.asksaveasfilename(title="Export Playlist", defaultextension='.m3u8',
+		filetypes=(("M3U8 Playlist", "*.m3u8"), ("M3U Playlist", "*.m3u"), ("PLS Playlist", "*.pls")))
+	if not path:
+		return
+	try:
+		# Lengths already probed go into #EXTINF; unknown ones are written as -1
+		count = write_playlist(path, PLAYLIST, length=known_length)
+	except OSError as e:
+		set_status(f'Playlist not exported: {e}')
+		return
+	set_status(f'Exported {count} songs to {os.path.basename(path)}')
+
+
+def known_length(path):
+	info = METADATA.info.get(path)
+	return info.length if info is not None else 0
+
 # Create Function To Delete One Song From Playlist
 def delete_song():
-	# Delete Highlighted Song From Playlist and keep paths in sync
+	# Delete Highlighted Song From Playlist (the view follows the model)
 	selection = playlist_box.curselection()
 	if not selection:
 		return
-	index = selection[0]
-	playlist_box.delete(index)
-	if 0 <= index < len(playlist_paths):
-		playlist_paths.pop(index)
+	PLAYLIST.delete(view_to_playlist(selection[0]))
 	# Update nav buttons after deletion
 	try:
 		update_nav_buttons()
@@ -492,253 +503,107 @@ def delete_song():
 # Create Function To Delete All Songs From Playlist
 def delete_all_songs():
 	# Delete ALL songs 
-	playlist_box.delete(0, END)
-	playlist_paths.clear()
+	PLAYLIST.clear()
 	# Update nav buttons after clearing all
 	try:
 		update_nav_buttons()
 	except Exception:
 		pass
 
+# Create Functions For The Play Queue (songs to play next, ahead of the playlist order)
+def selected_tracks():
+	return [PLAYLIST[view_to_playlist(row)] for row in playlist_box.curselection()]
+
+def queue_next():
+	# Highlighted songs play straight after the current one
+	tracks = selected_tracks()
+	if tracks:
+		ENGINE.up_next.enqueue_next(tracks)
+		set_status(f'Playing next: {tracks[0].title}  ')
+
+def queue_last():
+	# Highlighted songs go to the end of the play queue
+	tracks = selected_tracks()
+	if tracks:
+		ENGINE.up_next.enqueue_last(tracks)
+		set_status(f'Queued {tracks[0].title} ({len(ENGINE.up_next)} in queue)  ')
+
+def clear_queue():
+	ENGINE.up_next.clear()
+	set_status('Play queue cleared  ')
+
+def show_queue():
+	"""List the first few queued songs in the status bar."""
+	titles = [track.title for track in islice(ENGINE.up_next, 5)]
+	if not titles:
+		set_status('Play queue is empty  ')
+		return
+	more = len(ENGINE.up_next) - len(titles)
+	set_status('Up next: ' + ', '.join(titles) + (f' and {more} more' if more > 0 else '') + '  ')
+
+def on_queue_changed(kind, *args):
+	update_nav_buttons()
+	save_session_state()
+
 # Create Play Function
 def play():
-	global stopped, paused
 	# Toggle behavior: if something is already playing or paused, toggle pause/unpause
-	if pygame.mixer.music.get_busy():
-		if paused:
-			# Resume
-			pygame.mixer.music.unpause()
-			paused = False
-			stopped = False
-			# Update play button to show pause icon while playing
-			try:
-				img = themed_image('pause', pause_btn_img)
-				play_button.config(image=img)
-				play_button.image = img
-			except Exception:
-				pass
-			try:
-				update_nav_buttons()
-			except Exception:
-				pass
-			return
-		else:
-			# Pause current playback
-			pygame.mixer.music.pause()
-			paused = True
-			# Update play button to show play icon when paused
-			try:
-				img = themed_image('play', play_btn_img)
-				play_button.config(image=img)
-				play_button.image = img
-			except Exception:
-				pass
-			try:
-				update_nav_buttons()
-			except Exception:
-				pass
-			return
-
-	# If not busy, but we believe it's paused (edge case), try to unpause
-	if paused:
-		try:
-			pygame.mixer.music.unpause()
-			paused = False
-			stopped = False
-			# Update play button to show pause icon while playing
-			try:
-				img = themed_image('pause', pause_btn_img)
-				play_button.config(image=img)
-				play_button.image = img
-			except Exception:
-				pass
-			try:
-				update_nav_buttons()
-			except Exception:
-				pass
-			return
-		except Exception:
-			pass
-
+	if ENGINE.state != STOPPED:
+		ENGINE.toggle_pause()
+		return
 	# Otherwise start playing the selected song
-	stopped = False
-	# Get full path of the selected song via index mapping
+	global resume_position
 	selection = playlist_box.curselection()
 	if not selection:
 		return
-	index = selection[0]
-	if index < 0 or index >= len(playlist_paths):
-		return
-	song_path = playlist_paths[index]
-	
-	#Load song with pygame mixer
-	pygame.mixer.music.load(song_path)
-	#Play song with pygame mixer
-	pygame.mixer.music.play(loops=0)
-	paused = False
-	# Update play button to show pause icon while playing
-	try:
-		img = themed_image('pause', pause_btn_img)
-		play_button.config(image=img)
-		play_button.image = img
-	except Exception:
-		pass
-	# Update nav buttons state
-	try:
-		update_nav_buttons()
-	except Exception:
-		pass
+	index = view_to_playlist(selection[0])
+	# The track playing when the last session closed picks up where it was
+	start = 0
+	if resume_position is not None and resume_position[0] is PLAYLIST[index]:
+		start = resume_position[1]
+	resume_position = None
+	ENGINE.play_index(index, start=start)
 
-	# Get Song Time
-	play_time()
-
-# Create Stopped Variable
-global stopped
-stopped = False 
 def stop():
-	# Stop the song
-	pygame.mixer.music.stop()
-	# Clear Playlist Bar
-	playlist_box.selection_clear(ACTIVE)
-
-	status_bar.config(text='')
-
-	# Set our slider to zero
-	song_slider.config(value=0)
-
-	# Set Stop Variable To True
-	global stopped, paused
-	stopped = True
-	paused = False
-	# Update play button to show play icon when stopped
-	try:
-		img = themed_image('play', play_btn_img)
-		play_button.config(image=img)
-		play_button.image = img
-	except Exception:
-		pass
-	# Update nav buttons after stop (selection cleared)
-	try:
-		update_nav_buttons()
-	except Exception:
-		pass
-
+	# Stop the song; the engine's 'state' notification resets the widgets
+	ENGINE.stop()
 
-	
 # Create Function To Play The Next Song
 def next_song():
-	# Reset Slider position and status bar
-	status_bar.config(text='')
-	song_slider.config(value=0)
-
-	#Get current song number
-	next_one = playlist_box.curselection()
-	if not next_one:
+	# While playing, or with songs in the play queue, the engine knows what comes next
+	if ENGINE.current is not None or ENGINE.up_next:
+		ENGINE.next()
 		return
-	# Add One To The Current Song Number Tuple/list
-	next_one = next_one[0] + 1
-
-	# Resolve next song full path from mapping
-	if next_one < 0 or next_one >= len(playlist_paths):
+	# Get current song number and add one
+	selection = playlist_box.curselection()
+	if not selection or selection[0] + 1 >= playlist_box.size():
 		return
-	song_path = playlist_paths[next_one]
-	#Load song with pygame mixer
-	pygame.mixer.music.load(song_path)
-	#Play song with pygame mixer
-	pygame.mixer.music.play(loops=0)
-	# Ensure not paused when moving to the next song
-	global paused
-	paused = False
-	# Update play button to show pause icon while playing
-	try:
-		img = themed_image('pause', pause_btn_img)
-		play_button.config(image=img)
-		play_button.image = img
-	except Exception:
-		pass
-
-	# Clear Active Bar in Playlist
-	playlist_box.selection_clear(0, END)
-
-	# Move active bar to next song
-	playlist_box.activate(next_one)
-
-	# Set Active Bar To next song
-	playlist_box.selection_set(next_one, last=None)
-	# Update nav buttons after moving to next
-	try:
-		update_nav_buttons()
-	except Exception:
-		pass
+	ENGINE.play_index(view_to_playlist(selection[0] + 1))
 
 # Create function to play previous song
 def previous_song():
-	# Reset Slider position and status bar
-	status_bar.config(text='')
-	song_slider.config(value=0)
-
-	#Get current song number
-	next_one = playlist_box.curselection()
-	if not next_one:
+	# While playing, go back through the play order (in shuffle, what actually played)
+	if ENGINE.current is not None:
+		ENGINE.previous()
 		return
-	# Subtract One To Move To The Previous Song
-	next_one = next_one[0] - 1
-
-	# Resolve previous song full path from mapping
-	if next_one < 0 or next_one >= len(playlist_paths):
+	# Get current song number and subtract one
+	selection = playlist_box.curselection()
+	if not selection or selection[0] == 0:
 		return
-	song_path = playlist_paths[next_one]
-	#Load song with pygame mixer
-	pygame.mixer.music.load(song_path)
-	#Play song with pygame mixer
-	pygame.mixer.music.play(loops=0)
-	# Ensure not paused when moving to the previous song
-	global paused
-	paused = False
-	# Update play button to show pause icon while playing
-	try:
-		img = themed_image('pause', pause_btn_img)
-		play_button.config(image=img)
-		play_button.image = img
-	except Exception:
-		pass
-
-	# Clear Active Bar in Playlist
-	playlist_box.selection_clear(0, END)
-
-	# Move active bar to previous song
-	playlist_box.activate(next_one)
-
-	# Set Active Bar To previous song
-	playlist_box.selection_set(next_one, last=None)
-	# Update nav buttons after moving to previous
-	try:
-		update_nav_buttons()
-	except Exception:
-		pass
-
-
-# Create Paused Variable
-global paused 
-paused = False
+	ENGINE.play_index(view_to_playlist(selection[0] - 1))
 
 # Create Pause Function
 def pause(is_paused):
-	global paused
-	paused = is_paused
-
-	if paused:
+	if is_paused:
 		#Unpause
-		pygame.mixer.music.unpause()
-		paused = False
+		ENGINE.resume()
 	else:
 		#Pause
-		pygame.mixer.music.pause()
-		paused = True
+		ENGINE.pause()
 
 #Create Volume Function
 def volume(x):
-	pygame.mixer.music.set_volume(volume_slider.get())
+	ENGINE.set_volume(volume_slider.get())
 
 # Create a Slide Function For Song Positioning
 def slide(x):
@@ -754,40 +619,89 @@ def on_scrub_start(event):
 
 def on_seek_release(event):
 	"""Seek to the position set on the slider when the user releases the mouse."""
-	global is_scrubbing, paused
+	global is_scrubbing
 	is_scrubbing = False
-	selection = playlist_box.curselection()
-	if not selection:
-		return
-	index = selection[0]
-	if index < 0 or index >= len(playlist_paths):
+	# The engine repositions the loaded stream in place, reloading only if that fails
+	ENGINE.seek(song_slider.get())
+
+
+def view_to_playlist(row):
+	"""Playlist index of a playlist box row (the box may be showing search results)."""
+	if search_results is None:
+		return row
+	return PLAYLIST.index_of(search_results[row])
+
+
+def show_current_track():
+	"""Select the track now playing in the playlist box, if it is shown."""
+	playlist_box.selection_clear(0, END)
+	index = ENGINE.index
+	if index is None:
 		return
-	target = int(song_slider.get())
-	# Try seeking without reloading to avoid stutter; if it fails, reload then seek
-	try:
-		pygame.mixer.music.play(loops=0, start=target)
-	except Exception:
-		try:
-			song_path = playlist_paths[index]
-			pygame.mixer.music.load(song_path)
-			pygame.mixer.music.play(loops=0, start=target)
-		except Exception:
-			return
-	paused = False
-	try:
-		img = themed_image('pause', pause_btn_img)
-		play_button.config(image=img)
-		play_button.image = img
-	except Exception:
-		pass
+	row = index if search_results is None else search_results.position(PLAYLIST[index])
+	if row is not None:
+		playlist_box.activate(row)
+		playlist_box.selection_set(row)
+		playlist_box.see(row)
+
+
+def run_search(*args):
+	"""Filter the playlist box to the tracks matching the search box."""
+	global search_results
+	search_results = SEARCH.search(search_text.get())
+	playlist_box.set_model(PLAYLIST if search_results is None else search_results)
+	show_current_track()
+	update_nav_buttons()
+
 
+def clear_search(event=None):
+	search_text.set('')
+
+
+def on_playlist_changed(kind, *args):
+	# The box follows edits in place, or re-runs the search while it is filtered
+	if search_results is None:
+		playlist_box.model_changed(kind, *args)
+	else:
+		run_search()
+
+
+def on_metadata(info):
+	# Make probed title/artist tags searchable, and show them in an active search
+	global search_rerun
+	if SEARCH.set_tags(info.path, info.title, info.artist) and search_results is not None and search_rerun is None:
+		# Once per batch of probes, not once per probe
+		search_rerun = root.after_idle(rerun_search)
+
+
+def rerun_search():
+	global search_rerun
+	search_rerun = None
+	if search_results is not None:
+		run_search()
+
+
+# Create Search Box (filters the playlist as you type; Escape clears it)
+search_frame = Frame(root)
+search_frame.pack(pady=(10, 0))
+search_label = Label(search_frame, text="Search")
+search_label.pack(side=LEFT, padx=5)
+search_text = StringVar()
+search_entry = Entry(search_frame, textvariable=search_text, width=40)
+search_entry.pack(side=LEFT)
+search_entry.bind('<Escape>', clear_search)
+search_text.trace_add('write', run_search)
+METADATA.subscribe(on_metadata)
 
 # Create main Frame
 main_frame = Frame(root)
-main_frame.pack(pady=20)
+main_frame.pack(pady=(10, 20))
 
-# Create Playlist Box
-playlist_box = Listbox(main_frame, bg="black", fg="green", width=60, selectbackground="green", selectforeground='black')
+# Create Playlist Box (virtualized: only visible rows are drawn, so huge libraries stay fast)
+playlist_box = VirtualListbox(main_frame, model=PLAYLIST, label=lambda track: track.title, bg="black", fg="green", width=60, selectbackground="green", selectforeground='black')
+PLAYLIST.subscribe(on_playlist_changed)
+ENGINE.subscribe(on_engine_event)
+ENGINE.up_next.subscribe(on_queue_changed)
 playlist_box.grid(row=0, column=0)
 # Update navigation buttons when selection changes
 playlist_box.bind('<<ListboxSelect>>', lambda e: update_nav_buttons())
@@ -800,31 +714,48 @@ volume_frame.grid(row=0, column=1, padx=20)
 volume_slider = ttk.Scale(volume_frame, from_=1, to=0, orient=VERTICAL, length=125, value=1, command=volume)
 volume_slider.pack(pady=10)
 
+# Create Waveform Overview above the Song Slider (click to seek)
+scrub_frame = Frame(main_frame)
+scrub_frame.grid(row=2, column=0, pady=20)
+waveform = WaveformView(scrub_frame, width=360, command=ENGINE.seek)
+waveform.pack(fill=X)
+
 # Create Song Slider
-song_slider = ttk.Scale(main_frame, from_=0, to=100, orient=HORIZONTAL, length=360, value=0)
-song_slider.grid(row=2, column=0, pady=20)
+song_slider = ttk.Scale(scrub_frame, from_=0, to=100, orient=HORIZONTAL, length=360, value=0)
+song_slider.pack()
 # Bind scrubbing start/end to avoid feedback loop
 song_slider.bind('<ButtonPress-1>', lambda e: on_scrub_start(e))
 song_slider.bind('<ButtonRelease-1>', lambda e: on_seek_release(e))
 
-# Define Button Images For Controls (resolve robust paths)
+# Button Images For Controls (resolve robust paths); loaded after the first frame
 base_dir = os.path.dirname(os.path.abspath(__file__))
-back_btn_img = PhotoImage(file=os.path.join(base_dir, 'images', 'back50.png'))
-forward_btn_img = PhotoImage(file=os.path.join(base_dir, 'images', 'forward50.png'))
-play_btn_img = PhotoImage(file=os.path.join(base_dir, 'images', 'play50.png'))
-pause_btn_img = PhotoImage(file=os.path.join(base_dir, 'images', 'pause50.png'))
-stop_btn_img = PhotoImage(file=os.path.join(base_dir, 'images', 'stop50.png'))
+button_images = {}
+
+
+def load_button_images():
+	"""Load the default control icons and swap them in for the text placeholders."""
+	for key in ('back', 'forward', 'play', 'pause', 'stop'):
+		try:
+			button_images[key] = PhotoImage(file=os.path.join(base_dir, 'images', f'{key}50.png'))
+		except Exception:
+			pass
+	for key, btn in (('back', back_button), ('forward', forward_button), ('stop', stop_button)):
+		img = button_images.get(key)
+		if img:
+			btn.config(image=img)
+			btn.image = img
+	show_play_button('pause' if ENGINE.state == PLAYING else 'play')
 
 
 # Create Button Frame
 control_frame = Frame(main_frame)
 control_frame.grid(row=1, column=0, pady=20)
 
-# Create Play/Stop etc Buttons
-back_button = Button(control_frame, image=back_btn_img, borderwidth=0, command=previous_song)
-forward_button = Button(control_frame, image=forward_btn_img, borderwidth=0, command=next_song)
-play_button = Button(control_frame, image=play_btn_img, borderwidth=0, command=play)
-stop_button = Button(control_frame, image=stop_btn_img, borderwidth=0, command=stop)
+# Create Play/Stop etc Buttons (text until the icons are loaded)
+back_button = Button(control_frame, text='B', borderwidth=0, command=previous_song)
+forward_button = Button(control_frame, text='F', borderwidth=0, command=next_song)
+play_button = Button(control_frame, text='P', borderwidth=0, command=play)
+stop_button = Button(control_frame, text='S', borderwidth=0, command=stop)
 
 back_button.grid(row=0, column=0, padx=10)
 forward_button.grid(row=0, column=1, padx=10)
@@ -848,6 +779,14 @@ my_menu.add_cascade(label="Add Songs", menu=add_song_menu)
 add_song_menu.add_command(label="Add One Song To Playlist", command=add_song)
 # Add Many Songs to Playlist
 add_song_menu.add_command(label="Add Many Songs To Playlist", command=add_many_songs)
+# Add a folder (and its subfolders) to Playlist
+add_song_menu.add_command(label="Add Folder To Playlist", command=add_folder)
+
+# Create Playlist File Menu (M3U/M3U8/PLS import and export)
+playlist_menu = Menu(my_menu, tearoff=0)
+my_menu.add_cascade(label="Playlist", menu=playlist_menu)
+playlist_menu.add_command(label="Import Playlist File", command=import_playlist)
+playlist_menu.add_command(label="Export Playlist File", command=export_playlist)
 
 # Create Delete Song Menu Dropdowns
 remove_song_menu = Menu(my_menu, tearoff=0)
@@ -855,18 +794,174 @@ my_menu.add_cascade(label="Remove Songs", menu=remove_song_menu)
 remove_song_menu.add_command(label="Delete A Song From Playlist", command=delete_song)
 remove_song_menu.add_command(label="Delete All Songs From Playlist", command=delete_all_songs)
 
+# Create Play Queue Menu (songs to play next, without touching the playlist order)
+queue_menu = Menu(my_menu, tearoff=0)
+my_menu.add_cascade(label="Queue", menu=queue_menu)
+queue_menu.add_command(label="Play Selected Song Next", command=queue_next)
+queue_menu.add_command(label="Add Selected Song To Queue", command=queue_last)
+queue_menu.add_command(label="Show Queue", command=show_queue)
+queue_menu.add_command(label="Clear Queue", command=clear_queue)
+
+# Waveform overview (Options -> Waveform Overview)
+show_waveform = BooleanVar(value=True)
+
+
+def on_peaks_ready(path, peaks):
+	"""Show a finished analysis if it belongs to the track playing now."""
+	if show_waveform.get() and ENGINE.current is not None and ENGINE.current.path == path:
+		waveform.set_peaks(peaks)
+
+
+def toggle_waveform():
+	if show_waveform.get():
+		waveform.pack(fill=X, before=song_slider)
+		if ENGINE.current is not None:
+			waveform.set_peaks(PEAKS.get(ENGINE.current.path))
+	else:
+		waveform.set_peaks(None)
+		waveform.pack_forget()
+
+
+PEAKS.subscribe(on_peaks_ready)
+
+# Loudness normalization (Options -> Normalize Loudness)
+normalize_loudness = BooleanVar(value=True)
+
+
+def track_gain(track):
+	"""Engine hook: volume factor bringing ``track`` to the reference loudness."""
+	if not normalize_loudness.get():
+		return 1.0
+	measured = LOUDNESS.get(track.path)
+	if measured is None:
+		# Not analysed yet; play at full volume until the result lands
+		return 1.0
+	return replay_gain(*measured)
+
+
+def on_loudness_ready(path, loudness, peak):
+	if ENGINE.current is not None and ENGINE.current.path == path:
+		ENGINE.refresh_gain()
+
+
+def toggle_normalize():
+	ENGINE.refresh_gain()
+
+
+ENGINE.gain_for = track_gain
+LOUDNESS.subscribe(on_loudness_ready)
+
+# Skin hot-reload (Options -> Reload Skin On Change): watch the active skin's files
+watch_skins = BooleanVar(value=ARGS.watch_skins)
+SKIN_WATCH_MS = 100
+skin_watcher = None
+skin_watch_after = None
+
+
+def skin_watch_tick():
+	"""Apply debounced skin file changes; the watching itself runs on a thread."""
+	global skin_watch_after
+	skin_watch_after = None
+	if skin_watcher is None:
+		return
+	changed = skin_watcher.poll()
+	if changed:
+		try:
+			sections = THEME.reload(changed)
+			# The skin sets the 'play' look; keep 'pause' while playing
+			show_play_button('pause' if ENGINE.state == PLAYING else 'play')
+			if sections:
+				set_status(f"Reloaded skin: {', '.join(sorted(sections))} ({THEME.configure_calls} changes)")
+		except Exception as e:
+			set_status(f'Skin reload failed: {e}')
+		# Images may have moved to other folders
+		skin_watcher.set_paths(THEME.watch_dirs())
+	skin_watch_after = root.after(SKIN_WATCH_MS, skin_watch_tick)
+
+
+def toggle_skin_watch():
+	"""Start or stop watching the active skin directory."""
+	global skin_watcher, skin_watch_after
+	if watch_skins.get():
+		if skin_watcher is None:
+			from watcher import FileWatcher
+			skin_watcher = FileWatcher(THEME.watch_dirs()).start()
+		if skin_watch_after is None:
+			skin_watch_after = root.after(SKIN_WATCH_MS, skin_watch_tick)
+	else:
+		if skin_watch_after is not None:
+			root.after_cancel(skin_watch_after)
+			skin_watch_after = None
+		if skin_watcher is not None:
+			skin_watcher.stop()
+			skin_watcher = None
+
+
+def switch_skin(name):
+	"""Skins menu: load a skin and point the watcher (if on) at its files."""
+	try:
+		THEME.load_skin(name)
+	except (OSError, ValueError) as e:
+		# SkinError lists every schema problem in the manifest
+		set_status(f'Skin {name!r} not loaded: {e}')
+		return
+	show_play_button('pause' if ENGINE.state == PLAYING else 'play')
+	if skin_watcher is not None:
+		skin_watcher.set_paths(THEME.watch_dirs())
+
+
+# Create Playback Options Menu
+options_menu = Menu(my_menu, tearoff=0)
+my_menu.add_cascade(label="Options", menu=options_menu)
+# Gapless: queue the next track in SDL_mixer ahead of the current one ending
+options_menu.add_checkbutton(label="Gapless Playback", variable=gapless, command=toggle_gapless)
+# Overlap the end of each track with the start of the next (decodes tracks ahead)
+crossfade_menu = Menu(options_menu, tearoff=0)
+options_menu.add_cascade(label="Crossfade", menu=crossfade_menu)
+for seconds in (0, 2, 5, 8):
+	crossfade_menu.add_radiobutton(label=f"{seconds} s" if seconds else "Off", variable=crossfade_seconds,
+		value=seconds, command=set_crossfade)
+# Shuffle: a random order, kept as tracks are added or removed; Back retraces it
+options_menu.add_checkbutton(label="Shuffle", variable=shuffle, command=toggle_shuffle)
+repeat_menu = Menu(options_menu, tearoff=0)
+options_menu.add_cascade(label="Repeat", menu=repeat_menu)
+for mode, label in ((REPEAT_OFF, "Off"), (REPEAT_ALL, "All"), (REPEAT_ONE, "One")):
+	repeat_menu.add_radiobutton(label=label, variable=repeat_mode, value=mode, command=set_repeat)
+# How often the time display refreshes (end-of-track detection is unaffected)
+refresh_menu = Menu(options_menu, tearoff=0)
+options_menu.add_cascade(label="Refresh Interval", menu=refresh_menu)
+for ms in (100, 250, 500, 1000):
+	refresh_menu.add_radiobutton(label=f"{ms} ms", variable=ui_refresh_ms, value=ms)
+# Decoding for the waveform runs in background processes; turn off to save CPU
+options_menu.add_checkbutton(label="Waveform Overview", variable=show_waveform, command=toggle_waveform)
+# Per-track gain from background loudness analysis (needs numpy)
+options_menu.add_checkbutton(label="Normalize Loudness", variable=normalize_loudness, command=toggle_normalize)
+# Skin development: pick up edits to the active skin without reopening it
+options_menu.add_checkbutton(label="Reload Skin On Change", variable=watch_skins, command=toggle_skin_watch)
+# Hit/miss and memory counters of the recently-played cache
+options_menu.add_command(label="Audio Cache Statistics", command=show_cache_stats)
+# Tracks read ahead of time and the disk wait that saved
+options_menu.add_command(label="Prefetch Statistics", command=show_prefetch_stats)
+
 # Create Status Bar
 status_bar = Label(root, text='', bd=1, relief=GROOVE, anchor=E)
 status_bar.pack(fill=X, side=BOTTOM, ipady=2)
+# Cancel button shown inside the status bar while a folder import runs
+import_cancel_button = Button(status_bar, text='Cancel', borderwidth=1, command=cancel_folder_import)
 
 # Theme wiring (after widgets exist)
 widgets = {
 	'playlist_box': playlist_box,
 	'main_frame': main_frame,
+	'search_frame': search_frame,
+	'search_label': search_label,
+	'search_entry': search_entry,
 	'control_frame': control_frame,
 	'volume_frame': volume_frame,
 	'volume_slider': volume_slider,
 	'song_slider': song_slider,
+	'scrub_frame': scrub_frame,
+	'waveform': waveform,
 	'status_bar': status_bar,
 	'back_button': back_button,
 	'forward_button': forward_button,
@@ -874,11 +969,6 @@ widgets = {
 	'stop_button': stop_button,
 }
 THEME = ThemeManager(root, widgets)
-# Load default skin; ignore failure to keep app working
-try:
-	THEME.load_skin('default')
-except Exception as e:
-	print('Skin load failed:', e)
 
 # Skins menu to switch at runtime
 skins_menu = Menu(my_menu, tearoff=0)
@@ -892,7 +982,148 @@ try:
 except Exception:
 	available_skins = ['default']
 for skin in available_skins:
-	skins_menu.add_command(label=skin.title(), command=lambda s=skin: THEME.load_skin(s))
+	skins_menu.add_command(label=skin.title(), command=lambda s=skin: switch_skin(s))
+
+# Start draining metadata probe results on the Tk loop
+METADATA.start(root)
+PEAKS.start(root)
+LOUDNESS.start(root)
+
+# Start the end-of-track event pump
+pump_events()
+# Start saving the playback position while playing
+root.after(SESSION_SAVE_MS, autosave_session)
+
+
+def on_close():
+	"""Save the session and stop the services. Metadata probes that haven't
+	started are dropped; the few already running are waited for, since they
+	write to the metadata cache that shutdown() then closes."""
+	if SESSION is not None:
+		SESSION.close(session_state())
+	METADATA.shutdown()
+	PEAKS.shutdown()
+	LOUDNESS.shutdown()
+	ENGINE.close()
+	if skin_watcher is not None:
+		skin_watcher.stop()
+	root.destroy()
+
+root.protocol('WM_DELETE_WINDOW', on_close)
+
+
+def session_state():
+	"""Player state saved with the session: current track, position, volume, crossfade,
+	shuffle and repeat, play queue, skin."""
+	index = ENGINE.index
+	position = ENGINE.position() if index is not None else 0.0
+	if index is None:
+		selection = playlist_box.curselection()
+		index = view_to_playlist(selection[0]) if selection else None
+		if resume_position is not None and index is not None and resume_position[0] is PLAYLIST[index]:
+			position = resume_position[1]
+	skin = THEME.skin_dir.name if THEME.skin_dir is not None else None
+	return {'index': index, 'position': round(position, 2), 'volume': ENGINE.volume,
+		'crossfade': crossfade_seconds.get(), 'shuffle': shuffle.get(), 'repeat': repeat_mode.get(),
+		'queue': [PLAYLIST.index_of(track) for track in ENGINE.up_next], 'skin': skin}
+
+
+def save_session_state():
+	if SESSION is not None:
+		SESSION.save_state(session_state())
+
+
+def restore_session():
+	"""Reload the last session's playlist and state, then journal every change; returns the state."""
+	global SESSION, resume_position
+	try:
+		SESSION = SessionStore(default_cache_dir() / 'session.bin')
+		paths, state = SESSION.load()
+	except Exception as e:
+		print('Session unavailable:', e)
+		SESSION = None
+		return {}
+	PLAYLIST.extend(paths)
+	try:
+		volume = float(state.get('volume', 1.0))
+		volume_slider.set(volume)
+		ENGINE.set_volume(volume)
+		# Applied when the mixer opens on first playback
+		crossfade_seconds.set(int(state.get('crossfade') or 0))
+		ENGINE.set_crossfade(crossfade_seconds.get())
+		if state.get('repeat') in REPEAT_MODES:
+			repeat_mode.set(state['repeat'])
+			ENGINE.set_repeat(repeat_mode.get())
+		index = state.get('index')
+		if isinstance(index, int) and 0 <= index < len(PLAYLIST):
+			playlist_box.selection_set(index)
+			playlist_box.activate(index)
+			playlist_box.see(index)
+			resume_position = (PLAYLIST[index], float(state.get('position') or 0.0))
+		# After the playlist is loaded, so the permutation covers it
+		shuffle.set(bool(state.get('shuffle')))
+		ENGINE.set_shuffle(shuffle.get())
+		ENGINE.up_next.enqueue_last(PLAYLIST[i] for i in state.get('queue') or () if 0 <= i < len(PLAYLIST))
+	except (TypeError, ValueError):
+		pass
+	SESSION.attach(PLAYLIST, state or None)
+	update_nav_buttons()
+	return state
+
+
+def deferred_startup():
+	"""Work that can wait until the window is on screen: icons, session, skin, metadata cache."""
+	load_button_images()
+	mark_startup('load button images')
+	state = restore_session()
+	mark_startup('restore session')
+	# Load the last session's skin (or the default); ignore failure to keep app working
+	try:
+		THEME.load_skin(state.get('skin') or 'default')
+	except Exception as e:
+		print('Skin load failed:', e)
+		try:
+			THEME.load_skin('default')
+		except Exception:
+			pass
+	mark_startup('load skin')
+	open_metadata_cache()
+	mark_startup('open metadata cache')
+	# Restored tracks are probed once the cache can answer for them
+	METADATA.request_many(list(PLAYLIST.paths()))
+	if watch_skins.get():
+		toggle_skin_watch()
+	if ARGS.profile_startup:
+		report_startup()
+		on_close()
+
+
+def on_first_map(event):
+	"""Note time-to-first-frame, then schedule the deferred startup work."""
+	if event.widget is not root:
+		return
+	root.unbind('<Map>')
+	root.update_idletasks()
+	mark_startup('first frame')
+	root.after_idle(deferred_startup)
+
+
+def report_startup():
+	"""Print the --profile-startup breakdown (use `python -X importtime` for per-module detail)."""
+	print('Startup profile (ms):')
+	prev = STARTUP_T0
+	for label, t in startup_marks:
+		print(f'  {label:<24} +{(t - prev) * 1000:7.1f}   at {(t - STARTUP_T0) * 1000:7.1f}')
+		prev = t
+	first_frame = dict(startup_marks).get('first frame')
+	if first_frame is not None:
+		print(f'Time to first frame: {(first_frame - STARTUP_T0) * 1000:.1f} ms')
+	print(f'Skin apply: {THEME.configure_calls} Tk configure calls')
+	deferred = [name for name in ('pygame', 'mutagen') if name not in sys.modules]
+	print('Not imported yet:', ', '.join(deferred) or 'none')
+
+root.bind('<Map>', on_first_map)
+mark_startup('build widgets and menus')
 
 
 
@@ -0,0 +1,273 @@
+"""Playlist model for the MP3 player.
+
+``Playlist`` is the single source of truth for which tracks are loaded and in
+what order; views subscribe to its change notifications instead of keeping a
+parallel list of paths. Tracks are compact ``__slots__`` records with a stable
+``id`` and an interned folder string (large libraries share few folders).
+
+Storage is a list of fixed-capacity chunks with a lazily maintained prefix
+index, so appends are amortized O(1) and positional insert/delete/move and
+``index_of`` touch one chunk plus O(log n) bookkeeping instead of shifting
+the whole playlist.
+"""
+import os
+import sys
+from bisect import bisect_right
+from itertools import chain
+
+CHUNK_SIZE = 512
+
+
+class Track:
+	"""One playlist entry. ``id`` stays the same for as long as the track is loaded."""
+	__slots__ = ('id', 'folder', 'filename', '_chunk')
+
+	def __init__(self, track_id, path):
+		folder, filename = os.path.split(path)
+		self.id = track_id
+		self.folder = sys.intern(folder)
+		self.filename = filename
+		self._chunk = None
+
+	@property
+	def path(self):
+		return os.path.join(self.folder, self.filename) if self.folder else self.filename
+
+	@property
+	def title(self):
+		"""Display label: the file name without extension."""
+		return os.path.splitext(self.filename)[0]
+
+	def __repr__(self):
+		return f'Track({self.id}, {self.path!r})'
+
+
+class _Chunk:
+	__slots__ = ('items', 'pos')
+
+	def __init__(self, items, pos):
+		self.items = items
+		self.pos = pos
+		for track in items:
+			track._chunk = self
+
+
+class Playlist:
+	"""Ordered, chunked collection of Tracks with change notifications.
+
+	Listeners registered with ``subscribe`` are called as
+	``callback(kind, *args)`` after each mutation:
+
+	- ``('insert', index, tracks)``
+	- ``('delete', index, tracks)``
+	- ``('move', src, dst)``
+	- ``('clear', count)``
+	"""
+	def __init__(self, paths=()):
+		self._chunks = []
+		self._offsets = []
+		self._dirty_from = 0
+		self._len = 0
+		self._next_id = 1
+		self._by_id = {}
+		self._listeners = []
+		if paths:
+			self.extend(paths)
+
+	# ----- notifications -----
+	def subscribe(self, callback):
+		self._listeners.append(callback)
+
+	def unsubscribe(self, callback):
+		try:
+			self._listeners.remove(callback)
+		except ValueError:
+			pass
+
+	def _notify(self, kind, *args):
+		for callback in list(self._listeners):
+			callback(kind, *args)
+
+	# ----- lookup -----
+	def __len__(self):
+		return self._len
+
+	def __iter__(self):
+		return chain.from_iterable([chunk.items for chunk in self._chunks])
+
+	def __getitem__(self, index):
+		pos, offset = self._locate(index)
+		return self._chunks[pos].items[offset]
+
+	def get(self, track_id):
+		"""Return the Track with ``track_id`` or None if it is no longer loaded."""
+		return self._by_id.get(track_id)
+
+	def __contains__(self, track_id):
+		return track_id in self._by_id
+
+	def index_of(self, track):
+		"""Current index of a Track (or track id); raises ValueError if absent."""
+		if not isinstance(track, Track):
+			track = self._by_id.get(track)
+		if track is None or track._chunk is None:
+			raise ValueError('track not in playlist')
+		chunk = track._chunk
+		self._fix_offsets()
+		return self._offsets[chunk.pos] + chunk.items.index(track)
+
+	def paths(self):
+		for track in self:
+			yield track.path
+
+	def _fix_offsets(self):
+		start = self._dirty_from
+		chunks = self._chunks
+		if start >= len(chunks):
+			del self._offsets[len(chunks):]
+			return
+		offsets = self._offsets
+		del offsets[start:]
+		total = offsets[-1] + len(chunks[start - 1].items) if start else 0
+		for chunk in chunks[start:]:
+			offsets.append(total)
+			total += len(chunk.items)
+		self._dirty_from = len(chunks)
+
+	def _locate(self, index):
+		n = self._len
+		if index < 0:
+			index += n
+		if not 0 <= index < n:
+			raise IndexError('playlist index out of range')
+		self._fix_offsets()
+		pos = bisect_right(self._offsets, index) - 1
+		return pos, index - self._offsets[pos]
+
+	def _touch(self, pos):
+		if pos < self._dirty_from:
+			self._dirty_from = pos
+
+	def _renumber(self, start):
+		for pos in range(start, len(self._chunks)):
+			self._chunks[pos].pos = pos
+		self._touch(start)
+
+	# ----- mutation -----
+	def _new_tracks(self, paths):
+		tracks = []
+		for path in paths:
+			track = Track(self._next_id, path)
+			self._next_id += 1
+			self._by_id[track.id] = track
+			tracks.append(track)
+		return tracks
+
+	def _split(self, pos):
+		"""Split an oversized chunk into CHUNK_SIZE pieces."""
+		items = self._chunks[pos].items
+		if len(items) <= CHUNK_SIZE:
+			return
+		pieces = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+		self._chunks[pos:pos + 1] = [_Chunk(piece, pos + k) for k, piece in enumerate(pieces)]
+		self._renumber(pos)
+
+	def _place(self, index, tracks):
+		if not tracks:
+			return
+		if index == self._len:
+			# Append: top up the last chunk, then add fresh chunks
+			if self._chunks and len(self._chunks[-1].items) < CHUNK_SIZE:
+				last = self._chunks[-1]
+				room = CHUNK_SIZE - len(last.items)
+				head = tracks[:room]
+				last.items.extend(head)
+				for track in head:
+					track._chunk = last
+				self._touch(last.pos)
+				tracks = tracks[room:]
+			for i in range(0, len(tracks), CHUNK_SIZE):
+				self._chunks.append(_Chunk(tracks[i:i + CHUNK_SIZE], len(self._chunks)))
+			self._touch(len(self._chunks) - 1)
+		else:
+			pos, offset = self._locate(index)
+			chunk = self._chunks[pos]
+			chunk.items[offset:offset] = tracks
+			for track in tracks:
+				track._chunk = chunk
+			self._touch(pos)
+			self._split(pos)
+
+	def insert(self, index, paths):
+		"""Insert ``paths`` before ``index`` and return the new Tracks."""
+		index = max(0, min(index, self._len))
+		tracks = self._new_tracks(paths)
+		self._place(index, tracks)
+		self._len += len(tracks)
+		if tracks:
+			self._notify('insert', index, tracks)
+		return tracks
+
+	def append(self, path):
+		return self.insert(self._len, (path,))[0]
+
+	def extend(self, paths):
+		return self.insert(self._len, paths)
+
+	def _take(self, index, count):
+		removed = []
+		while count > 0:
+			pos, offset = self._locate(index)
+			chunk = self._chunks[pos]
+			part = chunk.items[offset:offset + count]
+			del chunk.items[offset:offset + count]
+			removed.extend(part)
+			count -= len(part)
+			self._len -= len(part)
+			self._touch(pos)
+			if not chunk.items:
+				del self._chunks[pos]
+				self._renumber(pos)
+		for track in removed:
+			track._chunk = None
+		return removed
+
+	def delete(self, index, count=1):
+		"""Remove ``count`` tracks starting at ``index`` and return them."""
+		if index < 0:
+			index += self._len
+		count = min(count, self._len - index)
+		if count <= 0 or index < 0:
+			return []
+		removed = self._take(index, count)
+		for track in removed:
+			del self._by_id[track.id]
+		self._notify('delete', index, removed)
+		return removed
+
+	def move(self, src, dst):
+		"""Move the track at ``src`` so that it ends up at index ``dst``."""
+		n = self._len
+		if src < 0:
+			src += n
+		if dst < 0:
+			dst += n
+		if src == dst or not (0 <= src < n and 0 <= dst < n):
+			return
+		track = self._take(src, 1)[0]
+		self._place(dst, [track])
+		self._len += 1
+		self._notify('move', src, dst)
+
+	def clear(self):
+		count = self._len
+		for chunk in self._chunks:
+			for track in chunk.items:
+				track._chunk = None
+		self._chunks = []
+		self._offsets = []
+		self._dirty_from = 0
+		self._len = 0
+		self._by_id.clear()
+		if count:
+			self._notify('clear', count)
@@ -0,0 +1,110 @@
+"""M3U/M3U8 and PLS playlist files, read and written a line at a time.
+
+``read_playlist(path)`` yields the track paths of a playlist file as it parses
+it, so a playlist of any size is imported in batches without being held in
+memory as a whole. Relative entries are resolved against the playlist's
+folder, and ``file://`` URLs are turned into paths. Other URLs (streams) are
+skipped. ``write_playlist(path, tracks)`` streams tracks out the same way,
+with ``#EXTINF``/``TitleN``/``LengthN`` lines when lengths are known.
+
+Both formats are read as UTF-8 (plain ``.m3u`` files from older players are
+often Latin-1: bytes that aren't valid UTF-8 are kept as surrogates, so the
+file names still round-trip through ``os.fsencode``).
+"""
+import os
+from urllib.parse import unquote, urlsplit
+
+PLAYLIST_EXTENSIONS = ('.m3u', '.m3u8', '.pls')
+
+
+def _entry_path(entry, base):
+	"""Filesystem path for a playlist entry, or None for a non-file URL."""
+	if '://' in entry[:16]:
+		parts = urlsplit(entry)
+		if parts.scheme.lower() != 'file':
+			return None
+		entry = unquote(parts.path, errors='surrogateescape')
+	entry = os.path.expanduser(entry)
+	if not os.path.isabs(entry):
+		entry = os.path.join(base, entry.replace('\\', os.sep))
+	return os.path.normpath(entry)
+
+
+def _lines(path):
+	with open(path, 'r', encoding='utf-8-sig', errors='surrogateescape', newline=None) as f:
+		for line in f:
+			line = line.strip()
+			if line:
+				yield line
+
+
+def read_m3u(path):
+	"""Yield track paths from an M3U/M3U8 file (``#`` lines are directives or comments)."""
+	base = os.path.dirname(os.path.abspath(path))
+	for line in _lines(path):
+		if line.startswith('#'):
+			continue
+		entry = _entry_path(line, base)
+		if entry is not None:
+			yield entry
+
+
+def read_pls(path):
+	"""Yield track paths from the ``FileN=`` lines of a PLS file, in file order."""
+	base = os.path.dirname(os.path.abspath(path))
+	for line in _lines(path):
+		key, sep, value = line.partition('=')
+		if sep and key[:4].lower() == 'file' and key[4:].strip().isdigit():
+			entry = _entry_path(value.strip(), base)
+			if entry is not None:
+				yield entry
+
+
+def read_playlist(path):
+	"""Yield track paths from an M3U, M3U8 or PLS file (chosen by extension)."""
+	if os.path.splitext(path)[1].lower() == '.pls':
+		return read_pls(path)
+	return read_m3u(path)
+
+
+def write_m3u(path, tracks, length=None):
+	"""Write ``tracks`` (paths, or objects with ``path``/``title``) as extended M3U.
+
+	``length(path)``, if given, returns seconds (0 when unknown) for ``#EXTINF``.
+	Returns the number of tracks written.
+	"""
+	count = 0
+	with open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+		f.write('#EXTM3U\n')
+		for track in tracks:
+			track_path, title = _path_title(track)
+			seconds = int(length(track_path)) if length is not None else 0
+			f.write(f'#EXTINF:{seconds or -1},{title}\n{track_path}\n')
+			count += 1
+	return count
+
+
+def write_pls(path, tracks, length=None):
+	"""Write ``tracks`` as a PLS file; returns the number written."""
+	count = 0
+	with open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+		f.write('[playlist]\n')
+		for count, track in enumerate(tracks, 1):
+			track_path, title = _path_title(track)
+			seconds = int(length(track_path)) if length is not None else 0
+			f.write(f'File{count}={track_path}\nTitle{count}={title}\nLength{count}={seconds or -1}\n')
+		f.write(f'NumberOfEntries={count}\nVersion=2\n')
+	return count
+
+
+def write_playlist(path, tracks, length=None):
+	"""Write an M3U/M3U8 or PLS file (chosen by extension); returns the number written."""
+	if os.path.splitext(path)[1].lower() == '.pls':
+		return write_pls(path, tracks, length)
+	return write_m3u(path, tracks, length)
+
+
+def _path_title(track):
+	if isinstance(track, str):
+		return track, os.path.splitext(os.path.basename(track))[0]
+	return track.path, track.title
@@ -0,0 +1,338 @@
+"""Virtualized playlist widget for the MP3 player.
+
+``VirtualListbox`` mimics the subset of the Tk ``Listbox`` API the player uses
+(insert/delete/size/curselection/selection_*/activate/see/config) but only
+draws the rows that are currently visible. Labels live in a backing model, a
+plain list by default, and a fixed pool of canvas items is recycled as the
+view scrolls, so redraw cost is proportional to the window height rather than
+the playlist length.
+"""
+from tkinter import Canvas, Frame, Scrollbar, END, ACTIVE, VERTICAL
+from tkinter import font as tkfont
+
+
+class VirtualListbox(Frame):
+	"""Listbox-compatible view that renders only the visible rows of a model.
+
+	The model must support ``len()`` and integer indexing; ``label(item)``
+	turns an item into the displayed string.
+	"""
+	# Options handled by the view itself rather than the outer Frame
+	_VIEW_OPTIONS = ('bg', 'background', 'fg', 'foreground', 'selectbackground',
+		'selectforeground', 'width', 'height', 'font')
+
+	def __init__(self, master=None, model=None, label=str, bg='white', fg='black',
+			selectbackground='#3399ff', selectforeground='white', width=20, height=10,
+			font='TkDefaultFont', **kw):
+		Frame.__init__(self, master, **kw)
+		self._model = [] if model is None else model
+		self._label = label
+		self._bg = bg
+		self._fg = fg
+		self._select_bg = selectbackground
+		self._select_fg = selectforeground
+		self._width_chars = width
+		self._height_rows = height
+		self._font = tkfont.Font(root=master, font=font) if isinstance(font, (str, tuple)) else font
+		self._row_h = self._font.metrics('linespace') + 2
+		self._top = 0
+		self._selected = None
+		self._active = 0
+		self._slots = []  # (rect_id, text_id) pairs recycled across redraws
+		self._redraw_pending = False
+
+		self._canvas = Canvas(self, bg=bg, highlightthickness=0, bd=0, takefocus=1)
+		self._scrollbar = Scrollbar(self, orient=VERTICAL, command=self.yview)
+		self._canvas.grid(row=0, column=0, sticky='nsew')
+		self._scrollbar.grid(row=0, column=1, sticky='ns')
+		self.grid_rowconfigure(0, weight=1)
+		self.grid_columnconfigure(0, weight=1)
+		self._apply_size()
+
+		c = self._canvas
+		c.bind('<Configure>', lambda e: self._resize_pool())
+		c.bind('<Button-1>', self._on_click)
+		c.bind('<MouseWheel>', self._on_wheel)
+		c.bind('<Button-4>', lambda e: self._scroll_rows(-3))
+		c.bind('<Button-5>', lambda e: self._scroll_rows(3))
+		c.bind('<Up>', lambda e: self._move_selection(-1))
+		c.bind('<Down>', lambda e: self._move_selection(1))
+		c.bind('<Prior>', lambda e: self._move_selection(-self._visible_rows()))
+		c.bind('<Next>', lambda e: self._move_selection(self._visible_rows()))
+		c.bind('<Home>', lambda e: self.jump_to(0))
+		c.bind('<End>', lambda e: self.jump_to(self.size() - 1))
+
+	# ----- model -----
+	def set_model(self, model, label=None):
+		"""Swap the backing model (and optionally the label function) and redraw."""
+		self._model = model
+		if label is not None:
+			self._label = label
+		self._top = 0
+		self._selected = None
+		self._active = 0
+		self.refresh()
+
+	def refresh(self):
+		"""Schedule a redraw of the visible rows (coalesced to one per idle)."""
+		if not self._redraw_pending:
+			self._redraw_pending = True
+			self.after_idle(self._redraw)
+
+	def _index(self, index):
+		if index == END or index == 'end':
+			return len(self._model)
+		if index == ACTIVE or index == 'active':
+			return self._active
+		return int(index)
+
+	def size(self):
+		return len(self._model)
+
+	def get(self, index):
+		return self._label(self._model[self._index(index)])
+
+	def insert(self, index, *labels):
+		"""Insert labels into a list-backed model, keeping the selection on its item."""
+		i = self._index(index)
+		i = max(0, min(i, len(self._model)))
+		self._model[i:i] = labels
+		self.items_inserted(i, len(labels))
+
+	def delete(self, first, last=None):
+		"""Delete a label or an inclusive range from a list-backed model."""
+		i = self._index(first)
+		j = i if last is None else min(self._index(last), len(self._model) - 1)
+		if i > j or i >= len(self._model):
+			return
+		del self._model[i:j + 1]
+		self.items_deleted(i, j - i + 1)
+
+	def items_inserted(self, index, count):
+		"""Shift selection/active markers after ``count`` items appeared at ``index``."""
+		if self._selected is not None and self._selected >= index:
+			self._selected += count
+		if self._active >= index and len(self._model) > count:
+			self._active += count
+		self.refresh()
+
+	def items_deleted(self, index, count):
+		"""Shift selection/active markers after ``count`` items vanished at ``index``."""
+		end = index + count
+		if self._selected is not None:
+			if index <= self._selected < end:
+				self._selected = None
+			elif self._selected >= end:
+				self._selected -= count
+		if self._active >= end:
+			self._active -= count
+		elif self._active >= index:
+			self._active = min(index, max(0, len(self._model) - 1))
+		self._clamp_top()
+		self.refresh()
+
+	def items_moved(self, src, dst):
+		"""Keep selection/active markers on their items after a move from ``src`` to ``dst``."""
+		def follow(i):
+			if i == src:
+				return dst
+			if src < i <= dst:
+				return i - 1
+			if dst <= i < src:
+				return i + 1
+			return i
+		if self._selected is not None:
+			self._selected = follow(self._selected)
+		self._active = follow(self._active)
+		self.refresh()
+
+	def model_changed(self, kind, *args):
+		"""Adapter for ``playlist.Playlist`` change notifications."""
+		if kind == 'insert':
+			self.items_inserted(args[0], len(args[1]))
+		elif kind == 'delete':
+			self.items_deleted(args[0], len(args[1]))
+		elif kind == 'move':
+			self.items_moved(args[0], args[1])
+		elif kind == 'clear':
+			self.items_deleted(0, args[0])
+
+	# ----- selection -----
+	def curselection(self):
+		return () if self._selected is None else (self._selected,)
+
+	def selection_clear(self, first, last=None):
+		if self._selected is None:
+			return
+		i = self._index(first)
+		j = i if last is None else self._index(last)
+		if i <= self._selected <= j:
+			self._selected = None
+			self.refresh()
+
+	def selection_set(self, first, last=None):
+		i = self._index(first)
+		if 0 <= i < len(self._model):
+			self._selected = i
+			self.refresh()
+
+	def selection_includes(self, index):
+		return self._selected == self._index(index)
+
+	def activate(self, index):
+		i = self._index(index)
+		if len(self._model):
+			self._active = max(0, min(i, len(self._model) - 1))
+
+	def jump_to(self, index):
+		"""Select ``index``, bring it into view and fire ``<<ListboxSelect>>``."""
+		n = len(self._model)
+		if not n:
+			return
+		index = max(0, min(int(index), n - 1))
+		self._selected = index
+		self._active = index
+		self.see(index)
+		self.refresh()
+		self.event_generate('<<ListboxSelect>>')
+
+	def _move_selection(self, delta):
+		current = self._selected if self._selected is not None else self._active
+		self.jump_to(current + delta)
+		return 'break'
+
+	# ----- scrolling -----
+	def _visible_rows(self):
+		h = self._canvas.winfo_height()
+		if h <= 1:
+			h = self._height_rows * self._row_h
+		return max(1, h // self._row_h)
+
+	def _clamp_top(self):
+		max_top = max(0, len(self._model) - self._visible_rows())
+		self._top = max(0, min(self._top, max_top))
+
+	def see(self, index):
+		i = self._index(index)
+		rows = self._visible_rows()
+		if i < self._top:
+			self._top = i
+		elif i >= self._top + rows:
+			self._top = i - rows + 1
+		self._clamp_top()
+		self.refresh()
+
+	def nearest(self, y):
+		return min(len(self._model) - 1, self._top + max(0, int(y)) // self._row_h)
+
+	def yview(self, *args):
+		n = len(self._model)
+		if not args:
+			if not n:
+				return (0.0, 1.0)
+			return (self._top / n, min(1.0, (self._top + self._visible_rows()) / n))
+		if args[0] == 'moveto':
+			self._top = int(float(args[1]) * n)
+		elif args[0] == 'scroll':
+			amount = int(args[1])
+			if args[2] == 'pages':
+				amount *= self._visible_rows()
+			self._top += amount
+		self._clamp_top()
+		self.refresh()
+
+	def _scroll_rows(self, rows):
+		self._top += rows
+		self._clamp_top()
+		self.refresh()
+
+	def _on_wheel(self, event):
+		# Windows reports multiples of 120, macOS small deltas
+		step = -1 if event.delta > 0 else 1
+		self._scroll_rows(step * 3)
+
+	def _on_click(self, event):
+		self._canvas.focus_set()
+		if len(self._model):
+			self.jump_to(self.nearest(event.y))
+
+	# ----- drawing -----
+	def _apply_size(self):
+		char_w = self._font.measure('0')
+		self._canvas.config(width=self._width_chars * char_w + 4, height=self._height_rows * self._row_h)
+
+	def _resize_pool(self):
+		c = self._canvas
+		needed = self._visible_rows() + 1
+		while len(self._slots) < needed:
+			rect = c.create_rectangle(0, 0, 0, 0, width=0, state='hidden')
+			text = c.create_text(2, 0, anchor='nw', font=self._font)
+			self._slots.append((rect, text))
+		while len(self._slots) > needed:
+			rect, text = self._slots.pop()
+			c.delete(rect)
+			c.delete(text)
+		self._clamp_top()
+		self.refresh()
+
+	def _redraw(self):
+		self._redraw_pending = False
+		c = self._canvas
+		n = len(self._model)
+		width = c.winfo_width()
+		row_h = self._row_h
+		for k, (rect, text) in enumerate(self._slots):
+			i = self._top + k
+			if i >= n:
+				c.itemconfigure(rect, state='hidden')
+				c.itemconfigure(text, state='hidden')
+				continue
+			y = k * row_h
+			selected = i == self._selected
+			c.coords(text, 2, y + 1)
+			c.itemconfigure(text, text=self._label(self._model[i]), state='normal',
+				fill=self._select_fg if selected else self._fg)
+			if selected:
+				c.coords(rect, 0, y, width, y + row_h)
+				c.itemconfigure(rect, state='normal', fill=self._select_bg)
+			else:
+				c.itemconfigure(rect, state='hidden')
+		if n:
+			self._scrollbar.set(self._top / n, min(1.0, (self._top + self._visible_rows()) / n))
+		else:
+			self._scrollbar.set(0.0, 1.0)
+
+	# ----- options -----
+	def configure(self, cnf=None, **kw):
+		if cnf:
+			kw.update(cnf)
+		view_opts = {k: kw.pop(k) for k in list(kw) if k in self._VIEW_OPTIONS}
+		if view_opts:
+			self._configure_view(view_opts)
+		if kw:
+			return Frame.configure(self, **kw)
+
+	config = configure
+
+	def _configure_view(self, opts):
+		if 'bg' in opts or 'background' in opts:
+			self._bg = opts.get('bg', opts.get('background'))
+			self._canvas.config(bg=self._bg)
+		if 'fg' in opts or 'foreground' in opts:
+			self._fg = opts.get('fg', opts.get('foreground'))
+		if 'selectbackground' in opts:
+			self._select_bg = opts['selectbackground']
+		if 'selectforeground' in opts:
+			self._select_fg = opts['selectforeground']
+		if 'font' in opts:
+			self._font = tkfont.Font(root=self, font=opts['font'])
+			self._row_h = self._font.metrics('linespace') + 2
+			for _, text in self._slots:
+				self._canvas.itemconfigure(text, font=self._font)
+		if 'width' in opts:
+			self._width_chars = int(opts['width'])
+		if 'height' in opts:
+			self._height_rows = int(opts['height'])
+		if {'width', 'height', 'font'} & opts.keys():
+			self._apply_size()
+		self.refresh()
@@ -0,0 +1,341 @@
+"""Play order for the engine: linear or shuffled, with repeat modes and history,
+and the "up next" play queue.
+
+``PlayOrder`` answers "which track comes after (or before) this one" for a
+``playlist.Playlist``. In linear order that is the neighbouring index. In
+shuffle order it is a link in a pre-shuffled permutation, kept as ``next`` and
+``prev`` dicts keyed by track id, so both lookups are O(1) however long the
+playlist is. The permutation follows the playlist's change notifications
+without being rebuilt:
+
+- inserted tracks are linked in after a random track among the current one
+  and those not yet played this cycle, so they are heard before the order
+  comes round again
+- deleted tracks are unlinked
+- moves don't change a shuffled order; clear empties it
+
+Tracks not yet played are kept in a list with a slot per id, so picking a
+random one and crossing one off are O(1) too.
+
+Repeat modes are ``REPEAT_OFF``, ``REPEAT_ALL`` (wrap from the last track to
+the first) and ``REPEAT_ONE`` (the engine's auto-advance replays the current
+track; Next and Back still move on). ``started`` records every track the
+engine starts in a bounded history, which Back follows in shuffle order.
+
+``PlayQueue`` holds tracks picked to play next, ahead of the play order. It
+is a deque of track ids, so adding at either end and taking the head are
+O(1), and it never touches the playlist or its view.
+"""
+import random
+from collections import deque
+
+REPEAT_OFF = 'off'
+REPEAT_ALL = 'all'
+REPEAT_ONE = 'one'
+REPEAT_MODES = (REPEAT_OFF, REPEAT_ALL, REPEAT_ONE)
+
+HISTORY_SIZE = 1000
+
+
+class PlayOrder:
+	"""Next/previous track selection over a Playlist (see the module docstring)."""
+	def __init__(self, playlist, shuffle=False, repeat=REPEAT_OFF, rng=None):
+		self.playlist = playlist
+		self.shuffle = False
+		self.repeat = REPEAT_OFF
+		self.history = deque(maxlen=HISTORY_SIZE)  # ids of tracks played before the current one
+		self.current = None  # id of the track playing now
+		self._rng = rng or random.Random()
+		self._next = {}
+		self._prev = {}
+		self._head = None
+		self._tail = None
+		self._pending = []  # ids not yet played in this pass over the shuffled order
+		self._slot = {}  # id -> index in _pending
+		playlist.subscribe(self._on_playlist_changed)
+		self.set_repeat(repeat)
+		self.set_shuffle(shuffle)
+
+	# ----- settings -----
+	def set_shuffle(self, enabled):
+		"""Turn shuffle on (a fresh permutation starting at the current track) or off."""
+		self.shuffle = bool(enabled)
+		if self.shuffle:
+			self.reshuffle()
+		else:
+			self._reset()
+
+	def set_repeat(self, mode):
+		if mode not in REPEAT_MODES:
+			raise ValueError(f'unknown repeat mode {mode!r}')
+		self.repeat = mode
+
+	def reshuffle(self):
+		"""Draw a new permutation; the current track, if any, goes first. O(n)."""
+		self._reset()
+		ids = [track.id for track in self.playlist]
+		self._rng.shuffle(ids)
+		if self.current in self.playlist:
+			ids.remove(self.current)
+			ids.insert(0, self.current)
+		for i, track_id in enumerate(ids):
+			self._prev[track_id] = ids[i - 1] if i else None
+			self._next[track_id] = ids[i + 1] if i + 1 < len(ids) else None
+		if ids:
+			self._head, self._tail = ids[0], ids[-1]
+		self._refill(ids)
+
+	def _reset(self):
+		self._next.clear()
+		self._prev.clear()
+		self._head = self._tail = None
+		self._pending = []
+		self._slot = {}
+
+	# ----- queries -----
+	def after(self, track, auto=False):
+		"""Track to play after ``track``, or None at the end.
+
+		``auto`` is set for the engine's own advance at the end of a track,
+		which repeats the track itself in REPEAT_ONE.
+		"""
+		if track is None or track.id not in self.playlist:
+			return None
+		if auto and self.repeat == REPEAT_ONE:
+			return track
+		if self.shuffle:
+			nxt = self._next.get(track.id)
+			if nxt is None and self.repeat != REPEAT_OFF and track.id != self._head:
+				nxt = self._head
+			return self.playlist.get(nxt) if nxt is not None else None
+		index = self.playlist.index_of(track) + 1
+		if index < len(self.playlist):
+			return self.playlist[index]
+		if self.repeat != REPEAT_OFF and len(self.playlist) > 1:
+			return self.playlist[0]
+		return None
+
+	def before(self, track):
+		"""Track Back goes to from ``track``, or None at the start.
+
+		In shuffle order that is the last track played before it that is still
+		loaded, then the permutation's predecessor once the history runs out.
+		"""
+		if track is None or track.id not in self.playlist:
+			return None
+		if self.shuffle:
+			for track_id in reversed(self.history):
+				if track_id != track.id and track_id in self.playlist:
+					return self.playlist.get(track_id)
+			prev = self._prev.get(track.id)
+			if prev is None and self.repeat != REPEAT_OFF and track.id != self._tail:
+				prev = self._tail
+			return self.playlist.get(prev) if prev is not None else None
+		index = self.playlist.index_of(track) - 1
+		if index >= 0:
+			return self.playlist[index]
+		if self.repeat != REPEAT_OFF and len(self.playlist) > 1:
+			return self.playlist[-1]
+		return None
+
+	# ----- playback -----
+	def started(self, track):
+		"""The engine started ``track``: record history and cross it off this pass.
+
+		Starting the track most recently played (as Back does) steps back
+		through the history instead of adding to it.
+		"""
+		if track.id == self.current:
+			return
+		# Drop entries for tracks removed since they played
+		while self.history and self.history[-1] not in self.playlist:
+			self.history.pop()
+		if self.history and self.history[-1] == track.id:
+			self.history.pop()
+		elif self.current is not None and self.current in self.playlist:
+			self.history.append(self.current)
+		self.current = track.id
+		if self.shuffle:
+			self._take(track.id)
+			if not self._pending:
+				# A pass over the order is complete; with repeat, the next one starts
+				self._refill(track_id for track_id in self._next_ids() if track_id != track.id)
+
+	def _next_ids(self):
+		track_id = self._head
+		while track_id is not None:
+			yield track_id
+			track_id = self._next.get(track_id)
+
+	# ----- pending pool -----
+	def _refill(self, ids):
+		self._pending = list(ids)
+		self._slot = {track_id: i for i, track_id in enumerate(self._pending)}
+
+	def _add_pending(self, track_id):
+		self._slot[track_id] = len(self._pending)
+		self._pending.append(track_id)
+
+	def _take(self, track_id):
+		"""Remove ``track_id`` from the pending pool (swap with the last entry)."""
+		i = self._slot.pop(track_id, None)
+		if i is None:
+			return
+		last = self._pending.pop()
+		if last != track_id:
+			self._pending[i] = last
+			self._slot[last] = i
+
+	# ----- permutation edits -----
+	# Every linked id has an entry in both _next and _prev (None at the ends)
+	def _link_after(self, anchor, track_id):
+		"""Link ``track_id`` in after ``anchor`` (at the head if anchor is None)."""
+		nxt = self._head if anchor is None else self._next[anchor]
+		self._prev[track_id] = anchor
+		self._next[track_id] = nxt
+		if anchor is None:
+			self._head = track_id
+		else:
+			self._next[anchor] = track_id
+		if nxt is None:
+			self._tail = track_id
+		else:
+			self._prev[nxt] = track_id
+
+	def _unlink(self, track_id):
+		if track_id not in self._next:
+			return
+		prev = self._prev.pop(track_id)
+		nxt = self._next.pop(track_id)
+		if prev is None:
+			self._head = nxt
+		else:
+			self._next[prev] = nxt
+		if nxt is None:
+			self._tail = prev
+		else:
+			self._prev[nxt] = prev
+		self._take(track_id)
+
+	def _insert(self, track_id):
+		# A random slot among those still to come: after the current track or
+		# after any track not yet played in this pass
+		choices = len(self._pending) + (1 if self.current in self._next else 0)
+		if self._head is None:
+			anchor = None
+		elif choices == 0:
+			anchor = self._tail
+		else:
+			pick = self._rng.randrange(choices)
+			anchor = self._pending[pick] if pick < len(self._pending) else self.current
+		self._link_after(anchor, track_id)
+		self._add_pending(track_id)
+
+	def _on_playlist_changed(self, kind, *args):
+		if kind == 'clear':
+			self._reset()
+			self.history.clear()
+			self.current = None
+			return
+		if not self.shuffle:
+			return
+		if kind == 'insert':
+			for track in args[1]:
+				self._insert(track.id)
+		elif kind == 'delete':
+			for track in args[1]:
+				self._unlink(track.id)
+
+
+class PlayQueue:
+	"""Tracks to play before the play order resumes, as a deque of track ids.
+
+	Tracks deleted from the playlist drop out of the queue. Listeners
+	registered with ``subscribe`` get the same notifications as a Playlist's,
+	with indexes into the queue:
+
+	- ``('insert', index, tracks)``
+	- ``('delete', index, tracks)``
+	- ``('move', src, dst)``
+	- ``('clear', count)``
+	"""
+	def __init__(self, playlist):
+		self.playlist = playlist
+		self._ids = deque()
+		self._listeners = []
+		playlist.subscribe(self._on_playlist_changed)
+
+	def subscribe(self, callback):
+		self._listeners.append(callback)
+
+	def _notify(self, kind, *args):
+		for callback in list(self._listeners):
+			callback(kind, *args)
+
+	def __len__(self):
+		return len(self._ids)
+
+	def __iter__(self):
+		for track_id in list(self._ids):
+			yield self.playlist.get(track_id)
+
+	def peek(self):
+		"""The track at the head of the queue, or None if it's empty."""
+		return self.playlist.get(self._ids[0]) if self._ids else None
+
+	def enqueue_next(self, tracks):
+		"""Put ``tracks`` (in their order) at the head of the queue."""
+		tracks = list(tracks)
+		self._ids.extendleft(track.id for track in reversed(tracks))
+		if tracks:
+			self._notify('insert', 0, tracks)
+
+	def enqueue_last(self, tracks):
+		"""Put ``tracks`` at the end of the queue."""
+		tracks = list(tracks)
+		index = len(self._ids)
+		self._ids.extend(track.id for track in tracks)
+		if tracks:
+			self._notify('insert', index, tracks)
+
+	def take(self, track):
+		"""Pop ``track`` off the head of the queue; returns False if it isn't there."""
+		if not self._ids or self._ids[0] != track.id:
+			return False
+		self._ids.popleft()
+		self._notify('delete', 0, [track])
+		return True
+
+	def remove(self, index):
+		"""Drop the entry at ``index`` and return its track."""
+		track = self.playlist.get(self._ids[index])
+		del self._ids[index]
+		self._notify('delete', index, [track])
+		return track
+
+	def move(self, src, dst):
+		"""Move the entry at ``src`` so that it ends up at ``dst``."""
+		n = len(self._ids)
+		if src == dst or not (0 <= src < n and 0 <= dst < n):
+			return
+		track_id = self._ids[src]
+		del self._ids[src]
+		self._ids.insert(dst, track_id)
+		self._notify('move', src, dst)
+
+	def clear(self):
+		count = len(self._ids)
+		self._ids.clear()
+		if count:
+			self._notify('clear', count)
+
+	def _on_playlist_changed(self, kind, *args):
+		if kind == 'clear':
+			self.clear()
+		elif kind == 'delete' and self._ids:
+			gone = {track.id: track for track in args[1]}
+			for index in range(len(self._ids) - 1, -1, -1):
+				track = gone.get(self._ids[index])
+				if track is not None:
+					del self._ids[index]
+					self._notify('delete', index, [track])
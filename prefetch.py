@@ -0,0 +1,189 @@
+"""Read-ahead of upcoming tracks for slow or network-mounted libraries.
+
+Loading a track reads it from wherever the playlist points. On NFS/SMB or a
+spinning disk that first read can stall the switch to the next track.
+``Prefetcher`` reads the next few tracks in play order on a background
+thread before they are needed:
+
+- into an AudioCache, when one is given (``pygame.mixer.music`` then loads
+  them from memory; see audiocache.py)
+- otherwise into the OS page cache, so the later open and the MixingStream's
+  decode worker find the data there
+
+Reads go in large sequential chunks, with ``posix_fadvise(SEQUENTIAL)`` where
+the platform has it, and can be held to a bandwidth limit so a read-ahead
+doesn't crowd out the track being streamed. Every track the engine starts
+with play_index (play, next, previous) is reported through ``opened``; one
+that finds its file already read counts as a hit, and the time that read took is added to ``hidden_seconds``, the I/O
+kept off the playback path.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TRACKS = 3
+CHUNK_SIZE = 1 << 20
+# Files read ahead and not yet opened, remembered for the hit/hidden metric
+MAX_WARM = 64
+
+
+class Prefetcher:
+	"""Background read-ahead of the next ``tracks`` tracks at up to ``rate``
+	bytes per second (None for no limit)."""
+	def __init__(self, tracks=DEFAULT_TRACKS, rate=None, chunk_size=CHUNK_SIZE):
+		self.tracks = tracks
+		self.rate = rate
+		self.chunk_size = chunk_size
+		self.files = 0  # files read ahead
+		self.bytes = 0
+		self.read_seconds = 0.0  # time spent in reads (not in bandwidth-limit waits)
+		self.hits = 0
+		self.misses = 0
+		self.hidden_seconds = 0.0
+		self._wanted = []  # (path, cache) to have read, in order
+		self._warm = OrderedDict()  # (path, size, mtime) -> seconds its read took
+		self._lock = threading.Lock()
+		self._wake = threading.Condition(self._lock)
+		self._closed = False
+		self._thread = None
+
+	def prefetch(self, paths, cache=None):
+		"""Read ``paths`` ahead, in order, replacing any earlier list; files no
+		longer on it are dropped even part-read. ``cache`` is the AudioCache to
+		keep their bytes in, or None for the page cache only."""
+		with self._lock:
+			self._wanted = [(path, cache) for path in paths]
+			if self._thread is None and self._wanted and not self._closed:
+				self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+				self._thread.start()
+			self._wake.notify()
+
+	def opened(self, path):
+		"""The engine is starting ``path``: count a hit (and the time it hid) or a miss."""
+		key = _key(path)
+		with self._lock:
+			seconds = self._warm.get(key) if key is not None else None
+			if seconds is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.hidden_seconds += seconds
+				# Still warm, but its read is counted once
+				self._warm[key] = 0.0
+
+	def close(self):
+		with self._lock:
+			self._closed = True
+			self._wanted = []
+			self._wake.notify()
+
+	def stats(self):
+		"""Counters: files and bytes read ahead, read time, hits, misses and time hidden."""
+		with self._lock:
+			return {
+				'files': self.files,
+				'bytes': self.bytes,
+				'read_seconds': self.read_seconds,
+				'hits': self.hits,
+				'misses': self.misses,
+				'hidden_seconds': self.hidden_seconds,
+				'pending': len(self._wanted),
+			}
+
+	# ----- worker thread -----
+	def _next_job(self):
+		"""First wanted file not read yet (waits for one), or None once closed."""
+		while True:
+			with self._lock:
+				while not self._wanted and not self._closed:
+					self._wake.wait()
+				if self._closed:
+					return None
+				wanted = list(self._wanted)
+			# stat() can be slow on a network mount: not under the lock
+			for path, cache in wanted:
+				key = _key(path)
+				if key is None or (cache is not None and ('raw',) + key in cache):
+					continue
+				with self._lock:
+					if key in self._warm:
+						continue
+				return path, cache, key
+			with self._lock:
+				if self._wanted == wanted:
+					# All read; wait for the next list
+					self._wanted = []
+
+	def _still_wanted(self, path):
+		return any(wanted == path for wanted, _cache in self._wanted)
+
+	def _run(self):
+		while True:
+			job = self._next_job()
+			if job is None:
+				return
+			path, cache, key = job
+			try:
+				seconds, data = self._read(path, keep=cache is not None and key[2] <= cache.max_item_bytes)
+			except OSError as e:
+				print('Prefetch failed:', e)
+				seconds, data = None, None
+			with self._lock:
+				if seconds is None:
+					# Unreadable or no longer wanted: don't try it again for this list
+					self._wanted = [wanted for wanted in self._wanted if wanted[0] != path]
+					continue
+				self._warm[key] = seconds
+				while len(self._warm) > MAX_WARM:
+					self._warm.popitem(last=False)
+			if data is not None:
+				cache.put(('raw',) + key, data, len(data))
+
+	def _read(self, path, keep):
+		"""Read ``path`` through; returns (seconds spent reading, bytes if ``keep``),
+		or (None, None) if it stopped being wanted part-way."""
+		chunks = [] if keep else None
+		buf = bytearray(self.chunk_size)
+		spent = 0.0
+		done = 0
+		t0 = time.monotonic()
+		with open(path, 'rb', buffering=0) as f:
+			if hasattr(os, 'posix_fadvise'):
+				os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+			while True:
+				start = time.perf_counter()
+				if keep:
+					chunk = f.read(self.chunk_size)
+					n = len(chunk)
+				else:
+					n = f.readinto(buf)
+				elapsed = time.perf_counter() - start
+				spent += elapsed
+				if not n:
+					break
+				done += n
+				if keep:
+					chunks.append(chunk)
+				with self._lock:
+					self.bytes += n
+					self.read_seconds += elapsed
+					if self._closed or not self._still_wanted(path):
+						return None, None
+					if self.rate:
+						# Hold the average to the limit; prefetch() or close() cut the wait short
+						ahead = done / self.rate - (time.monotonic() - t0)
+						if ahead > 0:
+							self._wake.wait(ahead)
+		with self._lock:
+			self.files += 1
+		return spent, (b''.join(chunks) if keep else None)
+
+
+def _key(path):
+	"""(path, size, mtime), or None; AudioCache's keys are this with the kind in front."""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (os.fspath(path), st.st_size, st.st_mtime_ns)
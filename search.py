@@ -0,0 +1,387 @@
+"""Incremental search index over the playlist.
+
+``SearchIndex`` subscribes to a ``playlist.Playlist`` and keeps a word index
+over each track's display name, file path and tags (title/artist from the
+metadata service), updated as tracks are inserted, deleted or cleared:
+
+- postings: word -> set of Tracks with it in their file name or tags
+- folder postings: word -> set of folders with it in their path, and
+  folder -> set of Tracks (folder words are shared by a whole album, so they
+  are indexed once per folder rather than once per track)
+- prefixes: first one and two letters of each word -> words
+- trigrams: every three-letter run of each word -> words
+
+Query terms match words they are a prefix of (1-2 letters) or a substring of
+(3+ letters, looked up through the trigram sets and then checked), and every
+term must match for a track to be found. Lookups go through the vocabulary,
+which is much smaller than the playlist, so a keystroke costs a few set
+operations; matches are put in playlist order as a view reads them.
+"""
+import re
+import sys
+from itertools import chain, islice
+from operator import attrgetter
+
+_WORD = re.compile(r'\w+')
+_FOLDER = attrgetter('folder')
+# Shorter terms match word prefixes only; the substring sets would be huge
+MIN_SUBSTRING = 3
+# Candidates left over from earlier terms are checked word by word below this
+DIRECT_CHECK = 1000
+
+
+def words(text):
+	"""Lower-cased words of ``text``."""
+	return _WORD.findall(text.casefold()) if text else []
+
+
+class SearchResults:
+	"""Tracks matching a query, in playlist order, ordered as they are read.
+
+	A view only reads the rows it shows, so results are pulled from the
+	playlist a screenful at a time instead of all on every keystroke. They
+	stay valid until the playlist next changes; search again after that.
+	"""
+	FILL = 256
+
+	def __init__(self, tracks=(), count=None):
+		self._source = iter(tracks)
+		self._items = []
+		self._count = count
+		if count is None:
+			self._fill_all()
+
+	def __len__(self):
+		return self._count
+
+	def _fill(self, n):
+		if n > len(self._items) and self._source is not None:
+			self._items.extend(islice(self._source, max(n - len(self._items), self.FILL)))
+			if len(self._items) < n or len(self._items) >= self._count:
+				self._source = None
+				self._count = len(self._items)
+
+	def _fill_all(self):
+		if self._source is not None:
+			self._items.extend(self._source)
+			self._source = None
+			self._count = len(self._items)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			self._fill_all()
+			return self._items[index]
+		if index < 0:
+			index += self._count
+		self._fill(index + 1)
+		return self._items[index]
+
+	def __iter__(self):
+		self._fill_all()
+		return iter(self._items)
+
+	def position(self, track):
+		"""Index of ``track`` in the results, or None; reads only as far as it."""
+		start = 0
+		while True:
+			try:
+				return self._items.index(track, start)
+			except ValueError:
+				if self._source is None:
+					return None
+				start = len(self._items)
+				self._fill(start + self.FILL)
+
+
+class SearchIndex:
+	"""Word index over a Playlist, kept in step with its change notifications.
+
+	``tags_for(path)``, if given, returns tag strings (e.g. ID3 title and
+	artist) for a newly added track; tags that arrive later are added with
+	``set_tags``.
+	"""
+	def __init__(self, playlist, tags_for=None, cache_size=32):
+		self.playlist = playlist
+		self.tags_for = tags_for
+		self.cache_size = cache_size
+		self._postings = {}  # word -> set of Tracks (file name and tag words)
+		self._folder_postings = {}  # word -> set of folders
+		self._folder_tracks = {}  # folder -> set of Tracks
+		self._folder_words = {}  # folder -> frozenset of its words
+		self._prefixes = {}  # 1-2 letter prefix -> set of words
+		self._trigrams = {}  # trigram -> set of words
+		self._words = {}  # Track -> tuple of its own (non-folder) words
+		self._by_path = {}  # path -> tuple of Tracks
+		self._term_cache = {}  # term -> _Term, dropped on any change
+		if len(playlist):
+			self._add(list(playlist))
+		playlist.subscribe(self._on_playlist_changed)
+
+	# ----- maintenance -----
+	def _on_playlist_changed(self, kind, *args):
+		if kind == 'insert':
+			self._add(args[1])
+		elif kind == 'delete':
+			self._remove(args[1])
+		elif kind == 'clear':
+			self.clear()
+		# 'move' changes order only; results are ordered when a query runs
+
+	def _own_words(self, track, tags):
+		found = set(words(track.filename))
+		for text in tags or ():
+			found.update(words(text))
+		return tuple(found - self._folder_words[track.folder])
+
+	def _add(self, tracks):
+		self._term_cache.clear()
+		for track in tracks:
+			folder = track.folder
+			members = self._folder_tracks.get(folder)
+			if members is None:
+				members = self._folder_tracks[folder] = set()
+				self._add_folder(folder)
+			members.add(track)
+			path = track.path
+			self._by_path[path] = self._by_path.get(path, ()) + (track,)
+			tags = self.tags_for(path) if self.tags_for is not None else None
+			self._index(track, self._own_words(track, tags))
+
+	def _add_folder(self, folder):
+		found = self._folder_words[folder] = frozenset(words(folder))
+		for word in found:
+			folders = self._folder_postings.get(word)
+			if folders is None:
+				folders = self._folder_postings[word] = set()
+				if word not in self._postings:
+					self._add_word(word)
+			folders.add(folder)
+
+	def _index(self, track, found):
+		self._words[track] = found
+		postings = self._postings
+		for word in found:
+			posting = postings.get(word)
+			if posting is None:
+				posting = postings[word] = set()
+				if word not in self._folder_postings:
+					self._add_word(word)
+			posting.add(track)
+
+	def _unindex(self, track):
+		postings = self._postings
+		for word in self._words.pop(track, ()):
+			posting = postings.get(word)
+			if posting is None:
+				continue
+			posting.discard(track)
+			if not posting:
+				del postings[word]
+				if word not in self._folder_postings:
+					self._drop_word(word)
+
+	def _add_word(self, word):
+		word = sys.intern(word)
+		for prefix in {word[:1], word[:2]}:
+			self._prefixes.setdefault(prefix, set()).add(word)
+		for i in range(len(word) - 2):
+			self._trigrams.setdefault(word[i:i + 3], set()).add(word)
+
+	def _drop_word(self, word):
+		for table, keys in ((self._prefixes, {word[:1], word[:2]}),
+				(self._trigrams, {word[i:i + 3] for i in range(len(word) - 2)})):
+			for key in keys:
+				entries = table.get(key)
+				if entries is not None:
+					entries.discard(word)
+					if not entries:
+						del table[key]
+
+	def _remove(self, tracks):
+		self._term_cache.clear()
+		for track in tracks:
+			self._unindex(track)
+			path = track.path
+			same = tuple(t for t in self._by_path.get(path, ()) if t is not track)
+			if same:
+				self._by_path[path] = same
+			else:
+				self._by_path.pop(path, None)
+			folder = track.folder
+			members = self._folder_tracks.get(folder)
+			if members is None:
+				continue
+			members.discard(track)
+			if not members:
+				# Last track of the folder: forget the folder's words
+				del self._folder_tracks[folder]
+				for word in self._folder_words.pop(folder, ()):
+					folders = self._folder_postings.get(word)
+					if folders is None:
+						continue
+					folders.discard(folder)
+					if not folders:
+						del self._folder_postings[word]
+						if word not in self._postings:
+							self._drop_word(word)
+
+	def set_tags(self, path, *texts):
+		"""Index tag text (title, artist, ...) for every loaded track with ``path``;
+		returns True if that changed what any of them is found by."""
+		changed = False
+		for track in self._by_path.get(path, ()):
+			found = self._own_words(track, texts)
+			if set(found) == set(self._words.get(track, ())):
+				continue
+			self._term_cache.clear()
+			self._unindex(track)
+			self._index(track, found)
+			changed = True
+		return changed
+
+	def clear(self):
+		self._postings.clear()
+		self._folder_postings.clear()
+		self._folder_tracks.clear()
+		self._folder_words.clear()
+		self._prefixes.clear()
+		self._trigrams.clear()
+		self._words.clear()
+		self._by_path.clear()
+		self._term_cache.clear()
+
+	# ----- queries -----
+	def _matching_words(self, term):
+		if len(term) < MIN_SUBSTRING:
+			return self._prefixes.get(term, ())
+		grams = [self._trigrams.get(term[i:i + 3]) for i in range(len(term) - 2)]
+		if not all(grams):
+			return ()
+		grams.sort(key=len)
+		candidates = grams[0].intersection(*grams[1:]) if len(grams) > 1 else grams[0]
+		if len(term) == MIN_SUBSTRING:
+			return candidates
+		return [word for word in candidates if term in word]
+
+	def _term(self, term):
+		"""_Term for one query term, from the cache when possible."""
+		cached = self._term_cache.get(term)
+		if cached is not None:
+			return cached
+		sets = []
+		folders = set()
+		for word in self._matching_words(term):
+			posting = self._postings.get(word)
+			if posting is not None:
+				sets.append(posting)
+			in_folders = self._folder_postings.get(word)
+			if in_folders is not None:
+				folders.update(in_folders)
+		found = _Term()
+		if folders and len(folders) == len(self._folder_tracks):
+			# e.g. the library's root folder: every track matches
+			found.everything = True
+		elif len(sets) > 1:
+			sets.sort(key=len, reverse=True)
+			found.tracks = sets[0].union(*sets[1:])
+		elif sets:
+			# A copy: set_tags() edits the postings while results are being read
+			found.tracks = frozenset(sets[0])
+		found.folders = folders
+		if len(self._term_cache) >= self.cache_size:
+			self._term_cache.pop(next(iter(self._term_cache)))
+		self._term_cache[term] = found
+		return found
+
+	def _size(self, term):
+		"""Number of tracks matching a _Term, counted without building the set."""
+		if term.size is None:
+			folders = term.folders
+			folder_tracks = self._folder_tracks
+			if folders:
+				in_folders = sum(map(folders.__contains__, map(_FOLDER, term.tracks)))
+				term.size = sum(len(folder_tracks[folder]) for folder in folders) + len(term.tracks) - in_folders
+			else:
+				term.size = len(term.tracks)
+		return term.size
+
+	def _expand(self, term):
+		"""Set of tracks matching a _Term."""
+		if term.expanded is None:
+			if term.folders:
+				term.expanded = set(term.tracks).union(*(self._folder_tracks[folder] for folder in term.folders))
+			else:
+				term.expanded = term.tracks
+		return term.expanded
+
+	def _has(self, track, term):
+		"""Whether ``track`` has a word matching ``term`` (checked directly)."""
+		candidates = chain(self._words.get(track, ()), self._folder_words.get(track.folder, ()))
+		if len(term) < MIN_SUBSTRING:
+			return any(word.startswith(term) for word in candidates)
+		return any(term in word for word in candidates)
+
+	def search(self, query):
+		"""SearchResults for ``query`` in playlist order, or None for an empty query.
+
+		The longest term is usually the most selective: its matches are built
+		and then narrowed by each other term. Once only a few candidates are
+		left, their words are checked directly rather than looking the term
+		up. A query with one broad term isn't built at all: its matches are
+		counted and then picked out of the playlist as the view reads them.
+		"""
+		terms = sorted(set(words(query)), key=len, reverse=True)
+		if not terms:
+			return None
+		playlist = self.playlist
+		total = len(self._words)
+		matches = None
+		for text in terms:
+			if matches is not None and len(matches) <= DIRECT_CHECK:
+				matches = [track for track in matches if self._has(track, text)]
+			else:
+				term = self._term(text)
+				if term.everything:
+					# Found in every track: doesn't narrow anything down
+					continue
+				if matches is None:
+					if len(terms) == 1:
+						return self._single(term)
+					matches = self._expand(term)
+				else:
+					tracks, folders = term.tracks, term.folders
+					matches = [track for track in matches if track in tracks or track.folder in folders]
+			if not matches:
+				return SearchResults()
+		if matches is None:
+			return SearchResults(playlist, len(playlist))
+		if len(matches) * 64 < total:
+			# Few matches: sorting by position beats walking the whole playlist
+			return SearchResults(sorted(matches, key=playlist.index_of))
+		if not isinstance(matches, (set, frozenset)):
+			matches = set(matches)
+		return SearchResults(filter(matches.__contains__, playlist), len(matches))
+
+	def _single(self, term):
+		playlist = self.playlist
+		size = self._size(term)
+		if not size:
+			return SearchResults()
+		if size * 64 < len(playlist):
+			return SearchResults(sorted(self._expand(term), key=playlist.index_of))
+		tracks, folders = term.tracks, term.folders
+		return SearchResults((track for track in playlist if track in tracks or track.folder in folders), size)
+
+
+class _Term:
+	"""Tracks matching one query term, in two parts: ``tracks`` with a matching
+	word of their own (file name, tags) and ``folders`` with one in their path.
+	"""
+	__slots__ = ('tracks', 'folders', 'everything', 'size', 'expanded')
+
+	def __init__(self):
+		self.tracks = frozenset()
+		self.folders = frozenset()
+		self.everything = False
+		self.size = None
+		self.expanded = None
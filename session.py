@@ -0,0 +1,211 @@
+"""Session persistence: the playlist and player state, saved as they change.
+
+``SessionStore`` keeps an append-only binary journal. The first record is a
+snapshot of the whole playlist. After that, every playlist change
+notification appends a small record: an insert carries only the new tracks,
+and a delete or move carries two integers. So saving costs as much as the
+change, not the playlist, and happens on every mutation. Player state
+(current index, position, volume, skin) is a small JSON record, and the last
+one wins; the player saves it as tracks start and every few seconds while
+playing, so a crash loses little of the position. The journal is rewritten
+as a fresh snapshot once it has accumulated many records of either kind, and
+when the player closes.
+
+Records are ``kind (1 byte), length (u32), crc32 (u32), payload``. A torn or
+corrupt record at the end (a crash mid-write) ends the replay, and the next
+snapshot drops it. Paths are stored as a folder table and per-track folder
+numbers, so an album's folder is written once, not once per track.
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from itertools import chain
+
+MAGIC = b'MP3SESS1'
+_HEADER = struct.Struct('<cII')
+_INSERT = struct.Struct('<III')  # index, folder count, track count
+_PAIR = struct.Struct('<II')
+
+SNAPSHOT = b'P'  # whole playlist, replaces everything before it
+INSERT = b'I'
+DELETE = b'D'
+MOVE = b'M'
+CLEAR = b'C'
+STATE = b'S'
+
+# Rewrite the journal as a snapshot after this many playlist and state records
+COMPACT_RECORDS = 2000
+
+
+def _encode(text):
+	return text.encode('utf-8', 'surrogateescape')
+
+
+def encode_tracks(index, tracks):
+	"""Payload for ``tracks`` (objects with ``folder``/``filename``) inserted at ``index``."""
+	folders = {}
+	numbers = array('I', [folders.setdefault(track.folder, len(folders)) for track in tracks])
+	strings = '\0'.join(chain(folders, (track.filename for track in tracks)))
+	return _INSERT.pack(index, len(folders), len(numbers)) + numbers.tobytes() + _encode(strings)
+
+
+def decode_tracks(payload):
+	"""Return (index, paths) from an insert or snapshot payload."""
+	index, n_folders, n_tracks = _INSERT.unpack_from(payload)
+	start = _INSERT.size
+	numbers = array('I')
+	numbers.frombytes(payload[start:start + 4 * n_tracks])
+	text = str(payload[start + 4 * n_tracks:], 'utf-8', 'surrogateescape')
+	strings = text.split('\0') if text else []
+	# Folder with its trailing separator ('' for bare file names)
+	prefixes = [os.path.join(folder, '') for folder in strings[:n_folders]]
+	names = strings[n_folders:]
+	if len(names) != n_tracks or len(numbers) != n_tracks:
+		raise ValueError('track count mismatch')
+	return index, [prefixes[n] + name for n, name in zip(numbers, names)]
+
+
+class SessionStore:
+	"""Journal of a Playlist and player state in one file.
+
+	Call ``load()`` before filling the playlist, then ``attach(playlist)`` to
+	journal its changes from then on. ``save_state`` records the state dict,
+	and ``close`` compacts the journal.
+	"""
+	def __init__(self, path, compact_records=COMPACT_RECORDS):
+		self.path = os.fspath(path)
+		self.compact_records = compact_records
+		self.playlist = None
+		self.records = 0  # records since the last snapshot
+		self.state = None  # last state saved, carried into snapshots
+		self._file = None
+
+	# ----- reading -----
+	def load(self):
+		"""Replay the journal; returns (paths, state). Missing or unreadable files give ([], {})."""
+		paths = []
+		state = {}
+		try:
+			with open(self.path, 'rb') as f:
+				data = f.read()
+		except OSError:
+			return paths, state
+		if not data.startswith(MAGIC):
+			return paths, state
+		pos = len(MAGIC)
+		records = 0
+		data = memoryview(data)
+		while pos + _HEADER.size <= len(data):
+			kind, length, crc = _HEADER.unpack_from(data, pos)
+			body = data[pos + _HEADER.size:pos + _HEADER.size + length]
+			if len(body) != length or zlib.crc32(body) != crc:
+				break
+			try:
+				if kind == SNAPSHOT:
+					paths = decode_tracks(body)[1]
+					records = 0
+				elif kind == INSERT:
+					index, added = decode_tracks(body)
+					paths[index:index] = added
+					records += 1
+				elif kind == DELETE:
+					index, count = _PAIR.unpack(body)
+					del paths[index:index + count]
+					records += 1
+				elif kind == MOVE:
+					src, dst = _PAIR.unpack(body)
+					paths.insert(dst, paths.pop(src))
+					records += 1
+				elif kind == CLEAR:
+					paths = []
+					records += 1
+				elif kind == STATE:
+					state = json.loads(bytes(body))
+					records += 1
+			except (ValueError, IndexError, struct.error):
+				break
+			pos += _HEADER.size + length
+		self.records = records
+		self.state = state or None
+		return paths, state
+
+	# ----- writing -----
+	def attach(self, playlist, state=None):
+		"""Journal ``playlist`` from now on, starting from a fresh snapshot of it."""
+		self.playlist = playlist
+		self.compact(state)
+		playlist.subscribe(self._on_playlist_changed)
+
+	def _append(self, kind, payload):
+		if self._file is None:
+			self._file = open(self.path, 'ab')
+		self._file.write(_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+		self._file.flush()
+
+	def _on_playlist_changed(self, kind, *args):
+		try:
+			if kind == 'insert':
+				self._append(INSERT, encode_tracks(args[0], args[1]))
+			elif kind == 'delete':
+				self._append(DELETE, _PAIR.pack(args[0], len(args[1])))
+			elif kind == 'move':
+				self._append(MOVE, _PAIR.pack(args[0], args[1]))
+			elif kind == 'clear':
+				self._append(CLEAR, b'')
+		except OSError as e:
+			print('Session not saved:', e)
+			return
+		self._counted()
+
+	def save_state(self, state):
+		"""Record ``state`` (a JSON-serializable dict); the latest one is restored."""
+		self.state = state
+		try:
+			self._append(STATE, json.dumps(state).encode('utf-8'))
+		except OSError as e:
+			print('Session not saved:', e)
+			return
+		self._counted()
+
+	def _counted(self):
+		"""One more record appended; compact once there are enough (only while
+		attached: before that there is no playlist to snapshot)."""
+		self.records += 1
+		if self.playlist is not None and self.records >= self.compact_records:
+			self.compact()
+
+	def compact(self, state=None):
+		"""Rewrite the journal as one snapshot of the playlist (plus ``state``)."""
+		if state is None:
+			state = self.state
+		else:
+			self.state = state
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+		tmp = self.path + '.tmp'
+		payload = encode_tracks(0, list(self.playlist) if self.playlist is not None else [])
+		try:
+			with open(tmp, 'wb') as f:
+				f.write(MAGIC)
+				f.write(_HEADER.pack(SNAPSHOT, len(payload), zlib.crc32(payload)) + payload)
+				if state is not None:
+					body = json.dumps(state).encode('utf-8')
+					f.write(_HEADER.pack(STATE, len(body), zlib.crc32(body)) + body)
+			os.replace(tmp, self.path)
+		except OSError as e:
+			print('Session not saved:', e)
+			return
+		self.records = 0
+
+	def close(self, state=None):
+		"""Compact the journal (recording ``state`` last) and stop journaling."""
+		if self.playlist is not None:
+			self.playlist.unsubscribe(self._on_playlist_changed)
+			self.compact(state)
+			self.playlist = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
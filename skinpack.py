@@ -0,0 +1,289 @@
+"""Skin validation and compiled skin bundles.
+
+``validate`` checks a parsed ``manifest.json`` against ``SCHEMA`` and reports
+every problem at once. ``compile_skin`` validates a skin directory, resolves
+its image paths (including shared ones such as ``../../images/play50.png``)
+and packs the manifest and all images into one ``skin.bundle`` file::
+
+    8 bytes   magic  b'MP3SKIN1'
+    4 bytes   header length (little-endian)
+    header    UTF-8 JSON: {"version", "manifest", "images": {rel: entry},
+              "sources": {path relative to the skin: mtime_ns}}
+    padding   to a 16-byte boundary
+    blobs     image data; each entry has offset (from the start of the file),
+              length, width, height and format
+
+``SkinBundle`` maps a bundle into memory, so ``ThemeManager`` loads a whole
+skin with one open instead of one per file. Compile from the command line::
+
+    python skinpack.py skins/my_skin [skins/other ...]
+    python skinpack.py --all
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+BUNDLE_NAME = 'skin.bundle'
+BUNDLE_VERSION = 1
+MAGIC = b'MP3SKIN1'
+_HEADER = struct.Struct('<8sI')
+_ALIGN = 16
+
+# Section -> {key: kind}; '*' matches any key. Kinds are types or names
+# checked by _check_value. Keys not listed are allowed and ignored.
+SCHEMA = {
+	'name': str,
+	'window': {
+		'width': 'size',
+		'height': 'size',
+		'use_custom_chrome': bool,
+		'transparent_color': 'color',
+		'background': 'image',
+	},
+	'colors': {'*': 'color'},
+	'fonts': {'*': 'font'},
+	'images': {'*': 'image'},
+	'metrics': {'*': 'size'},
+	'slider': {
+		'trough_color': 'color',
+		'slider_color': 'color',
+		'thumb_color': 'color',
+		'thickness': 'size',
+		'force_theme': str,
+	},
+	'controls': {
+		'use_text_buttons': bool,
+		'button_text': {'*': str},
+		'button_width': 'size',
+		'button_height': 'size',
+		'button_fg': 'color',
+		'button_bg': 'color',
+	},
+}
+
+
+class SkinError(ValueError):
+	"""A manifest or bundle is invalid; ``problems`` lists every issue found."""
+	def __init__(self, source, problems):
+		self.source = source
+		self.problems = list(problems)
+		ValueError.__init__(self, f"{source}: " + '; '.join(self.problems))
+
+
+def image_size(data):
+	"""Return (format, width, height) from a PNG or GIF header, or None."""
+	if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+		width, height = struct.unpack('>II', data[16:24])
+		return 'png', width, height
+	if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+		width, height = struct.unpack('<HH', data[6:10])
+		return 'gif', width, height
+	return None
+
+
+def _check_value(kind, value, where, problems, skin_dir):
+	if isinstance(kind, dict):
+		if not isinstance(value, dict):
+			problems.append(f'{where}: expected an object')
+			return
+		for key, item in value.items():
+			sub = kind.get(key, kind.get('*'))
+			if sub is not None:
+				_check_value(sub, item, f'{where}.{key}', problems, skin_dir)
+	elif kind == 'size':
+		if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+			problems.append(f'{where}: expected a non-negative integer, got {value!r}')
+	elif kind == 'color':
+		if not isinstance(value, str) or not value:
+			problems.append(f'{where}: expected a color string, got {value!r}')
+		elif value.startswith('#') and (len(value) - 1 not in (3, 6, 9, 12)
+				or any(c not in '0123456789abcdefABCDEF' for c in value[1:])):
+			problems.append(f'{where}: malformed hex color {value!r}')
+	elif kind == 'font':
+		if (not isinstance(value, (list, tuple)) or len(value) < 2 or not isinstance(value[0], str)
+				or isinstance(value[1], bool) or not isinstance(value[1], int)):
+			problems.append(f'{where}: expected [family, size], got {value!r}')
+	elif kind == 'image':
+		if not isinstance(value, str) or not value:
+			problems.append(f'{where}: expected a path, got {value!r}')
+		elif skin_dir is not None and not (Path(skin_dir) / value).is_file():
+			problems.append(f'{where}: image not found: {value}')
+	elif not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+		problems.append(f'{where}: expected {kind.__name__}, got {value!r}')
+
+
+def validate(manifest, skin_dir=None, source='manifest.json'):
+	"""Raise SkinError listing every schema violation in ``manifest``.
+
+	With ``skin_dir`` given, image paths must also point at existing files.
+	"""
+	if not isinstance(manifest, dict):
+		raise SkinError(source, ['top level must be a JSON object'])
+	problems = []
+	for section, kind in SCHEMA.items():
+		if section in manifest:
+			_check_value(kind, manifest[section], section, problems, skin_dir)
+	if problems:
+		raise SkinError(source, problems)
+
+
+def image_refs(manifest):
+	"""Yield every image path the manifest refers to, relative to the manifest."""
+	for rel in (manifest.get('images') or {}).values():
+		yield rel
+	window = manifest.get('window')
+	if isinstance(window, dict) and window.get('background'):
+		yield window['background']
+
+
+def compile_skin(skin_dir, out_path=None):
+	"""Validate ``skin_dir`` and write its bundle; returns the bundle path."""
+	skin_dir = Path(skin_dir)
+	manifest_file = skin_dir / 'manifest.json'
+	try:
+		with open(manifest_file, 'r', encoding='utf-8') as f:
+			manifest = json.load(f)
+	except ValueError as e:
+		raise SkinError(manifest_file, [f'invalid JSON: {e}'])
+	validate(manifest, skin_dir, source=manifest_file)
+
+	# Resolve and read each distinct image once; aliases share one blob
+	blobs = []
+	by_source = {}
+	entries = {}
+	sources = {'manifest.json': manifest_file.stat().st_mtime_ns}
+	problems = []
+	for rel in image_refs(manifest):
+		if rel in entries:
+			continue
+		path = (skin_dir / rel).resolve()
+		if path not in by_source:
+			data = path.read_bytes()
+			info = image_size(data)
+			if info is None:
+				problems.append(f'{rel}: not a PNG or GIF image')
+				continue
+			by_source[path] = (len(blobs), info)
+			blobs.append(data)
+			sources[os.path.relpath(path, skin_dir)] = path.stat().st_mtime_ns
+		index, (fmt, width, height) = by_source[path]
+		entries[rel] = {'blob': index, 'format': fmt, 'width': width, 'height': height,
+			'source': os.path.relpath(path, skin_dir)}
+	if problems:
+		raise SkinError(manifest_file, problems)
+
+	# Offsets depend on the header length, which depends on the offsets' digits;
+	# lay out with placeholders until the header stops growing
+	header = {'version': BUNDLE_VERSION, 'manifest': manifest, 'images': entries, 'sources': sources}
+	header_len = 0
+	while True:
+		start = -(-(_HEADER.size + header_len) // _ALIGN) * _ALIGN
+		offsets = []
+		pos = start
+		for data in blobs:
+			offsets.append(pos)
+			pos += -(-len(data) // _ALIGN) * _ALIGN
+		for entry in entries.values():
+			entry['offset'] = offsets[entry['blob']]
+			entry['length'] = len(blobs[entry['blob']])
+		encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+		if len(encoded) <= header_len:
+			break
+		header_len = len(encoded)
+	encoded = encoded.ljust(header_len)
+
+	out_path = Path(out_path) if out_path is not None else skin_dir / BUNDLE_NAME
+	tmp = out_path.with_name(out_path.name + '.tmp')
+	with open(tmp, 'wb') as f:
+		f.write(_HEADER.pack(MAGIC, header_len))
+		f.write(encoded)
+		for offset, data in zip(offsets, blobs):
+			f.write(b'\0' * (offset - f.tell()))
+			f.write(data)
+	os.replace(tmp, out_path)
+	return out_path
+
+
+class SkinBundle:
+	"""Read-only view of a compiled skin, memory-mapped from one file."""
+	def __init__(self, path):
+		self.path = Path(path)
+		with open(self.path, 'rb') as f:
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			magic, header_len = _HEADER.unpack_from(self._map, 0)
+			if magic != MAGIC:
+				raise SkinError(self.path, ['not a skin bundle'])
+			header = json.loads(self._map[_HEADER.size:_HEADER.size + header_len])
+			if header.get('version') != BUNDLE_VERSION:
+				raise SkinError(self.path, [f"unsupported bundle version {header.get('version')!r}"])
+		except (struct.error, ValueError) as e:
+			self._map.close()
+			if isinstance(e, SkinError):
+				raise
+			raise SkinError(self.path, [f'corrupt header: {e}'])
+		self.manifest = header['manifest']
+		self.images = header['images']
+		self.sources = header['sources']
+
+	def __contains__(self, rel):
+		return rel in self.images
+
+	def image_data(self, rel):
+		"""Encoded image bytes for a manifest-relative path, without copying the map."""
+		entry = self.images[rel]
+		return memoryview(self._map)[entry['offset']:entry['offset'] + entry['length']]
+
+	def is_stale(self):
+		"""True if the manifest or any packed image changed since compiling."""
+		for source, mtime in self.sources.items():
+			try:
+				if os.stat(self.path.parent / source).st_mtime_ns != mtime:
+					return True
+			except OSError:
+				return True
+		return False
+
+	def close(self):
+		self._map.close()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Validate skins and compile them into skin.bundle files.')
+	parser.add_argument('skins', nargs='*', help='skin directories (containing manifest.json)')
+	parser.add_argument('--all', action='store_true', help='compile every skin under ./skins')
+	parser.add_argument('--check', action='store_true', help='validate only, do not write bundles')
+	args = parser.parse_args(argv)
+
+	dirs = [Path(d) for d in args.skins]
+	if args.all:
+		dirs += sorted(p for p in (Path(__file__).parent / 'skins').iterdir() if (p / 'manifest.json').is_file())
+	if not dirs:
+		parser.error('no skins given')
+	failed = 0
+	for skin_dir in dirs:
+		try:
+			if args.check:
+				with open(skin_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+					validate(json.load(f), skin_dir, source=skin_dir / 'manifest.json')
+				print(f'{skin_dir}: ok')
+			else:
+				out = compile_skin(skin_dir)
+				print(f'{skin_dir}: wrote {out} ({out.stat().st_size:,} bytes)')
+		except SkinError as e:
+			failed += 1
+			print(f'{e.source}:', file=sys.stderr)
+			for problem in e.problems:
+				print(f'  {problem}', file=sys.stderr)
+		except (OSError, ValueError) as e:
+			failed += 1
+			print(f'{skin_dir}: {e}', file=sys.stderr)
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,599 @@
+"""Skin loading and application for the MP3 player.
+
+``ThemeManager`` reads a skin's ``manifest.json`` from ``skins/<name>/`` and
+applies colors, fonts, images, window size and optional custom chrome to the
+widgets it is given. Parsed manifests and decoded (and subsampled) images are
+kept in a ``SkinAssetCache`` so switching back to a skin reuses them. Skins
+compiled with ``skinpack.py`` are read from their memory-mapped bundle.
+``WindowDragger`` moves a window without OS chrome by dragging its body.
+"""
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from tkinter import Canvas, PhotoImage
+
+from skinpack import BUNDLE_NAME, SkinBundle, validate
+
+
+class SkinAssetCache:
+	"""Parsed manifests and decoded images shared across skin switches.
+
+	Manifests are keyed by path and images by (path, subsample factor); both are
+	revalidated against the file's mtime on every lookup, so edited files are
+	picked up while unchanged ones are reused without touching their contents.
+	Decoded images are evicted least-recently-used once their estimated pixel
+	memory (width * height * 4 bytes) exceeds ``max_bytes``.
+	"""
+	def __init__(self, root, max_bytes=32 * 1024 * 1024):
+		self.root = root
+		self.max_bytes = max_bytes
+		self.bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self._manifests = {}  # path -> (mtime_ns, data)
+		self._bundles = {}  # path -> (mtime_ns, SkinBundle)
+		self._images = OrderedDict()  # (path, subsample) -> (mtime_ns, PhotoImage, nbytes)
+
+	def manifest(self, path):
+		"""Return the parsed JSON at ``path``, re-reading it only if it changed."""
+		path = Path(path)
+		mtime = path.stat().st_mtime_ns
+		cached = self._manifests.get(path)
+		if cached is not None and cached[0] == mtime:
+			self.hits += 1
+			return cached[1]
+		self.misses += 1
+		with open(path, 'r', encoding='utf-8') as f:
+			data = json.load(f)
+		self._manifests[path] = (mtime, data)
+		return data
+
+	def bundle(self, path):
+		"""Return the SkinBundle at ``path``, or None if missing, invalid or out of date."""
+		path = Path(path)
+		try:
+			mtime = path.stat().st_mtime_ns
+		except OSError:
+			return None
+		cached = self._bundles.get(path)
+		if cached is not None and cached[0] == mtime:
+			bundle = cached[1]
+			self.hits += 1
+		else:
+			self.misses += 1
+			try:
+				bundle = SkinBundle(path)
+			except (OSError, ValueError) as e:
+				print('Ignoring skin bundle:', e)
+				return None
+			self._bundles[path] = (mtime, bundle)
+		# Sources edited after compiling win over the bundle
+		return None if bundle.is_stale() else bundle
+
+	def bundle_image(self, bundle, rel, subsample=1):
+		"""Return a PhotoImage decoded from ``bundle``'s copy of ``rel``."""
+		entry = bundle.images[rel]
+		mtime = self._bundles.get(bundle.path, (None,))[0]
+		# Keyed by blob offset so aliases of one file share an image
+		key = (bundle.path, entry['offset'], subsample)
+		cached = self._images.get(key)
+		if cached is not None and cached[0] == mtime:
+			self._images.move_to_end(key)
+			self.hits += 1
+			return cached[1]
+		self.misses += 1
+		if subsample > 1:
+			base = self.bundle_image(bundle, rel)
+			if base is None:
+				return None
+			img = base.subsample(subsample, subsample)
+		else:
+			try:
+				img = PhotoImage(master=self.root, data=bytes(bundle.image_data(rel)), format=entry['format'])
+			except Exception:
+				return None
+		self._store(key, mtime, img)
+		return img
+
+	def image(self, path, subsample=1):
+		"""Return a PhotoImage for ``path`` (optionally subsampled), or None if unreadable."""
+		path = Path(path).resolve()
+		try:
+			mtime = path.stat().st_mtime_ns
+		except OSError:
+			return None
+		key = (path, subsample)
+		cached = self._images.get(key)
+		if cached is not None and cached[0] == mtime:
+			self._images.move_to_end(key)
+			self.hits += 1
+			return cached[1]
+		self.misses += 1
+		if subsample > 1:
+			base = self.image(path)
+			if base is None:
+				return None
+			img = base.subsample(subsample, subsample)
+		else:
+			try:
+				img = PhotoImage(master=self.root, file=str(path))
+			except Exception:
+				return None
+		self._store(key, mtime, img)
+		return img
+
+	def _store(self, key, mtime, img):
+		old = self._images.pop(key, None)
+		if old is not None:
+			self.bytes -= old[2]
+		nbytes = img.width() * img.height() * 4
+		self._images[key] = (mtime, img, nbytes)
+		self.bytes += nbytes
+		# Widgets keep their own references, so evicting an image in use is safe
+		while self.bytes > self.max_bytes and len(self._images) > 1:
+			_, (_, _, size) = self._images.popitem(last=False)
+			self.bytes -= size
+
+	def clear(self):
+		self._manifests.clear()
+		self._bundles.clear()
+		self._images.clear()
+		self.bytes = 0
+
+
+class WindowDragger:
+	"""Click-and-drag window moving for skins with ``use_custom_chrome``.
+
+	Motion events only record the latest target position; the window is moved
+	at most once per ``frame_ms`` (immediately if the previous move is older
+	than that), so a fast drag costs one ``geometry()`` call per frame instead
+	of one per event. Clicks that start on a protected widget (the sliders) or
+	any of its descendants never start a drag; the check compares Tk path names
+	against a cached tuple and is memoized per widget.
+
+	``events``, ``updates`` and the latency totals (seconds from the first
+	coalesced motion event to the move that applied it) are kept for profiling.
+	"""
+	def __init__(self, root, frame_ms=16, clock=time.perf_counter):
+		self.root = root
+		self.frame_ms = frame_ms
+		self.clock = clock
+		self.enabled = False
+		self.events = 0
+		self.updates = 0
+		self.latency_total = 0.0
+		self.latency_max = 0.0
+		self._protected = ()  # Tk path names
+		self._memo = {}  # event widget path -> protected?
+		self._bindings = []
+		self._active = False
+		self._start = (0, 0)  # pointer at press, root coordinates
+		self._origin = (0, 0)  # window position at press
+		self._target = None  # position waiting to be applied
+		self._placed = None  # last position passed to geometry()
+		self._since = 0.0  # when the pending target was first recorded
+		self._last_update = float('-inf')
+		self._after_id = None
+
+	def protect(self, *widgets):
+		"""Replace the set of widgets whose clicks must not move the window."""
+		paths = tuple(str(w) for w in widgets if w is not None)
+		if paths != self._protected:
+			self._protected = paths
+			self._memo.clear()
+
+	def is_protected(self, widget):
+		path = str(widget)
+		hit = self._memo.get(path)
+		if hit is None:
+			hit = any(path == p or path.startswith(p + '.') for p in self._protected)
+			self._memo[path] = hit
+		return hit
+
+	def enable(self):
+		if self.enabled:
+			return
+		for sequence, handler in (('<Button-1>', self.on_press), ('<B1-Motion>', self.on_motion),
+				('<ButtonRelease-1>', self.on_release)):
+			self._bindings.append((sequence, self.root.bind(sequence, handler, add='+')))
+		self.enabled = True
+
+	def disable(self):
+		if not self.enabled:
+			return
+		for sequence, funcid in self._bindings:
+			try:
+				self.root.unbind(sequence, funcid)
+			except Exception:
+				pass
+		self._bindings = []
+		self._cancel_flush()
+		self._active = False
+		self._target = None
+		self.enabled = False
+
+	def on_press(self, event):
+		# Skip initiating drag if clicking on protected widgets
+		self._active = not self.is_protected(event.widget)
+		if not self._active:
+			return
+		self._cancel_flush()
+		self._target = None
+		self._start = (event.x_root, event.y_root)
+		self._origin = (self.root.winfo_x(), self.root.winfo_y())
+		self._placed = self._origin
+
+	def on_motion(self, event):
+		if not self._active:
+			return
+		self.events += 1
+		now = self.clock()
+		if self._target is None:
+			self._since = now
+		self._target = (self._origin[0] + event.x_root - self._start[0],
+			self._origin[1] + event.y_root - self._start[1])
+		if self._after_id is not None:
+			return
+		wait = self._last_update + self.frame_ms / 1000.0 - now
+		if wait <= 0:
+			self._flush()
+		else:
+			self._after_id = self.root.after(max(1, int(wait * 1000 + 0.5)), self._flush)
+
+	def on_release(self, event):
+		# Land exactly where the pointer was let go
+		if self._active:
+			self._cancel_flush()
+			self._flush()
+		self._active = False
+
+	def _cancel_flush(self):
+		if self._after_id is not None:
+			try:
+				self.root.after_cancel(self._after_id)
+			except Exception:
+				pass
+			self._after_id = None
+
+	def _flush(self):
+		self._after_id = None
+		target, self._target = self._target, None
+		if target is None or target == self._placed:
+			return
+		try:
+			self.root.geometry(f"+{int(target[0])}+{int(target[1])}")
+		except Exception:
+			return
+		now = self.clock()
+		self._placed = target
+		self._last_update = now
+		self.updates += 1
+		latency = now - self._since
+		self.latency_total += latency
+		if latency > self.latency_max:
+			self.latency_max = latency
+
+
+class ThemeManager:
+	"""Level-2 image-based skin loader and applier."""
+	def __init__(self, root, widgets, assets=None):
+		self.root = root
+		self.widgets = widgets  # dict of widget references
+		self.assets = assets if assets is not None else SkinAssetCache(root)
+		self.current_skin = None
+		self.images = {}
+		self.image_paths = {}
+		self.image_refs = {}
+		self.skin_dir = None
+		self.bundle = None  # SkinBundle the active skin was loaded from, if any
+		self.controls = {}
+		self.use_text_buttons = False
+		# Option values set by the last apply, per target, and Tk calls it took
+		self._applied = {}
+		self._base_font = None
+		self.configure_calls = 0
+		self.total_configure_calls = 0
+		# For custom chrome dragging
+		self._dragger = None
+
+	def _enable_drag(self):
+		if self._dragger is None:
+			self._dragger = WindowDragger(self.root)
+		# Do not start/move drag if the event originated from song or volume sliders
+		self._dragger.protect(self.widgets.get('song_slider'), self.widgets.get('volume_slider'))
+		self._dragger.enable()
+
+	def _disable_drag(self):
+		if self._dragger is not None:
+			self._dragger.disable()
+
+	def load_skin(self, skin_name):
+		"""Load ``skins/<skin_name>``, from its compiled ``skin.bundle`` when one is up to date.
+
+		Raises FileNotFoundError if the skin has neither, or SkinError listing
+		every schema problem in a loose manifest.
+		"""
+		base = Path(__file__).parent
+		self.skin_dir = base / 'skins' / skin_name
+		manifest_file = self.skin_dir / 'manifest.json'
+		self.bundle = self.assets.bundle(self.skin_dir / BUNDLE_NAME)
+		if self.bundle is not None:
+			data = self.bundle.manifest
+		else:
+			if not manifest_file.exists():
+				raise FileNotFoundError(f"Skin manifest not found: {manifest_file}")
+			data = self.assets.manifest(manifest_file)
+			validate(data, source=manifest_file)
+		self.current_skin = data
+		self._load_images(self.skin_dir, data.get('images', {}))
+		self.apply()
+
+	def _image(self, rel, subsample=1):
+		"""PhotoImage for a manifest-relative path, from the bundle if it has it."""
+		if self.bundle is not None and rel in self.bundle:
+			return self.assets.bundle_image(self.bundle, rel, subsample)
+		return self.assets.image(self.skin_dir / rel, subsample)
+
+	def watch_dirs(self):
+		"""Directories holding the active skin's manifest and images (for hot-reload)."""
+		if self.skin_dir is None:
+			return set()
+		dirs = {self.skin_dir.resolve()}
+		dirs.update(path.resolve().parent for path in self.image_paths.values())
+		window = (self.current_skin or {}).get('window')
+		bg_rel = window.get('background') if isinstance(window, dict) else None
+		if bg_rel:
+			dirs.add((self.skin_dir / bg_rel).resolve().parent)
+		return dirs
+
+	def reload(self, changed_paths):
+		"""Re-apply the active skin after files on disk changed.
+
+		Only manifest sections whose values differ, and images whose files are
+		in ``changed_paths``, are reloaded; ``apply`` then issues Tk calls for
+		the resulting differences only. Returns the names of the sections that
+		changed (empty if nothing relevant did, or the manifest is mid-write).
+		"""
+		if self.skin_dir is None or not self.current_skin:
+			return set()
+		changed = {Path(p).resolve() for p in changed_paths}
+		manifest_file = self.skin_dir / 'manifest.json'
+		old = self.current_skin
+		if manifest_file.resolve() in changed:
+			try:
+				data = self.assets.manifest(manifest_file)
+			except (OSError, ValueError):
+				# Half-written JSON; the write that completes it triggers another reload
+				return set()
+			validate(data, source=manifest_file)
+		else:
+			data = old
+		sections = {key for key in old.keys() | data.keys() if old.get(key) != data.get(key)}
+		if any(path.resolve() in changed for path in self.image_paths.values()):
+			sections.add('images')
+		bg_rel = data.get('window', {}).get('background') if isinstance(data.get('window'), dict) else None
+		if bg_rel and (self.skin_dir / bg_rel).resolve() in changed:
+			sections.add('window')
+		if not sections:
+			return sections
+		# The compiled bundle no longer matches; use the loose files until recompiled
+		self.bundle = None
+		self.current_skin = data
+		if 'images' in sections:
+			# Unchanged files come straight from the asset cache
+			self._load_images(self.skin_dir, data.get('images', {}))
+		self.apply()
+		return sections
+
+	def _load_images(self, skin_dir, images_cfg):
+		# Keep references so Tk doesn’t GC them; decoding is shared via the asset cache
+		self.images = {}
+		self.image_paths = {}
+		self.image_refs = {}
+		for key, rel in images_cfg.items():
+			img = self._image(rel)
+			if img is not None:
+				self.images[key] = img
+				self.image_paths[key] = skin_dir / rel
+				self.image_refs[key] = rel
+
+	def apply(self):
+		"""Bring the widgets in line with ``current_skin``, touching only what changed.
+
+		The skin is first resolved into the option values each target should
+		have (see ``resolve``); only options that differ from what the previous
+		apply set are passed to Tk, grouped into one call per target.
+		``configure_calls`` is the number of Tk calls the last apply issued.
+		"""
+		if not self.current_skin:
+			return
+		self.controls = self.current_skin.get('controls', {})
+		self.use_text_buttons = bool(self.controls.get('use_text_buttons', False))
+		calls = 0
+		for target, opts in self.resolve().items():
+			old = self._applied.get(target, {})
+			changed = {k: v for k, v in opts.items() if k not in old or old[k] != v}
+			if not changed:
+				continue
+			calls += 1
+			if self._configure(target, changed):
+				self._applied.setdefault(target, {}).update(changed)
+		self.configure_calls = calls
+		self.total_configure_calls += calls
+
+		# Enable dragging when custom chrome is on; disable otherwise
+		window = self.current_skin.get('window', {})
+		if isinstance(window, dict) and window.get('use_custom_chrome', False):
+			self._enable_drag()
+		else:
+			self._disable_drag()
+
+	def forget(self, widget_key, *options):
+		"""``options`` of a widget were changed outside apply(); the next apply
+		sets them again rather than assuming they still hold its values."""
+		old = self._applied.get(('widget', widget_key))
+		if old is not None:
+			for option in options:
+				old.pop(option, None)
+
+	def resolve(self):
+		"""Map each target to the option values the current skin gives it.
+
+		Targets are ``('widget', key)`` for entries of ``widgets`` plus ``'window'``,
+		``'theme'``, ``('style', name)``, ``'font'`` and ``'background'``. Values a
+		skin leaves out are not included, so switching to such a skin keeps
+		whatever the previous one set, as before.
+		"""
+		skin = self.current_skin
+		colors = skin.get('colors', {})
+		fonts = skin.get('fonts', {})
+		metrics = skin.get('metrics', {})
+		window = skin.get('window', {})
+		if not isinstance(window, dict):
+			window = {}
+		desired = {}
+
+		def want(target, **opts):
+			if isinstance(target, tuple) and target[0] == 'widget' and target[1] != 'root' and not self.widgets.get(target[1]):
+				return
+			opts = {k: v for k, v in opts.items() if v is not None}
+			if opts:
+				desired.setdefault(target, {}).update(opts)
+
+		# Window size, bg color and custom chrome (remove OS title bar/borders if requested)
+		size = None
+		if 'width' in window and 'height' in window:
+			try:
+				size = f"{int(window['width'])}x{int(window['height'])}"
+			except (TypeError, ValueError):
+				pass
+		want('window', size=size, overrideredirect=bool(window.get('use_custom_chrome', False)),
+			transparentcolor=window.get('transparent_color'))
+		want(('widget', 'root'), bg=colors.get('root_bg'))
+
+		# Playlist Listbox
+		want(('widget', 'playlist_box'), bg=colors.get('playlist_bg'), fg=colors.get('playlist_fg'),
+			selectbackground=colors.get('playlist_select_bg'), selectforeground=colors.get('playlist_select_fg'),
+			width=metrics.get('playlist_width'))
+
+		# Frames / Status bar
+		for key in ['main_frame', 'control_frame', 'volume_frame', 'scrub_frame']:
+			want(('widget', key), bg=colors.get('frame_bg'))
+		# Search box: label on the frame color, entry styled like the playlist
+		for key in ['search_frame', 'search_label']:
+			want(('widget', key), bg=colors.get('frame_bg'))
+		want(('widget', 'search_label'), fg=colors.get('search_fg', colors.get('playlist_fg')))
+		want(('widget', 'search_entry'), bg=colors.get('search_bg', colors.get('playlist_bg')),
+			fg=colors.get('search_fg', colors.get('playlist_fg')),
+			insertbackground=colors.get('search_fg', colors.get('playlist_fg')))
+		want(('widget', 'waveform'), bg=colors.get('frame_bg'), fg=colors.get('waveform_fg', colors.get('playlist_fg')),
+			cursorcolor=colors.get('waveform_cursor', colors.get('playlist_select_bg')))
+		want(('widget', 'status_bar'), bg=colors.get('status_bg'), fg=colors.get('status_fg'),
+			font=tuple(fonts['status']) if 'status' in fonts else None)
+
+		# Fonts (optional)
+		if 'base' in fonts:
+			want('font', family=fonts['base'][0], size=fonts['base'][1])
+
+		# Slider styling (ttk) if provided by skin
+		slider_cfg = skin.get('slider', {})
+		if isinstance(slider_cfg, dict):
+			trough = slider_cfg.get('trough_color')
+			thumb = slider_cfg.get('slider_color') or slider_cfg.get('thumb_color')
+			thickness = slider_cfg.get('thickness')
+			# Optionally force a theme that honors color options (clam is reliable across platforms)
+			want('theme', name=slider_cfg.get('force_theme') or None)
+			if trough or thumb or thickness:
+				for style_name, widget_key in (('Themed.Horizontal.TScale', 'song_slider'),
+						('Themed.Vertical.TScale', 'volume_slider')):
+					want(('style', style_name), troughcolor=trough or None, background=thumb or None,
+						thickness=int(thickness) if thickness else None)
+					want(('widget', widget_key), style=style_name)
+
+		# Controls: text-mode or image-mode
+		buttons = (('back_button', 'back', 'B'), ('forward_button', 'forward', 'F'),
+			('play_button', 'play', 'P'), ('stop_button', 'stop', 'S'))
+		if self.use_text_buttons:
+			labels = self.controls.get('button_text', {})
+			fg = self.controls.get('button_fg', colors.get('playlist_fg', None))
+			bg = self.controls.get('button_bg', colors.get('frame_bg', None))
+			for btn_key, key, default_txt in buttons:
+				want(('widget', btn_key), image='', text=labels.get(key, default_txt),
+					width=self.controls.get('button_width', 2), height=self.controls.get('button_height', 1),
+					fg=fg, bg=bg)
+		else:
+			# Image-mode: optionally subsample icons
+			subsample = int(metrics.get('icon_subsample', 1) or 1)
+			for btn_key, key, _ in buttons:
+				img = self.images.get(key)
+				if img is None:
+					continue
+				if subsample > 1:
+					img = self._image(self.image_refs[key], subsample) or img
+				# Reset size so the image defines the button size (important when switching from text mode)
+				want(('widget', btn_key), image=img, text='', width=0, height=0)
+
+		# Optional background image for the window (Level 2)
+		bg_rel = window.get('background')
+		bg_img = None
+		if bg_rel and self.skin_dir is not None:
+			bg_img = self._image(bg_rel)
+		want('background', image=bg_img or '')
+		return desired
+
+	def _configure(self, target, opts):
+		"""Issue one Tk call setting ``opts`` on ``target``; False if it failed."""
+		try:
+			if target == 'window':
+				if 'size' in opts:
+					self.root.geometry(opts['size'])
+				if 'overrideredirect' in opts:
+					self.root.overrideredirect(opts['overrideredirect'])
+				if 'transparentcolor' in opts:
+					# Mostly used on Windows
+					self.root.wm_attributes('-transparentcolor', opts['transparentcolor'])
+			elif target == 'font':
+				if self._base_font is None:
+					from tkinter import font as tkfont
+					self._base_font = tkfont.Font(root=self.root, **opts)
+					self.root.option_add('*Font', self._base_font)
+				else:
+					self._base_font.configure(**opts)
+			elif target == 'theme':
+				from tkinter import ttk as _ttk
+				_ttk.Style(self.root).theme_use(opts['name'])
+				# Style options belong to a theme; set them again for the new one
+				for key in [k for k in self._applied if isinstance(k, tuple) and k[0] == 'style']:
+					del self._applied[key]
+			elif target == 'background':
+				self._set_background(opts['image'])
+			elif target[0] == 'style':
+				from tkinter import ttk as _ttk
+				_ttk.Style(self.root).configure(target[1], **opts)
+			else:
+				w = self.root if target[1] == 'root' else self.widgets.get(target[1])
+				if not w:
+					return False
+				w.config(**opts)
+				if 'image' in opts:
+					w.image = opts['image'] or None  # keep reference
+		except Exception:
+			return False
+		return True
+
+	def _set_background(self, img):
+		canvas = self.widgets.get('bg_canvas')
+		if not img:
+			if canvas:
+				canvas.delete('all')
+				canvas.place_forget()
+			return
+		if not canvas:
+			canvas = Canvas(self.root, highlightthickness=0, bd=0)
+			self.widgets['bg_canvas'] = canvas
+		canvas.place(x=0, y=0, relwidth=1, relheight=1)
+		canvas.bg_img = img
+		canvas.delete('all')
+		canvas.create_image(0, 0, anchor='nw', image=img)
+		canvas.lower()  # behind everything
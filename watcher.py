@@ -0,0 +1,179 @@
+"""Filesystem change watching for skin hot-reload.
+
+``FileWatcher`` watches a set of directories (non-recursively) on a daemon
+thread, using inotify through ctypes on Linux and mtime polling elsewhere (or
+if inotify is unavailable). Changed paths are handed to the Tk thread through
+a queue; ``poll()`` is called from an ``after()`` loop and returns a batch
+only once writes have been quiet for ``debounce`` seconds, so an editor's
+save (truncate, write, rename, chmod...) becomes a single reload.
+"""
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct('iIII')
+
+
+def _load_inotify():
+	"""Return libc if it provides inotify, else None."""
+	if not sys.platform.startswith('linux'):
+		return None
+	try:
+		import ctypes
+		import ctypes.util
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		libc.inotify_init1.argtypes = [ctypes.c_int]
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+		libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+		return libc
+	except (OSError, AttributeError):
+		return None
+
+
+class FileWatcher:
+	"""Report files changed inside a set of directories, debounced.
+
+	``backend`` is ``'inotify'`` or ``'polling'``. Directories can be replaced
+	at any time with ``set_paths`` (e.g. when the active skin changes).
+	"""
+	def __init__(self, paths=(), debounce=0.15, poll_interval=0.5, use_inotify=True):
+		self.debounce = debounce
+		self.poll_interval = poll_interval
+		self.backend = 'polling'
+		self._libc = _load_inotify() if use_inotify else None
+		self._fd = -1
+		self._watches = {}  # wd -> directory (inotify)
+		self._snapshots = {}  # directory -> {path: (mtime_ns, size)} (polling)
+		self._paths = set()
+		self._lock = threading.Lock()
+		self._queue = queue.SimpleQueue()
+		self._stop = threading.Event()
+		self._thread = None
+		self._pending = set()
+		self._last_change = 0.0
+		if self._libc is not None:
+			fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+			if fd >= 0:
+				self._fd = fd
+				self.backend = 'inotify'
+		self.set_paths(paths)
+
+	def set_paths(self, paths):
+		"""Watch exactly ``paths`` (directories) from now on."""
+		paths = {os.path.abspath(p) for p in paths if os.path.isdir(p)}
+		with self._lock:
+			if self.backend == 'inotify':
+				for wd, path in list(self._watches.items()):
+					if path not in paths:
+						self._libc.inotify_rm_watch(self._fd, wd)
+						del self._watches[wd]
+				current = set(self._watches.values())
+				for path in paths - current:
+					wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+					if wd >= 0:
+						self._watches[wd] = path
+			else:
+				self._snapshots = {p: self._snapshots.get(p) or self._scan(p) for p in paths}
+			self._paths = paths
+
+	def start(self):
+		if self._thread is None:
+			target = self._run_inotify if self.backend == 'inotify' else self._run_polling
+			self._thread = threading.Thread(target=target, name='file-watch', daemon=True)
+			self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		if self._thread is not None:
+			self._thread.join(timeout=1.0)
+			self._thread = None
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+	def poll(self):
+		"""Return the set of changed paths once writes have settled, else None."""
+		now = time.monotonic()
+		while True:
+			try:
+				path = self._queue.get_nowait()
+			except queue.Empty:
+				break
+			self._pending.add(path)
+			self._last_change = now
+		if self._pending and now - self._last_change >= self.debounce:
+			changed, self._pending = self._pending, set()
+			return changed
+		return None
+
+	# ----- inotify -----
+	def _run_inotify(self):
+		while not self._stop.is_set():
+			try:
+				ready, _, _ = select.select([self._fd], [], [], 0.25)
+			except (OSError, ValueError):
+				return
+			if not ready:
+				continue
+			try:
+				data = os.read(self._fd, 64 * 1024)
+			except BlockingIOError:
+				continue
+			except OSError:
+				return
+			offset = 0
+			while offset + _EVENT.size <= len(data):
+				wd, _mask, _cookie, length = _EVENT.unpack_from(data, offset)
+				offset += _EVENT.size
+				name = data[offset:offset + length].rstrip(b'\0')
+				offset += length
+				with self._lock:
+					directory = self._watches.get(wd)
+				if directory is not None and name:
+					self._queue.put(os.path.join(directory, os.fsdecode(name)))
+
+	# ----- polling fallback -----
+	@staticmethod
+	def _scan(directory):
+		snapshot = {}
+		try:
+			with os.scandir(directory) as it:
+				for entry in it:
+					try:
+						st = entry.stat()
+					except OSError:
+						continue
+					snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+		except OSError:
+			pass
+		return snapshot
+
+	def _run_polling(self):
+		while not self._stop.wait(self.poll_interval):
+			with self._lock:
+				paths = list(self._paths)
+			for directory in paths:
+				new = self._scan(directory)
+				with self._lock:
+					if directory not in self._snapshots:
+						continue
+					old = self._snapshots[directory]
+					self._snapshots[directory] = new
+				for path in old.keys() | new.keys():
+					if old.get(path) != new.get(path):
+						self._queue.put(path)
@@ -0,0 +1,94 @@
+"""Waveform overview strip drawn next to the song scrubber.
+
+``WaveformView`` is a Canvas showing a track's ``peaks.Peaks`` as a single
+filled polygon plus a position cursor. A redraw asks the peaks for one
+(min, max) pair per pixel column, so it costs O(width) whatever the track
+length; moving the cursor only updates one item's coordinates.
+"""
+from tkinter import Canvas
+
+
+class WaveformView(Canvas):
+	"""Canvas rendering a peak overview; ``command(seconds)`` is called on click."""
+	# Options handled by the view itself rather than the Canvas
+	_VIEW_OPTIONS = ('fg', 'foreground', 'cursorcolor')
+
+	def __init__(self, master=None, fg='#00aa55', cursorcolor='white', command=None, **kw):
+		kw.setdefault('height', 36)
+		kw.setdefault('highlightthickness', 0)
+		kw.setdefault('bd', 0)
+		Canvas.__init__(self, master, **kw)
+		self._fg = fg
+		self._cursor_color = cursorcolor
+		self.command = command
+		self.peaks = None
+		self._position = 0.0
+		self._drawn_size = None
+		self._wave = self.create_polygon(0, 0, 0, 0, fill=fg, outline=fg, state='hidden')
+		self._cursor = self.create_line(0, 0, 0, 0, fill=cursorcolor, state='hidden')
+		self.bind('<Configure>', lambda e: self.redraw())
+		self.bind('<Button-1>', self._on_click)
+
+	def set_peaks(self, peaks):
+		"""Show ``peaks`` (or clear the strip if None)."""
+		if peaks is self.peaks:
+			return
+		self.peaks = peaks
+		self._position = 0.0
+		self.redraw()
+
+	def set_position(self, seconds):
+		self._position = seconds
+		self._place_cursor()
+
+	def redraw(self):
+		width, height = self.winfo_width(), self.winfo_height()
+		if self.peaks is None or width <= 1:
+			self.itemconfigure(self._wave, state='hidden')
+			self.itemconfigure(self._cursor, state='hidden')
+			return
+		columns = self.peaks.columns(width)
+		mid = height / 2.0
+		scale = (height / 2.0 - 1) / 128.0
+		top = []
+		bottom = []
+		for x, (lo, hi) in enumerate(columns):
+			top += (x, mid - hi * scale)
+			bottom += (x, mid - lo * scale)
+		# Outline along the maxima, then back along the minima
+		for i in range(len(bottom) - 2, -1, -2):
+			top += (bottom[i], bottom[i + 1])
+		self.coords(self._wave, *top)
+		self.itemconfigure(self._wave, state='normal')
+		self._drawn_size = (width, height)
+		self._place_cursor()
+
+	def _place_cursor(self):
+		if self.peaks is None or self._drawn_size is None or self.peaks.duration <= 0:
+			return
+		width, height = self._drawn_size
+		x = min(width - 1, max(0, int(self._position / self.peaks.duration * width)))
+		self.coords(self._cursor, x, 0, x, height)
+		self.itemconfigure(self._cursor, state='normal')
+
+	def _on_click(self, event):
+		if self.peaks is None or self.command is None:
+			return
+		width = max(1, self.winfo_width())
+		self.command(max(0.0, min(1.0, event.x / width)) * self.peaks.duration)
+
+	# ----- options -----
+	def configure(self, cnf=None, **kw):
+		if cnf:
+			kw.update(cnf)
+		view_opts = {k: kw.pop(k) for k in list(kw) if k in self._VIEW_OPTIONS}
+		if 'fg' in view_opts or 'foreground' in view_opts:
+			self._fg = view_opts.get('fg', view_opts.get('foreground'))
+			self.itemconfigure(self._wave, fill=self._fg, outline=self._fg)
+		if 'cursorcolor' in view_opts:
+			self._cursor_color = view_opts['cursorcolor']
+			self.itemconfigure(self._cursor, fill=self._cursor_color)
+		if kw:
+			return Canvas.configure(self, **kw)
+
+	config = configure
@@ -0,0 +1,114 @@
+"""Persistent worker processes for CPU-heavy analysis (peaks, loudness).
+
+``ProcessPool`` starts ``size`` copies of ``python <script> --serve`` and feeds
+them jobs as JSON lines over stdin/stdout, one dispatcher thread per worker.
+Workers are plain scripts rather than ``multiprocessing`` children because
+spawn-based pools re-import the main module in every child, and player.py
+builds its whole window at import time.
+
+A script becomes a worker by calling ``serve(handlers)`` when run with
+``--serve``; each job names a handler and its arguments.
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+
+class WorkerError(RuntimeError):
+	"""A job raised in the worker, or the worker died."""
+
+
+class ProcessPool:
+	"""Run jobs in persistent worker processes; results arrive on dispatcher threads.
+
+	``submit(name, args, callback)`` never blocks; ``callback(result, error)``
+	is called from a dispatcher thread, so it should only hand the result off
+	(e.g. ``SimpleQueue.put``). Workers start on the first submit.
+	"""
+	def __init__(self, script, size=1, env=None):
+		self.script = os.path.abspath(script)
+		self.size = max(1, size)
+		self.env = dict(os.environ, **(env or {}))
+		self._jobs = queue.Queue()
+		self._threads = []
+		self._procs = []
+		self._lock = threading.Lock()
+		self._closed = False
+
+	def submit(self, name, args, callback):
+		if self._closed:
+			raise RuntimeError('pool is closed')
+		with self._lock:
+			if not self._threads:
+				for i in range(self.size):
+					t = threading.Thread(target=self._dispatch, name=f'worker-{i}', daemon=True)
+					self._threads.append(t)
+					t.start()
+		self._jobs.put((name, list(args), callback))
+
+	def _spawn(self):
+		proc = subprocess.Popen([sys.executable, self.script, '--serve'], stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE, env=self.env, text=True, encoding='utf-8', bufsize=1)
+		with self._lock:
+			self._procs.append(proc)
+		return proc
+
+	def _dispatch(self):
+		proc = None
+		while True:
+			job = self._jobs.get()
+			if job is None or self._closed:
+				break
+			name, args, callback = job
+			try:
+				if proc is None or proc.poll() is not None:
+					proc = self._spawn()
+				proc.stdin.write(json.dumps([name, args]) + '\n')
+				proc.stdin.flush()
+				line = proc.stdout.readline()
+				if not line:
+					raise WorkerError(f'worker exited ({proc.wait()})')
+				reply = json.loads(line)
+				error = WorkerError(reply['error']) if 'error' in reply else None
+				result = reply.get('result')
+			except (OSError, ValueError, WorkerError) as e:
+				result, error = None, e if isinstance(e, WorkerError) else WorkerError(str(e))
+			if self._closed:
+				break
+			try:
+				callback(result, error)
+			except Exception:
+				pass
+
+	def terminate(self):
+		"""Kill the workers; queued and running jobs are dropped without callbacks."""
+		self._closed = True
+		for _ in self._threads:
+			self._jobs.put(None)
+		with self._lock:
+			procs, self._procs = self._procs, []
+		for proc in procs:
+			try:
+				proc.kill()
+				proc.wait(timeout=1.0)
+			except (OSError, subprocess.TimeoutExpired):
+				pass
+
+
+def serve(handlers):
+	"""Worker main loop: answer ``[name, args]`` JSON lines from stdin until EOF."""
+	# Keep the reply channel clean of anything libraries print to stdout
+	out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+	os.dup2(2, 1)
+	sys.stdout = sys.stderr
+	for line in sys.stdin:
+		try:
+			name, args = json.loads(line)
+			reply = {'result': handlers[name](*args)}
+		except Exception as e:
+			reply = {'error': f'{type(e).__name__}: {e}'}
+		out.write(json.dumps(reply) + '\n')
+		out.flush()